@@ -0,0 +1,172 @@
+# activity.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Append-only activity log. Write helpers hand #
+#               committed changes to an in-process queue; a  #
+#               background thread inserts them in batches.   #
+#============================================================#
+
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Table, inspect
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Who is acting: set once per Streamlit rerun (the signed-in email) or CLI run.
+actor: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("activity_actor", default=None)
+
+_STOP = object()
+_SUMMARY_MAX = 500
+
+
+def entry(project_id: int, action: str, item_kind: str, item_id: Optional[int], summary: str = "") -> Dict:
+    return {
+        "project_id": int(project_id),
+        "actor": actor.get(),
+        "action": action,
+        "item_kind": item_kind,
+        "item_id": item_id,
+        "summary": (summary or "")[:_SUMMARY_MAX],
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _fmt(v: Any) -> str:
+    if v is None or v == "":
+        return "-"
+    if isinstance(v, float):
+        return f"{v:g}"
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    s = str(v)
+    return s if len(s) <= 60 else s[:57] + "..."
+
+
+def describe_changes(obj, fields: Iterable[str], resolve: Optional[Dict[str, Any]] = None) -> str:
+    """'status: To-Do -> Done; progress: 0 -> 50' from the unflushed attribute history."""
+    resolve = resolve or {}
+    state = inspect(obj)
+    parts = []
+    for name in fields:
+        hist = state.attrs[name].history
+        if not hist.has_changes():
+            continue
+        old = hist.deleted[0] if hist.deleted else None
+        new = hist.added[0] if hist.added else None
+        if old == new:
+            continue
+        fn = resolve.get(name)
+        if fn is not None:
+            old, new = fn(old), fn(new)
+        label = name.removesuffix("_id")
+        parts.append(f"{label}: {_fmt(old)} -> {_fmt(new)}")
+    return "; ".join(parts)
+
+
+class ActivityWriter:
+    """
+    Batches entries into `table` from a daemon thread: a batch is written when it
+    reaches `batch_size` or `flush_interval` seconds after its first entry. The queue
+    is bounded; when the database falls behind, entries are dropped (and counted)
+    rather than slowing down the writes being logged.
+    """
+
+    def __init__(self, engine: Engine, table: Table, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_queue: int = 10_000):
+        self.engine = engine
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def submit(self, entries: List[Dict]) -> None:
+        self._ensure_started()
+        for e in entries:
+            try:
+                self._q.put_nowait(e)
+            except queue.Full:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    log.warning("activity queue full; %d entries dropped so far", self.dropped)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="ActivityWriter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._q.get()
+            if first is _STOP:
+                self._q.task_done()
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._q.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in batch:
+                self._q.task_done()
+
+    def _write(self, batch: List[Dict]) -> None:
+        for attempt in range(3):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(self.table.insert(), batch)
+                return
+            except Exception:
+                log.warning("activity batch write failed (attempt %d)", attempt + 1, exc_info=True)
+                time.sleep(0.2 * (attempt + 1))
+        self.dropped += len(batch)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far is written; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks:
+            if time.monotonic() >= deadline or self._thread is None or not self._thread.is_alive():
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._q.put(_STOP, timeout=5.0)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5.0)
@@ -0,0 +1,204 @@
+# auth.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Signed session tokens (HMAC-SHA256) carrying #
+#               user id, email and per-project roles, kept   #
+#               in a cookie and checked in memory against a  #
+#               revocation list refreshed from the database. #
+#============================================================#
+
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import db
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("AUTH_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+COOKIE_NAME = os.getenv("AUTH_COOKIE_NAME", "pm_auth")
+COOKIE_KEY = os.getenv("AUTH_COOKIE_KEY", "changeme")
+COOKIE_EXPIRES_DAYS = float(os.getenv("AUTH_COOKIE_EXPIRES", "7"))
+REVOCATION_REFRESH_SECONDS = float(os.getenv("AUTH_REVOCATION_REFRESH_SECONDS", "5"))
+MAX_ROLES = 32   # most recently used projects kept in the token; keeps the cookie well under 4 KB
+
+if ENABLED and (COOKIE_KEY.strip().lower() in ("", "changeme") or len(COOKIE_KEY.encode("utf-8")) < 32):
+    # a guessable key lets anyone sign a cookie for any account: refuse to start rather than warn
+    raise ValueError("AUTH_ENABLED needs AUTH_COOKIE_KEY set to a random secret of at least 32 bytes, "
+                     "e.g. python -c \"import secrets; print(secrets.token_urlsafe(32))\"")
+
+
+def _b64e(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64d(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(body: str, purpose: Optional[str] = None, key: Optional[str] = None) -> str:
+    # other token kinds (feed links) sign "purpose:body" with their own key, so one can never pass for another
+    msg = body if purpose is None else f"{purpose}:{body}"
+    secret = COOKIE_KEY if key is None else key
+    return _b64e(hmac.new(secret.encode("utf-8"), msg.encode("ascii"), hashlib.sha256).digest())
+
+
+def encode(claims: Dict, purpose: Optional[str] = None, key: Optional[str] = None) -> str:
+    body = _b64e(json.dumps(claims, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+    return f"{body}.{_sign(body, purpose, key)}"
+
+
+def decode(token: Optional[str], purpose: Optional[str] = None, key: Optional[str] = None) -> Optional[Dict]:
+    """Claims if the signature is ours and the token has not expired; no revocation check."""
+    if not token or token.count(".") != 1:
+        return None
+    body, sig = token.split(".")
+    if not hmac.compare_digest(sig, _sign(body, purpose, key)):
+        return None
+    try:
+        claims = json.loads(_b64d(body))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+class Revocations:
+    """
+    In-memory view of `auth_revocations`: revoked token ids and, per project, the last
+    time its member roles changed. Refreshed incrementally (rows after the last id seen)
+    at most every REVOCATION_REFRESH_SECONDS, so a check is a dict lookup, not a query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._next_refresh = 0.0
+        self.tokens: Dict[str, float] = {}          # jti -> token expiry
+        self.roles_changed: Dict[int, float] = {}   # project id -> epoch seconds
+
+    def _apply(self, row: Dict) -> None:
+        if row["jti"]:
+            self.tokens[row["jti"]] = row["expires"] or 0.0
+        if row["project_id"] is not None:
+            pid = int(row["project_id"])
+            self.roles_changed[pid] = max(self.roles_changed.get(pid, 0.0), row["at"])
+        self._last_id = max(self._last_id, row["id"])
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_refresh:
+            return
+        with self._lock:
+            if not force and now < self._next_refresh:
+                return
+            self._next_refresh = now + REVOCATION_REFRESH_SECONDS
+            try:
+                rows = db.load_auth_revocations(self._last_id)
+            except Exception:
+                log.warning("could not refresh auth revocations", exc_info=True)
+                return
+            for row in rows:
+                self._apply(row)
+            cutoff = time.time()
+            self.tokens = {j: exp for j, exp in self.tokens.items() if exp >= cutoff}
+
+    def note(self, jti: Optional[str] = None, expires: Optional[float] = None) -> None:
+        """Apply a revocation made in this process without waiting for the next refresh."""
+        if jti:
+            with self._lock:
+                self.tokens[jti] = expires or 0.0
+
+
+revocations = Revocations()
+
+
+def issue(user: Dict) -> Dict:
+    """Fresh claims for a signed-in user; roles are filled in as projects are opened."""
+    now = time.time()
+    return {
+        "jti": secrets.token_hex(8),
+        "uid": int(user["id"]),
+        "email": user["email"],
+        "name": user.get("name"),
+        "iat": now,
+        "exp": now + COOKIE_EXPIRES_DAYS * 86400,
+        "roles": {},   # "project id" -> [role or "", resolved at (epoch seconds)]
+    }
+
+
+def user_of(claims: Dict) -> Optional[Dict]:
+    """
+    The claims' user as stored now (by id, and only while the email still matches), or
+    None. Name and project roles are never taken from a token: roles are dropped here and
+    resolved again from the database by project_role.
+    """
+    user = db.get_user(int(claims["uid"]))
+    if user is None or user["email"] != claims.get("email"):
+        return None
+    claims["name"] = user["name"]
+    claims["roles"] = {}
+    return user
+
+
+def is_valid(claims: Optional[Dict]) -> bool:
+    if not claims or claims.get("exp", 0) < time.time():
+        return False
+    revocations.refresh()
+    return claims.get("jti") not in revocations.tokens
+
+
+def project_role(claims: Dict, project_id: int) -> Tuple[Optional[str], bool]:
+    """
+    (role, claims_changed) for `project_id`. The token's role is used unless the project's
+    members changed after it was resolved; only then is the role looked up again.
+    """
+    revocations.refresh()
+    key = str(project_id)
+    cached = claims["roles"].get(key)
+    if cached is not None and cached[1] >= revocations.roles_changed.get(project_id, 0.0):
+        return cached[0] or None, False
+    role = db.get_user_role(project_id, claims["email"])
+    roles = claims["roles"]
+    roles.pop(key, None)
+    roles[key] = [role or "", time.time()]
+    while len(roles) > MAX_ROLES:
+        roles.pop(next(iter(roles)))   # insertion order = least recently resolved first
+    return role, True
+
+
+def revoke(claims: Optional[Dict]) -> None:
+    """Sign-out: the token stops working everywhere within one refresh interval."""
+    if not claims:
+        return
+    db.revoke_session_token(claims["jti"], claims["exp"])
+    revocations.note(claims["jti"], claims["exp"])
+
+
+def cookie_script(token: Optional[str]) -> str:
+    """
+    JS that stores (or with None, clears) the session cookie on the app's origin. Set from
+    script, the cookie cannot be HttpOnly, so it is Secure (HTTPS only; browsers also allow
+    localhost) and SameSite=Strict, and its claims are re-checked against the database.
+    """
+    if token is None:
+        value, max_age = "", 0
+    else:
+        value, max_age = token, int(COOKIE_EXPIRES_DAYS * 86400)
+    return (
+        f"<script>document.cookie={json.dumps(COOKIE_NAME + '=' + value)}"
+        f"+';Path=/;Max-Age={max_age};Secure;SameSite=Strict';</script>"
+    )
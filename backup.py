@@ -0,0 +1,139 @@
+# backup.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Online SQLite backups (paged backup API, the #
+#               app keeps running) and versioned per-project #
+#               snapshots as gzip NDJSON, restored with bulk #
+#               inserts into any Strivio database.           #
+#============================================================#
+
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Union
+
+import db
+
+SNAPSHOT_FORMAT = "strivio-snapshot"
+SNAPSHOT_VERSION = 1            # bump when a record type changes shape; older files stay readable
+SNAPSHOT_SUFFIX = ".ndjson.gz"
+
+Progress = Callable[[float, str], None]
+
+
+# ---- online backup (SQLite) ----
+def _sqlite_path() -> str:
+    url = db.engine.url
+    if url.get_backend_name() != "sqlite":
+        raise ValueError("Online backups use the SQLite backup API; back up Postgres with pg_dump")
+    if not url.database or url.database == ":memory:":
+        raise ValueError("The database is in memory; there is no file to back up")
+    return url.database
+
+
+def online_backup(dest: Union[str, Path], pages: int = 1024, pause: float = 0.005,
+                  keep: Optional[int] = None, progress: Optional[Progress] = None) -> Path:
+    """
+    Copy the live SQLite database with the backup API, `pages` pages per step and a
+    short `pause` between steps so the app's writers are never held up for long (a
+    write from another connection restarts the copy from its next step). `dest` is a
+    file, or a directory that gets a timestamped file, keeping the newest `keep`.
+    The copy is written beside the target and renamed into place when complete.
+    """
+    source = _sqlite_path()
+    dest = Path(dest)
+    rotate = dest.is_dir()
+    if rotate:
+        dest = dest / f"strivio-{datetime.utcnow():%Y%m%d-%H%M%S}.db"
+    partial = dest.with_name(dest.name + ".partial")
+    partial.unlink(missing_ok=True)
+
+    def step(status: int, remaining: int, total: int) -> None:
+        if progress is not None and total:
+            progress((total - remaining) / total, f"{total - remaining:,} of {total:,} pages")
+        if remaining and pause:
+            time.sleep(pause)   # let writers in between steps
+
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        out = sqlite3.connect(partial)
+        try:
+            src.backup(out, pages=max(1, pages), progress=step)
+        finally:
+            out.close()
+    finally:
+        src.close()
+    os.replace(partial, dest)
+    if rotate and keep is not None:
+        olds = sorted(dest.parent.glob("strivio-*.db"), key=lambda p: p.name, reverse=True)
+        for old in olds[max(1, keep):]:
+            old.unlink(missing_ok=True)
+    return dest
+
+
+# ---- per-project snapshots ----
+def _json_default(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    raise TypeError(f"{type(v).__name__} is not JSON serialisable")
+
+
+def write_snapshot(project_id: int, dest: Union[str, Path, BinaryIO], batch_size: int = 5000) -> int:
+    """
+    Stream one project as gzip NDJSON: a header line ({'format', 'version', ...})
+    then one JSON object per record of db.iter_snapshot_records. Returns the number
+    of records written.
+    """
+    header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION,
+              "created_at": datetime.utcnow().isoformat(timespec="seconds"), "kinds": list(db.SNAPSHOT_KINDS)}
+    n = 0
+    with gzip.open(dest, "wb") if isinstance(dest, (str, Path)) else gzip.GzipFile(fileobj=dest, mode="wb") as gz:
+        text = io.TextIOWrapper(gz, encoding="utf-8", newline="\n")
+        text.write(json.dumps(header) + "\n")
+        buf = []
+        for record in db.iter_snapshot_records(project_id, batch_size=batch_size):
+            buf.append(json.dumps(record, default=_json_default, ensure_ascii=False))
+            if len(buf) >= batch_size:
+                text.write("\n".join(buf) + "\n")
+                n += len(buf)
+                buf = []
+        if buf:
+            text.write("\n".join(buf) + "\n")
+            n += len(buf)
+        text.flush()
+        text.detach()
+    return n
+
+
+def read_snapshot(src: Union[str, Path, BinaryIO]) -> Iterator[Dict]:
+    """Records of a snapshot file, after checking its header; raises ValueError on foreign or newer files."""
+    with gzip.open(src, "rt", encoding="utf-8") if isinstance(src, (str, Path)) \
+            else io.TextIOWrapper(gzip.GzipFile(fileobj=src, mode="rb"), encoding="utf-8") as fh:
+        try:
+            header = json.loads(fh.readline() or "{}")
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Not a Strivio snapshot: {e}") from e
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError("Not a Strivio snapshot")
+        if int(header.get("version", 0)) > SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {header['version']} is newer than this release reads "
+                             f"({SNAPSHOT_VERSION}); upgrade Strivio first")
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def restore_snapshot(src: Union[str, Path, BinaryIO], owner_email: Optional[str] = None,
+                     name: Optional[str] = None, batch_size: int = 1000) -> int:
+    """New project from a snapshot file; returns its id (see db.restore_snapshot)."""
+    return db.restore_snapshot(read_snapshot(src), owner_email=owner_email, name=name, batch_size=batch_size)
@@ -0,0 +1,97 @@
+# capacity.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Per-day resource allocation by assignee,     #
+#               built with NumPy difference arrays (no loops #
+#               over days) for heatmaps and overload flags.  #
+#============================================================#
+
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def allocation_matrix(assignees, starts, ends, weights=None
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Expand inclusive [start, end] intervals into per-day load per assignee.
+
+    Returns (labels, days, matrix) where matrix[i, d] is the summed weight of the
+    items assigned to labels[i] that are active on days[d]. Items with a missing
+    assignee or date are ignored; an end before its start counts as one day.
+    """
+    df = pd.DataFrame({"who": assignees, "start": starts, "end": ends})
+    df["w"] = 1.0 if weights is None else np.asarray(weights, dtype=float)
+    df = df.dropna(subset=["who", "start", "end"])
+    if df.empty:
+        return np.array([], dtype=object), np.array([], dtype="datetime64[D]"), np.zeros((0, 0))
+
+    s = pd.to_datetime(df["start"]).to_numpy().astype("datetime64[D]")
+    e = pd.to_datetime(df["end"]).to_numpy().astype("datetime64[D]")
+    e = np.maximum(e, s)
+    origin = s.min()
+    s_idx = (s - origin).astype(np.int64)
+    e_idx = (e - origin).astype(np.int64)
+    n_days = int(e_idx.max()) + 1
+
+    codes, labels = pd.factorize(df["who"], sort=True)
+    diff = np.zeros((len(labels), n_days + 1))
+    w = df["w"].to_numpy()
+    np.add.at(diff, (codes, s_idx), w)
+    np.add.at(diff, (codes, e_idx + 1), -w)
+    matrix = np.cumsum(diff[:, :-1], axis=1)
+    days = origin + np.arange(n_days)
+    return np.asarray(labels, dtype=object), days, matrix
+
+
+def weekly_peak(days: np.ndarray, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Collapse daily load to the peak day of each Monday-based week."""
+    if matrix.size == 0:
+        return days, matrix
+    # 1970-01-01 was a Thursday, so shifting by 3 puts Mondays on multiples of 7
+    week_no = (days.astype(np.int64) + 3) // 7
+    bounds = np.flatnonzero(np.r_[True, week_no[1:] != week_no[:-1]])
+    week_starts = (week_no[bounds] * 7 - 3).astype("datetime64[D]")
+    return week_starts, np.maximum.reduceat(matrix, bounds, axis=1)
+
+
+def over_allocation(labels: np.ndarray, days: np.ndarray, matrix: np.ndarray,
+                    capacity: float = 1.0) -> pd.DataFrame:
+    """One row per assignee whose load exceeds `capacity` on at least one day."""
+    cols = ["Assignee", "Days over", "Peak load", "First day", "Last day"]
+    if matrix.size == 0:
+        return pd.DataFrame(columns=cols)
+    over = matrix > capacity
+    hit = over.any(axis=1)
+    if not hit.any():
+        return pd.DataFrame(columns=cols)
+    first = over.argmax(axis=1)
+    last = over.shape[1] - 1 - over[:, ::-1].argmax(axis=1)
+    return pd.DataFrame({
+        "Assignee": labels[hit],
+        "Days over": over.sum(axis=1)[hit],
+        "Peak load": matrix.max(axis=1)[hit],
+        "First day": days[first[hit]],
+        "Last day": days[last[hit]],
+    }).sort_values(["Days over", "Peak load"], ascending=False).reset_index(drop=True)
+
+
+def capacity_frame(items: pd.DataFrame, include_done: bool = False,
+                   weight_col: Optional[str] = None):
+    """
+    Convenience wrapper over the Analytics item table
+    (columns assignee_email/start_date/end_date/status).
+    """
+    if items.empty:
+        return allocation_matrix([], [], [])
+    df = items if include_done else items[items["status"] != "Done"]
+    return allocation_matrix(
+        df["assignee_email"], df["start_date"], df["end_date"],
+        None if weight_col is None else df[weight_col],
+    )
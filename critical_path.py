@@ -0,0 +1,233 @@
+# critical_path.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : In-memory task dependency graph (DAG) with   #
+#               critical-path scheduling: earliest/latest    #
+#               start, slack and incremental recompute.      #
+#============================================================#
+
+
+from __future__ import annotations
+
+import heapq
+from collections import deque
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class CycleError(ValueError):
+    """Raised when a dependency would make the task graph cyclic."""
+
+
+class ScheduleGraph:
+    """
+    Finish-to-start dependency graph over tasks.
+
+    Dates are handled as day ordinals. A task's earliest start is the later of its
+    planned start and every predecessor's earliest finish plus lag; latest dates
+    come from a backward pass from the projected finish. Full passes are O(V + E)
+    over a topological order; `update_task` only re-walks the nodes a change can reach.
+    """
+
+    def __init__(self, origin: date):
+        self.origin = origin.toordinal()
+        self.planned: Dict[int, Optional[int]] = {}
+        self.duration: Dict[int, int] = {}
+        self.succ: Dict[int, Dict[int, int]] = {}   # pred -> {succ: lag}
+        self.pred: Dict[int, Dict[int, int]] = {}   # succ -> {pred: lag}
+        self.order: List[int] = []
+        self.pos: Dict[int, int] = {}
+        self.es: Dict[int, int] = {}
+        self.ef: Dict[int, int] = {}
+        self.ls: Dict[int, int] = {}
+        self.lf: Dict[int, int] = {}
+        self.finish: int = self.origin
+
+    # ---- construction ----
+    @classmethod
+    def build(cls, origin: date, tasks: Iterable[Dict], deps: Iterable[Dict]) -> "ScheduleGraph":
+        """Build from task dicts (id/start_date/end_date) and dependency dicts."""
+        g = cls(origin)
+        for t in tasks:
+            g._set_node(t["id"], t.get("start_date"), t.get("end_date"))
+        for d in deps:
+            p, s_ = d["predecessor_id"], d["successor_id"]
+            if p in g.duration and s_ in g.duration:
+                g.succ[p][s_] = int(d.get("lag_days") or 0)
+                g.pred[s_][p] = int(d.get("lag_days") or 0)
+        g._reorder()
+        g.recompute()
+        return g
+
+    @staticmethod
+    def _node_dates(start: Optional[date], end: Optional[date]) -> Tuple[Optional[int], int]:
+        """(planned start ordinal, duration); same 1-day minimum as the Gantt bars."""
+        planned = start.toordinal() if start else None
+        dur = max(1, (end - start).days) if start and end else 0
+        return planned, dur
+
+    def _set_node(self, node: int, start: Optional[date], end: Optional[date]) -> None:
+        self.planned[node], self.duration[node] = self._node_dates(start, end)
+        self.succ.setdefault(node, {})
+        self.pred.setdefault(node, {})
+
+    def _reorder(self) -> None:
+        """Kahn's algorithm; raises CycleError if the graph is not a DAG."""
+        indeg = {n: len(self.pred[n]) for n in self.duration}
+        queue = deque(sorted(n for n, d in indeg.items() if d == 0))
+        order: List[int] = []
+        while queue:
+            n = queue.popleft()
+            order.append(n)
+            for m in self.succ[n]:
+                indeg[m] -= 1
+                if indeg[m] == 0:
+                    queue.append(m)
+        if len(order) != len(self.duration):
+            raise CycleError("Task dependencies contain a cycle")
+        self.order = order
+        self.pos = {n: i for i, n in enumerate(order)}
+
+    # ---- mutation ----
+    def add_dependency(self, predecessor: int, successor: int, lag_days: int = 0) -> None:
+        """Insert an edge, rejecting it if it closes a cycle."""
+        if predecessor == successor:
+            raise CycleError("A task cannot depend on itself")
+        if predecessor not in self.duration or successor not in self.duration:
+            raise KeyError("Unknown task in dependency")
+        if self.pos[predecessor] > self.pos[successor]:
+            # Order is violated; only a path successor -> predecessor makes it a cycle,
+            # and such a path can only visit nodes positioned before the predecessor.
+            limit = self.pos[predecessor]
+            stack, seen = [successor], {successor}
+            while stack:
+                n = stack.pop()
+                if n == predecessor:
+                    raise CycleError("Dependency would create a cycle")
+                for m in self.succ[n]:
+                    if m not in seen and self.pos[m] <= limit:
+                        seen.add(m)
+                        stack.append(m)
+        self.succ[predecessor][successor] = int(lag_days)
+        self.pred[successor][predecessor] = int(lag_days)
+        if self.pos[predecessor] > self.pos[successor]:
+            self._reorder()
+        self._propagate({successor}, {predecessor})
+
+    def remove_dependency(self, predecessor: int, successor: int) -> None:
+        self.succ.get(predecessor, {}).pop(successor, None)
+        self.pred.get(successor, {}).pop(predecessor, None)
+        self._propagate({successor}, {predecessor})
+
+    def update_task(self, node: int, start: Optional[date], end: Optional[date]) -> Set[int]:
+        """Change one task's dates and recompute only what it can affect."""
+        self._set_node(node, start, end)
+        return self._propagate({node}, {node})
+
+    def sync_tasks(self, tasks: Iterable[Dict]) -> Set[int]:
+        """Apply fresh task dates; only tasks whose dates moved are re-walked."""
+        touched: Set[int] = set()
+        for t in tasks:
+            start, end = t.get("start_date"), t.get("end_date")
+            if self._node_dates(start, end) != (self.planned[t["id"]], self.duration[t["id"]]):
+                touched |= self.update_task(t["id"], start, end)
+        return touched
+
+    # ---- passes ----
+    def _early(self, n: int) -> int:
+        es = self.planned[n] if self.planned[n] is not None else self.origin
+        for p, lag in self.pred[n].items():
+            es = max(es, self.ef[p] + lag)
+        return es
+
+    def _late(self, n: int) -> int:
+        lf = self.finish
+        for m, lag in self.succ[n].items():
+            lf = min(lf, self.ls[m] - lag)
+        return lf
+
+    def recompute(self) -> None:
+        """Full forward and backward pass in topological order."""
+        for n in self.order:
+            self.es[n] = self._early(n)
+            self.ef[n] = self.es[n] + self.duration[n]
+        self.finish = max(self.ef.values(), default=self.origin)
+        for n in reversed(self.order):
+            self.lf[n] = self._late(n)
+            self.ls[n] = self.lf[n] - self.duration[n]
+
+    def _propagate(self, forward_roots: Set[int], backward_roots: Set[int]) -> Set[int]:
+        """Forward pass over downstream nodes, backward pass over upstream nodes."""
+        touched: Set[int] = set()
+        heap = [(self.pos[n], n) for n in forward_roots]
+        heapq.heapify(heap)
+        queued = set(forward_roots)
+        while heap:
+            _, n = heapq.heappop(heap)
+            es = self._early(n)
+            ef = es + self.duration[n]
+            if n in self.es and (es, ef) == (self.es[n], self.ef[n]) and n not in forward_roots:
+                continue
+            self.es[n], self.ef[n] = es, ef
+            touched.add(n)
+            for m in self.succ[n]:
+                if m not in queued:
+                    queued.add(m)
+                    heapq.heappush(heap, (self.pos[m], m))
+
+        finish = max(self.ef.values(), default=self.origin)
+        if finish != self.finish:
+            self.finish = finish
+            for n in reversed(self.order):
+                self.lf[n] = self._late(n)
+                self.ls[n] = self.lf[n] - self.duration[n]
+            return set(self.order)
+
+        heap = [(-self.pos[n], n) for n in backward_roots]
+        heapq.heapify(heap)
+        queued = set(backward_roots)
+        roots = set(backward_roots)
+        while heap:
+            _, n = heapq.heappop(heap)
+            lf = self._late(n)
+            ls = lf - self.duration[n]
+            if n in self.lf and (ls, lf) == (self.ls[n], self.lf[n]) and n not in roots:
+                continue
+            self.lf[n], self.ls[n] = lf, ls
+            touched.add(n)
+            for p in self.pred[n]:
+                if p not in queued:
+                    queued.add(p)
+                    heapq.heappush(heap, (-self.pos[p], p))
+        return touched
+
+    # ---- results ----
+    def slack(self, node: int) -> int:
+        return self.ls[node] - self.es[node]
+
+    def critical_path(self) -> List[int]:
+        """Zero-slack tasks in topological order."""
+        return [n for n in self.order if self.ls[n] == self.es[n]]
+
+    def schedule(self) -> Dict[int, Dict]:
+        """Per task: earliest/latest start and finish as dates, slack in days, critical flag."""
+        as_date = date.fromordinal
+        return {
+            n: {
+                "earliest_start": as_date(self.es[n]),
+                "earliest_finish": as_date(self.ef[n]),
+                "latest_start": as_date(self.ls[n]),
+                "latest_finish": as_date(self.lf[n]),
+                "slack_days": self.ls[n] - self.es[n],
+                "critical": self.ls[n] == self.es[n],
+            }
+            for n in self.order
+        }
+
+    def projected_finish(self) -> date:
+        return date.fromordinal(self.finish)
+
+    def edges(self) -> Set[Tuple[int, int, int]]:
+        return {(p, s_, lag) for p, out in self.succ.items() for s_, lag in out.items()}
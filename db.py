@@ -20,15 +20,28 @@
 from __future__ import annotations
 
 import os
-from datetime import datetime, date
-from typing import Optional, List, Dict
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Iterable
 
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Date, DateTime, ForeignKey,
-    Enum, Float, UniqueConstraint, Boolean, CheckConstraint, text
+    create_engine, event, Column, Integer, BigInteger, String, Date, DateTime, ForeignKey,
+    Enum, Float, UniqueConstraint, Boolean, CheckConstraint, Index, inspect, text,
+    select, func, case, union_all, literal, null, Table, MetaData, cast, exists, literal_column, and_,
+    or_
 )
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session
-import hashlib
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, Session, aliased, object_session
+import uuid
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from critical_path import ScheduleGraph
+import search
+import recurrence
+import invalidation
+import routing
+import activity
+import pins
 
 #DB_URL = "sqlite:///data.db"
 #engine = create_engine(DB_URL, future=True, echo=False)
@@ -44,6 +57,7 @@ import hashlib
 try:
     import streamlit as st
     _secrets = getattr(st, "secrets", {})
+    _secrets.get("DATABASE_URL")  # raises outside `streamlit run` when no secrets.toml exists
 except Exception:
     _secrets = {}
 
@@ -51,10 +65,30 @@ DATABASE_URL = (_secrets.get("DATABASE_URL")
                 or os.getenv("DATABASE_URL")
                 or "sqlite:///strivio.db")
 
+# Optional read replica for read-only helpers (analytics, Gantt, project lists).
+DATABASE_READ_URL = (_secrets.get("DATABASE_READ_URL")
+                     or os.getenv("DATABASE_READ_URL")
+                     or None)
+
 engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
+read_engine = create_engine(DATABASE_READ_URL, pool_pre_ping=True, future=True) if DATABASE_READ_URL else None
+ReadSessionLocal = (sessionmaker(autocommit=False, autoflush=False, bind=read_engine, future=True)
+                    if read_engine is not None else None)
+router = routing.ReadRouter(SessionLocal, ReadSessionLocal,
+                            max_lag_seconds=float(os.getenv("DATABASE_READ_MAX_LAG", "5")))
 Base = declarative_base()
 
+def _read_session() -> Session:
+    """Session for read-only helpers: replica when healthy and caught up, else primary."""
+    return router.session()
+
+# Per-process read cache for project-scoped data; evicted on local commits and
+# by the invalidation listener when another replica writes. Entries are loaded on
+# the primary: a value read from a lagging replica would outlive the write that
+# evicted it, since nothing evicts it again until the next write.
+project_cache = invalidation.ProjectCache(load_context=router.use_primary)
+
 TASK_STATUSES = ("To-Do", "In Progress", "Done")
 
 class User(Base):
@@ -76,9 +110,13 @@ class Project(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     is_public = Column(Boolean, default=False, nullable=False)
     pin_hash  = Column(String, nullable=True)
+    pin_version = Column(Integer, default=0, nullable=False)   # bumped when the PIN changes, not on rehash
+    is_template = Column(Boolean, default=False, nullable=False)
 
     members = relationship("ProjectMember", back_populates="project", cascade="all, delete-orphan")
     tasks = relationship("Task", back_populates="project", cascade="all, delete-orphan")
+    daily_stats = relationship("ProjectDailyStat", cascade="all, delete-orphan")
+    recurrences = relationship("TaskRecurrence", cascade="all, delete-orphan")
 
 
 class ProjectMember(Base):
@@ -87,6 +125,8 @@ class ProjectMember(Base):
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     role = Column(String, default="viewer", nullable=False)  # owner | editor | viewer
+    revision = Column(BigInteger, default=0, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     project = relationship("Project", back_populates="members")
     user = relationship("User")
     __table_args__ = (UniqueConstraint("project_id", "user_id", name="uq_project_user"),
@@ -104,10 +144,22 @@ class Task(Base):
     end_date = Column(Date, nullable=True)
     assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     progress = Column(Float, default=0.0)  # 0..100
+    revision = Column(BigInteger, default=0, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    recurrence_id = Column(Integer, ForeignKey("task_recurrences.id", ondelete="SET NULL"), nullable=True)
+    occurrence_date = Column(Date, nullable=True)
 
     project = relationship("Project", back_populates="tasks")
     assignee = relationship("User")
     subtasks = relationship("SubTask", back_populates="task", cascade="all, delete-orphan")
+    successor_links = relationship("TaskDependency", foreign_keys="TaskDependency.predecessor_id",
+                                   cascade="all, delete-orphan")
+    predecessor_links = relationship("TaskDependency", foreign_keys="TaskDependency.successor_id",
+                                     cascade="all, delete-orphan")
+    # one task per series date, so materialising twice (or on two replicas) is a no-op
+    __table_args__ = (Index("uq_task_occurrence", "recurrence_id", "occurrence_date", unique=True),
+                      Index("ix_tasks_open_due", "end_date", "id", sqlite_where=text("status <> 'Done'"),
+                            postgresql_where=text("status <> 'Done'")))
 
 class SubTask(Base):
     __tablename__ = "subtasks"
@@ -119,12 +171,266 @@ class SubTask(Base):
     end_date = Column(Date, nullable=True)
     assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     progress = Column(Float, default=0.0)
+    revision = Column(BigInteger, default=0, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     task = relationship("Task", back_populates="subtasks")
     assignee = relationship("User")
+    __table_args__ = (Index("ix_subtasks_open_due", "end_date", "id", sqlite_where=text("status <> 'Done'"),
+                            postgresql_where=text("status <> 'Done'")),)
+
+class TaskRecurrence(Base):
+    """RRULE series; occurrences are ordinary tasks, materialised only up to a rolling horizon."""
+    __tablename__ = "task_recurrences"
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True, nullable=False)
+    name = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    duration_days = Column(Integer, default=0, nullable=False)   # end_date = occurrence + duration
+    rule = Column(String, nullable=False)                         # RRULE body, e.g. FREQ=WEEKLY;BYDAY=MO
+    dtstart = Column(Date, nullable=False)
+    materialized_through = Column(Date, nullable=True)
+    active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    assignee = relationship("User")
+
+class TaskDependency(Base):
+    """Finish-to-start link: successor may start `lag_days` after predecessor finishes."""
+    __tablename__ = "task_dependencies"
+    id = Column(Integer, primary_key=True)
+    predecessor_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), index=True, nullable=False)
+    successor_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), index=True, nullable=False)
+    lag_days = Column(Integer, default=0, nullable=False)
+    __table_args__ = (UniqueConstraint("predecessor_id", "successor_id", name="uq_task_dependency"),
+                      CheckConstraint("predecessor_id <> successor_id", name="ck_dependency_not_self"),
+                      )
+
+class ProjectDailyStat(Base):
+    """One row per project per day; powers burndown/burnup without history scans."""
+    __tablename__ = "project_daily_stats"
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    todo_count = Column(Integer, default=0, nullable=False)
+    in_progress_count = Column(Integer, default=0, nullable=False)
+    done_count = Column(Integer, default=0, nullable=False)
+    overdue_count = Column(Integer, default=0, nullable=False)
+    mean_progress = Column(Float, default=0.0, nullable=False)
+    __table_args__ = (UniqueConstraint("project_id", "day", name="uq_project_day"),)
+
+class RevisionCounter(Base):
+    """Single-row, database-wide change counter. Writers serialize on this row."""
+    __tablename__ = "revision_counter"
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, default=0, nullable=False)
+
+class ProjectRevision(Base):
+    """Latest revision per project; polled by other processes to evict caches."""
+    __tablename__ = "project_revisions"
+    project_id = Column(Integer, primary_key=True)
+    revision = Column(BigInteger, nullable=False, index=True)
+    changed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # tombstones at or below this revision were pruned; older clients must resync
+    tombstone_floor = Column(BigInteger, default=0, nullable=False)
+
+class Tombstone(Base):
+    """Deleted task/subtask/member, kept so delta-sync clients can drop it."""
+    __tablename__ = "tombstones"
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # task | subtask | member
+    item_id = Column(Integer, nullable=False)
+    revision = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (Index("ix_tombstones_project_revision", "project_id", "revision"),)
+
+class Job(Base):
+    """Background job (reports, exports); rows survive restarts and double as an artifact cache."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    project_id = Column(Integer, nullable=True, index=True)
+    params = Column(String, nullable=False, default="{}")   # JSON
+    revision = Column(BigInteger, nullable=False, default=0)
+    dedupe_key = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    progress = Column(Float, nullable=False, default=0.0)      # 0..1
+    message = Column(String, nullable=True)
+    artifact_path = Column(String, nullable=True)
+    requested_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String, nullable=True)       # "host:pid" of the worker running it
+    heartbeat_at = Column(DateTime, nullable=True)   # refreshed while it runs; stale = abandoned
+    __table_args__ = (CheckConstraint("status IN ('queued','running','done','failed')", name="ck_job_status"),
+                      Index("uq_jobs_active_dedupe", "dedupe_key", unique=True,
+                            sqlite_where=text("status IN ('queued','running')"),
+                            postgresql_where=text("status IN ('queued','running')")))
+
+class ActivityEntry(Base):
+    """Append-only change log; no FK so entries outlive deleted projects until retention drops them."""
+    __tablename__ = "activity_log"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    actor = Column(String, nullable=True)
+    action = Column(String(32), nullable=False)      # e.g. task.update, member.bulk
+    item_kind = Column(String(16), nullable=False)
+    item_id = Column(Integer, nullable=True)
+    summary = Column(String(500), nullable=False, default="")
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    __table_args__ = (Index("ix_activity_project_id", "project_id", "id"),)
+
+class DueItem(Base):
+    """
+    Open items that are overdue or due within the horizon, kept by the due-date scanner
+    (daily) and the write path (between scans). Readers bucket by end_date vs today.
+    """
+    __tablename__ = "due_items"
+    item_kind = Column(String(8), primary_key=True)      # task | subtask
+    item_id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    status = Column(String(16), nullable=False)
+    end_date = Column(Date, nullable=False)
+    assignee_email = Column(String, nullable=True)
+    progress = Column(Float, nullable=False, default=0.0)
+    seen_at = Column(DateTime, nullable=False)           # rows not seen by the latest scan are dropped
+    __table_args__ = (Index("ix_due_items_project_end", "project_id", "end_date"),
+                      Index("ix_due_items_end_assignee", "end_date", "assignee_email"))
+
+class DueScan(Base):
+    __tablename__ = "due_scans"
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    horizon_days = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    items = Column(Integer, nullable=False, default=0)
+
+class AuthRevocation(Base):
+    """Signed-out session tokens (jti) and project member-role changes that outdate cached roles."""
+    __tablename__ = "auth_revocations"
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(32), nullable=True)
+    project_id = Column(Integer, nullable=True)
+    at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=True)   # jti rows: the token's own expiry
+
+class Notification(Base):
+    """One queued event for one recipient; the notifier coalesces pending rows into a digest."""
+    __tablename__ = "notifications"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    recipient = Column(String, nullable=False)          # email
+    project_id = Column(Integer, nullable=False)
+    kind = Column(String(16), nullable=False)           # assigned | due_soon | overdue
+    item_kind = Column(String(16), nullable=False)      # task | subtask
+    item_id = Column(Integer, nullable=False)
+    text = Column(String(500), nullable=False)
+    dedupe_key = Column(String, nullable=False, unique=True)
+    status = Column(String(8), nullable=False, default="pending")   # pending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(500), nullable=True)
+    claim_token = Column(String(32), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    __table_args__ = (Index("ix_notifications_status_recipient", "status", "recipient", "created_at"),)
+
+class ArchivedTask(Base):
+    """Finished task moved out of `tasks` by archive_items(); read on demand, restorable."""
+    __tablename__ = "archived_tasks"
+    id = Column(Integer, primary_key=True)
+    original_id = Column(Integer, nullable=False)        # tasks.id before archiving (SQLite may reuse it)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)
+    description = Column(String, nullable=True)
+    status = Column(String(16), nullable=False)
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True)
+    assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    progress = Column(Float, default=0.0)
+    updated_at = Column(DateTime, nullable=True)
+    recurrence_id = Column(Integer, nullable=True)
+    occurrence_date = Column(Date, nullable=True)
+    archive_revision = Column(BigInteger, nullable=False)   # the archiving transaction
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    assignee = relationship("User")
+    __table_args__ = (Index("ix_archived_tasks_project_id", "project_id", "id"),
+                      Index("ix_archived_tasks_batch", "archive_revision", "original_id"))
+
+class ArchivedSubTask(Base):
+    __tablename__ = "archived_subtasks"
+    id = Column(Integer, primary_key=True)
+    archived_task_id = Column(Integer, ForeignKey("archived_tasks.id", ondelete="CASCADE"), index=True, nullable=False)
+    project_id = Column(Integer, nullable=False, index=True)
+    original_id = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    status = Column(String(16), nullable=False)
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True)
+    assignee_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    progress = Column(Float, default=0.0)
+    updated_at = Column(DateTime, nullable=True)
+
+class ArchiveRollup(Base):
+    """Per-project totals of the archive tables, so analytics count archived work without reading it."""
+    __tablename__ = "archive_rollups"
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    tasks = Column(Integer, default=0, nullable=False)
+    subtasks = Column(Integer, default=0, nullable=False)
+    task_progress = Column(Float, default=0.0, nullable=False)      # sums, for weighted means
+    subtask_progress = Column(Float, default=0.0, nullable=False)
+    first_start = Column(Date, nullable=True)
+    last_end = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Columns added after the first release; create_all() does not alter existing tables.
+_ADDED_COLUMNS = {
+    "tasks": {"revision": "BIGINT NOT NULL DEFAULT 0", "updated_at": "TIMESTAMP"},
+    "subtasks": {"revision": "BIGINT NOT NULL DEFAULT 0", "updated_at": "TIMESTAMP"},
+    "project_members": {"revision": "BIGINT NOT NULL DEFAULT 0", "updated_at": "TIMESTAMP"},
+    "project_revisions": {"tombstone_floor": "BIGINT NOT NULL DEFAULT 0"},
+    "projects": {"is_template": "BOOLEAN NOT NULL DEFAULT FALSE", "pin_version": "INTEGER NOT NULL DEFAULT 0"},
+}
+_ADDED_COLUMNS["tasks"].update({
+    "recurrence_id": "INTEGER REFERENCES task_recurrences(id) ON DELETE SET NULL",
+    "occurrence_date": "DATE",
+})
+_ADDED_COLUMNS["jobs"] = {"claimed_by": "VARCHAR", "heartbeat_at": "TIMESTAMP"}
+_ADDED_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_task_occurrence ON tasks (recurrence_id, occurrence_date)",
+    # one active job per dedupe key: older releases could queue duplicates, keep the newest
+    "UPDATE jobs SET status = 'failed', message = 'Superseded by an identical job' "
+    "WHERE status IN ('queued','running') AND id NOT IN "
+    "(SELECT max(id) FROM jobs WHERE status IN ('queued','running') GROUP BY dedupe_key)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_active_dedupe ON jobs (dedupe_key) WHERE status IN ('queued','running')",
+    "CREATE INDEX IF NOT EXISTS ix_tasks_open_due ON tasks (end_date, id) WHERE status <> 'Done'",
+    "CREATE INDEX IF NOT EXISTS ix_subtasks_open_due ON subtasks (end_date, id) WHERE status <> 'Done'",
+]
+
+def _ensure_columns() -> None:
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table, cols in _ADDED_COLUMNS.items():
+            existing = {c["name"] for c in insp.get_columns(table)}
+            for name, ddl in cols.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    if name == "revision":
+                        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_revision ON {table} (revision)"))
+        for ddl in _ADDED_INDEXES:
+            conn.execute(text(ddl))
 
 def init_db():
     Base.metadata.create_all(engine)
+    _ensure_columns()
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM revision_counter WHERE id = 1")).first() is None:
+            conn.execute(text("INSERT INTO revision_counter (id, value) VALUES (1, 0)"))
+    search.init_search_index(engine)
 
 def _get_or_create_user(session, email: str, name: Optional[str] = None) -> User:
     user = session.query(User).filter(User.email == email.strip().lower()).one_or_none()
@@ -134,12 +440,327 @@ def _get_or_create_user(session, email: str, name: Optional[str] = None) -> User
         session.commit()
     return user
 
+def _member_assignee_id(session, project_id: int, email: Optional[str], keep_id: Optional[int] = None) -> Optional[int]:
+    """
+    User id for assigning `email` in a project: it must belong to a member (unknown or
+    mistyped emails are rejected instead of creating users). The current assignee
+    (`keep_id`) stays valid on re-save even after leaving the project.
+    """
+    email = email.strip().lower() if isinstance(email, str) else ""   # None / NaN from a grid cell
+    if not email:
+        return None
+    row = (
+        session.query(User.id, ProjectMember.id)
+        .outerjoin(ProjectMember, and_(ProjectMember.user_id == User.id, ProjectMember.project_id == project_id))
+        .filter(User.email == email)
+        .first()
+    )
+    if row is None or (row[1] is None and row[0] != keep_id):
+        raise ValueError(f"{email} is not a member of this project")
+    return row[0]
+
+def _project_items(project_ids):
+    """
+    SELECT (project_id, status, start_date, end_date, progress) over tasks + subtasks.
+    `project_ids` may be a list or a SELECT of ids.
+    """
+    tasks_q = (
+        select(Task.project_id.label("project_id"), Task.status.label("status"),
+               Task.start_date.label("start_date"), Task.end_date.label("end_date"),
+               Task.progress.label("progress"))
+        .where(Task.project_id.in_(project_ids))
+    )
+    subs_q = (
+        select(Task.project_id.label("project_id"), SubTask.status.label("status"),
+               SubTask.start_date.label("start_date"), SubTask.end_date.label("end_date"),
+               SubTask.progress.label("progress"))
+        .join(Task, SubTask.task_id == Task.id)
+        .where(Task.project_id.in_(project_ids))
+    )
+    return union_all(tasks_q, subs_q).subquery()
+
+def _snapshot_counts(s: Session, project_id: int, day: date) -> Dict:
+    items = _project_items([project_id])
+    row = s.execute(
+        select(
+            func.sum(case((items.c.status == "To-Do", 1), else_=0)),
+            func.sum(case((items.c.status == "In Progress", 1), else_=0)),
+            func.sum(case((items.c.status == "Done", 1), else_=0)),
+            func.sum(case(((items.c.end_date < day) & (items.c.status != "Done"), 1), else_=0)),
+            func.sum(func.coalesce(items.c.progress, 0)),
+            func.count(),
+        )
+    ).one()
+    # archived items are all Done; their rollup keeps them in the counts without a scan
+    arch = s.get(ArchiveRollup, project_id)
+    n_arch = arch.tasks + arch.subtasks if arch else 0
+    progress = float(row[4] or 0) + (arch.task_progress + arch.subtask_progress if arch else 0.0)
+    n = int(row[5] or 0) + n_arch
+    return {
+        "todo_count": int(row[0] or 0),
+        "in_progress_count": int(row[1] or 0),
+        "done_count": int(row[2] or 0) + n_arch,
+        "overdue_count": int(row[3] or 0),
+        "mean_progress": round(progress / n, 2) if n else 0.0,
+    }
+
+def _record_daily_stats(s: Session, project_id: int, day: Optional[date] = None) -> None:
+    """Upsert today's snapshot row; earlier days are never rewritten."""
+    day = day or date.today()
+    counts = _snapshot_counts(s, project_id, day)
+    row = s.query(ProjectDailyStat).filter_by(project_id=project_id, day=day).one_or_none()
+    if row is None:
+        s.add(ProjectDailyStat(project_id=project_id, day=day, **counts))
+    else:
+        for k, v in counts.items():
+            setattr(row, k, v)
+
+def _next_revision(s: Session) -> int:
+    """Take the next database-wide revision; the row lock is held until commit."""
+    s.execute(text("UPDATE revision_counter SET value = value + 1 WHERE id = 1"))
+    return int(s.execute(text("SELECT value FROM revision_counter WHERE id = 1")).scalar_one())
+
+def _session_revision(s: Session) -> int:
+    """One revision per transaction, shared by every row it stamps."""
+    if "revision" not in s.info:
+        s.info["revision"] = _next_revision(s)
+    return s.info["revision"]
+
+_TRACKED = {Task: "task", SubTask: "subtask", ProjectMember: "member"}
+
+def _tracked_project_id(obj) -> Optional[int]:
+    if isinstance(obj, SubTask):
+        task = obj.task
+        if task is None and obj.task_id is not None:   # new subtask: `task` is not loaded during the flush
+            s = object_session(obj)
+            task = s.get(Task, obj.task_id) if s is not None else None
+        return task.project_id if task is not None else None
+    return obj.project_id
+
+@event.listens_for(SessionLocal, "before_flush")
+def _stamp_revisions(session, flush_context, instances) -> None:
+    """Stamp changed tasks/subtasks/members with the transaction's revision; tombstone deletes."""
+    changed = [o for o in list(session.new) + list(session.dirty)
+               if type(o) in _TRACKED and (o in session.new or session.is_modified(o))]
+    deleted = [o for o in session.deleted if type(o) in _TRACKED]
+    if not changed and not deleted:
+        return
+    rev = _session_revision(session)
+    for obj in changed:
+        obj.revision = rev
+    for obj in deleted:
+        pid = _tracked_project_id(obj)
+        if pid is not None:
+            session.add(Tombstone(project_id=pid, kind=_TRACKED[type(obj)], item_id=obj.id, revision=rev))
+
+def _bump_project(s: Session, project_id: int) -> int:
+    """Record a new project revision and announce it to other processes on commit."""
+    rev = _session_revision(s)
+    row = s.get(ProjectRevision, project_id)
+    if row is None:
+        s.add(ProjectRevision(project_id=project_id, revision=rev))
+    else:
+        row.revision = rev
+    invalidation.publish(s.connection(), project_id)
+    s.info.setdefault("changed_projects", set()).add(project_id)
+    return rev
+
+@event.listens_for(SessionLocal, "after_commit")
+def _evict_committed(session) -> None:
+    router.note_write(session.info.pop("revision", None))
+    changed = session.info.pop("changed_projects", None)
+    if changed:
+        project_cache.evict(changed)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_rolled_back(session) -> None:
+    session.info.pop("revision", None)
+    session.info.pop("changed_projects", None)
+    session.info.pop("activity", None)
+
+# ---- activity log capture ----
+activity_writer = activity.ActivityWriter(engine, ActivityEntry.__table__)
+
+_AUDITED = {Project: "project", Task: "task", SubTask: "subtask", ProjectMember: "member",
+            TaskDependency: "dependency"}
+_AUDIT_FIELDS = {
+    Project: ("name", "start_date", "end_date", "description", "is_public", "is_template"),
+    Task: ("name", "status", "start_date", "end_date", "assignee_id", "progress", "description"),
+    SubTask: ("name", "status", "start_date", "end_date", "assignee_id", "progress"),
+    ProjectMember: ("role",),
+    TaskDependency: ("lag_days",),
+}
+
+def _log_activity(s: Session, project_id: int, action: str, item_kind: str,
+                  item_id: Optional[int] = None, summary: str = "") -> None:
+    """Queue an entry with this transaction; it is written only if the transaction commits."""
+    s.info.setdefault("activity", []).append(activity.entry(project_id, action, item_kind, item_id, summary))
+
+def _audit_label(s: Session, obj) -> str:
+    if isinstance(obj, ProjectMember):
+        u = s.get(User, obj.user_id)
+        return f"{u.email if u else obj.user_id} as {obj.role}"
+    if isinstance(obj, TaskDependency):
+        names = [getattr(s.get(Task, i), "name", i) for i in (obj.predecessor_id, obj.successor_id)]
+        return f"{names[0]} -> {names[1]}"
+    return obj.name or ""
+
+def _audit_project_id(s: Session, obj) -> Optional[int]:
+    if isinstance(obj, Project):
+        return obj.id
+    if isinstance(obj, TaskDependency):
+        t = s.get(Task, obj.predecessor_id)
+        return t.project_id if t is not None else None
+    return _tracked_project_id(obj)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_activity(session, flush_context) -> None:
+    """Turn flushed ORM changes into activity entries (history is still readable here)."""
+    if session.info.get("activity_bulk"):
+        return   # bulk helpers log one summary entry instead of one per row
+    dropped_projects = {o.id for o in session.deleted if isinstance(o, Project)}
+    email_of = lambda uid: getattr(session.get(User, uid), "email", uid) if uid else None
+    for verb, objs in (("create", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objs:
+            kind = _AUDITED.get(type(obj))
+            if kind is None:
+                continue
+            pid = _audit_project_id(session, obj)
+            if pid is None or (kind != "project" and pid in dropped_projects):
+                continue
+            if verb == "update":
+                summary = activity.describe_changes(obj, _AUDIT_FIELDS[type(obj)], {"assignee_id": email_of})
+                if not summary:
+                    continue
+                summary = f"{_audit_label(session, obj)}: {summary}"
+            else:
+                summary = _audit_label(session, obj)
+            _log_activity(session, pid, f"{kind}.{verb}", kind, obj.id, summary)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _queue_activity(session) -> None:
+    entries = session.info.pop("activity", None)
+    if entries:
+        activity_writer.submit(entries)
+
+# ---- member-role changes (outdate roles cached in session tokens) ----
+def _note_role_change(conn, project_ids) -> None:
+    now = datetime.utcnow()
+    rows = [{"project_id": int(p), "at": now} for p in sorted(set(project_ids))]
+    if rows:
+        conn.execute(AuthRevocation.__table__.insert(), rows)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_role_changes(session, flush_context) -> None:
+    dropped = {o.id for o in session.deleted if isinstance(o, Project)}
+    pids = {o.project_id for o in list(session.new) + list(session.dirty) + list(session.deleted)
+            if isinstance(o, ProjectMember) and o.project_id not in dropped}
+    if pids:
+        _note_role_change(session.connection(), pids)
+
+# ---- due-date tracking ----
+DUE_HORIZON_DAYS = int(os.getenv("STRIVIO_DUE_HORIZON_DAYS", "14"))
+
+def _upsert_due_items(conn, rows: List[Dict]) -> None:
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        ins = _insert_for(conn, DueItem.__table__)
+        conn.execute(ins.on_conflict_do_update(
+            index_elements=["item_kind", "item_id"],
+            set_={c: getattr(ins.excluded, c) for c in rows[0] if c not in ("item_kind", "item_id")}), rows)
+        return
+    for r in rows:
+        conn.execute(DueItem.__table__.delete().where(DueItem.item_kind == r["item_kind"],
+                                                      DueItem.item_id == r["item_id"]))
+    conn.execute(DueItem.__table__.insert(), rows)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_due_items(session, flush_context) -> None:
+    """Keep due_items exact between scans: add, refresh or drop the items this flush touched."""
+    today, now = date.today(), datetime.utcnow()
+    horizon = today + timedelta(days=DUE_HORIZON_DAYS)
+    upserts, drops = [], []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if type(obj) not in (Task, SubTask) or obj.id is None:
+            continue
+        kind = _TRACKED[type(obj)]
+        pid = _tracked_project_id(obj) if obj not in session.deleted else None
+        if pid is None or obj.status == "Done" or obj.end_date is None or obj.end_date > horizon:
+            drops.append((kind, obj.id))
+            continue
+        assignee = session.get(User, obj.assignee_id) if obj.assignee_id else None
+        upserts.append({"item_kind": kind, "item_id": obj.id, "project_id": pid, "name": obj.name,
+                        "status": obj.status, "end_date": obj.end_date,
+                        "assignee_email": assignee.email if assignee else None,
+                        "progress": float(obj.progress or 0), "seen_at": now})
+    conn = session.connection()
+    for kind in ("task", "subtask"):
+        ids = [i for k, i in drops if k == kind]
+        if ids:
+            conn.execute(DueItem.__table__.delete().where(DueItem.item_kind == kind, DueItem.item_id.in_(ids)))
+    if upserts:
+        _upsert_due_items(conn, upserts)
+
+# ---- notification capture ----
+NOTIFY_DUE_SOON_DAYS = int(os.getenv("STRIVIO_NOTIFY_DUE_SOON_DAYS", "2"))
+NOTIFY_MAX_ATTEMPTS = 5
+
+def _insert_notifications(s: Session, rows: List[Dict]) -> None:
+    ins = _insert_for(s, Notification.__table__)
+    if ins is not None:
+        s.connection().execute(ins.on_conflict_do_nothing(index_elements=["dedupe_key"]), rows)
+        return
+    known = set(s.connection().scalars(select(Notification.dedupe_key)
+                                        .where(Notification.dedupe_key.in_([r["dedupe_key"] for r in rows]))))
+    rows = [r for r in rows if r["dedupe_key"] not in known]
+    if rows:
+        s.connection().execute(Notification.__table__.insert(), rows)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_assignments(session, flush_context) -> None:
+    """Queue an 'assigned' notification when a task/subtask gets a (new) assignee."""
+    if session.info.get("activity_bulk"):
+        return   # imports and clones are not assignments anyone made
+    actor = activity.actor.get()
+    rows, now = [], datetime.utcnow()
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) not in (Task, SubTask) or not obj.assignee_id:
+            continue
+        if obj not in session.new and not inspect(obj).attrs.assignee_id.history.added:
+            continue
+        user = session.get(User, obj.assignee_id)
+        pid = _tracked_project_id(obj)
+        if user is None or pid is None or user.email == actor:
+            continue   # nobody needs mail about assigning themselves
+        kind = _TRACKED[type(obj)]
+        due = f", due {obj.end_date.isoformat()}" if obj.end_date else ""
+        rows.append({
+            "recipient": user.email, "project_id": pid, "kind": "assigned", "item_kind": kind,
+            "item_id": obj.id, "text": f"{obj.name}{due} (assigned by {actor or 'someone'})"[:500],
+            "dedupe_key": f"assigned|{kind}|{obj.id}|{obj.assignee_id}|{_session_revision(session)}",
+            "status": "pending", "attempts": 0, "created_at": now,
+        })
+    if rows:
+        _insert_notifications(session, rows)
+
+def _on_project_write(s: Session, project_id: int) -> None:
+    """Called by the write helpers right before they commit."""
+    s.flush()
+    _record_daily_stats(s, project_id)
+    _bump_project(s, project_id)
+
 # ---- helpers ----
 def login(email: str, name: Optional[str] = None) -> Dict:
     with SessionLocal() as s:
         user = _get_or_create_user(s, email, name)
         return {"id": user.id, "email": user.email, "name": user.name}
 
+@router.read_only
+def get_user(user_id: int) -> Optional[Dict]:
+    with _read_session() as s:
+        user = s.get(User, user_id)
+        return None if user is None else {"id": user.id, "email": user.email, "name": user.name}
+
 def create_project(owner_email: str, name: str, start: date, end: date,
                    member_emails: Optional[List[str]] = None,
                    is_public: bool = False, pin: Optional[str] = None) -> int:
@@ -152,73 +773,195 @@ def create_project(owner_email: str, name: str, start: date, end: date,
         )
         s.add(p); s.flush()
         s.add(ProjectMember(project_id=p.id, user_id=owner.id, role="owner"))
-        for e in member_emails:
-            if e and e.strip():
-                u = _get_or_create_user(s, e)
-                if u.id != owner.id:
-                    s.add(ProjectMember(project_id=p.id, user_id=u.id, role="viewer"))
+        others = [e for e in _normalise_emails(member_emails) if e != owner.email]
+        if others and _insert_for(s, ProjectMember.__table__) is not None:
+            s.flush()
+            _users_by_email(s, others)
+            _upsert_members(s, p.id, others, "viewer")
+        else:
+            for uid in _users_by_email(s, others).values():
+                s.add(ProjectMember(project_id=p.id, user_id=uid, role="viewer"))
+        _on_project_write(s, p.id)
         s.commit()
         return p.id
 
+@router.read_only
 def get_projects_for_user(user_email: str) -> List[Project]:
-    with SessionLocal() as s:
-        user = _get_or_create_user(s, user_email)
+    with _read_session() as s:
         q = (
             s.query(Project)
             .join(ProjectMember, ProjectMember.project_id == Project.id)
-            .filter(ProjectMember.user_id == user.id)
+            .join(User, User.id == ProjectMember.user_id)
+            .filter(User.email == user_email.strip().lower())
             .order_by(Project.created_at.desc())
         )
         return q.all()
 
+@router.read_only
+def get_portfolio_for_user(user_email: str, today: Optional[date] = None) -> List[Dict]:
+    """
+    One row per project the user belongs to, with item counts, overdue items,
+    mean progress and the task date range, archived work included through its
+    rollup. Single grouped query (one round trip).
+    """
+    today = today or date.today()
+    email = user_email.strip().lower()
+    member_pids = (
+        select(ProjectMember.project_id)
+        .join(User, User.id == ProjectMember.user_id)
+        .where(User.email == email)
+    )
+    items = _project_items(member_pids)
+    agg = (
+        select(
+            items.c.project_id,
+            func.count().label("item_count"),
+            func.sum(case((items.c.status == "Done", 1), else_=0)).label("done"),
+            func.sum(case(((items.c.end_date < today) & (items.c.status != "Done"), 1), else_=0)).label("overdue"),
+            func.sum(func.coalesce(items.c.progress, 0)).label("progress"),
+            func.min(items.c.start_date).label("first_start"),
+            func.max(items.c.end_date).label("last_end"),
+        )
+        .group_by(items.c.project_id)
+        .subquery()
+    )
+    q = (
+        select(
+            Project.id, Project.name, Project.start_date, Project.end_date, Project.is_public,
+            ProjectMember.role, agg.c.item_count, agg.c.done, agg.c.overdue, agg.c.progress,
+            agg.c.first_start, agg.c.last_end,
+            ArchiveRollup.tasks.label("arch_tasks"), ArchiveRollup.subtasks.label("arch_subtasks"),
+            ArchiveRollup.task_progress.label("arch_task_progress"),
+            ArchiveRollup.subtask_progress.label("arch_subtask_progress"),
+            ArchiveRollup.first_start.label("arch_first_start"), ArchiveRollup.last_end.label("arch_last_end"),
+        )
+        .join(ProjectMember, ProjectMember.project_id == Project.id)
+        .join(User, User.id == ProjectMember.user_id)
+        .outerjoin(agg, agg.c.project_id == Project.id)
+        .outerjoin(ArchiveRollup, ArchiveRollup.project_id == Project.id)
+        .where(User.email == email)
+        .order_by(Project.created_at.desc())
+    )
+    out = []
+    with _read_session() as s:
+        for r in s.execute(q):
+            n_arch = int(r.arch_tasks or 0) + int(r.arch_subtasks or 0)
+            n = int(r.item_count or 0) + n_arch
+            progress = float(r.progress or 0) + float(r.arch_task_progress or 0) + float(r.arch_subtask_progress or 0)
+            starts = [d for d in (r.first_start, r.arch_first_start) if d is not None]
+            ends = [d for d in (r.last_end, r.arch_last_end) if d is not None]
+            out.append({
+                "id": r.id,
+                "name": r.name,
+                "start_date": r.start_date,
+                "end_date": r.end_date,
+                "is_public": bool(r.is_public),
+                "role": r.role,
+                "items": n,
+                "done": int(r.done or 0) + n_arch,
+                "overdue": int(r.overdue or 0),
+                "progress": round(progress / n, 1) if n else 0.0,
+                "first_start": min(starts) if starts else None,
+                "last_end": max(ends) if ends else None,
+            })
+    return out
+
+@router.read_only
+def list_users(after_id: int = 0, limit: int = 10000) -> List[tuple]:
+    """(id, email, name) of users after `after_id` in id order; keyset pages for people.py."""
+    with _read_session() as s:
+        return [tuple(r) for r in s.query(User.id, User.email, User.name)
+                                   .filter(User.id > after_id).order_by(User.id).limit(limit)]
+
+@router.read_only
 def get_project(project_id: int) -> Optional[Project]:
-    with SessionLocal() as s:
+    with _read_session() as s:
         return s.get(Project, project_id)
 
+def _upsert_task(s: Session, project_id: int, name: str, status: str, start: Optional[date], end: Optional[date],
+                 assignee_email: Optional[str], description: Optional[str] = None, task_id: Optional[int] = None,
+                 progress: float = 0.0) -> Task:
+    if task_id:
+        t = s.get(Task, task_id)
+        if not t or t.project_id != project_id:
+            raise ValueError("Task not found")
+        assignee_id = _member_assignee_id(s, t.project_id, assignee_email, keep_id=t.assignee_id)
+        t.name, t.status, t.start_date, t.end_date = name, status, start, end
+        t.assignee_id, t.description, t.progress = assignee_id, description, progress
+    else:
+        assignee_id = _member_assignee_id(s, project_id, assignee_email)
+        t = Task(project_id=project_id, name=name, status=status, start_date=start, end_date=end,
+                 assignee_id=assignee_id, description=description, progress=progress)
+        s.add(t)
+    return t
+
 def add_or_update_task(project_id: int, name: str, status: str, start: Optional[date], end: Optional[date],
                        assignee_email: Optional[str], description: Optional[str] = None, task_id: Optional[int] = None,
                        progress: float = 0.0) -> int:
     with SessionLocal() as s:
-        assignee_id = None
-        if assignee_email:
-            assignee_id = _get_or_create_user(s, assignee_email).id
         if task_id:
-            t = s.get(Task, task_id)
-            if not t:
-                raise ValueError("Task not found")
-            t.name, t.status, t.start_date, t.end_date = name, status, start, end
-            t.assignee_id, t.description, t.progress = assignee_id, description, progress
-        else:
-            t = Task(project_id=project_id, name=name, status=status, start_date=start, end_date=end,
-                     assignee_id=assignee_id, description=description, progress=progress)
-            s.add(t)
+            project_id = s.query(Task.project_id).filter(Task.id == task_id).scalar() or project_id
+        t = _upsert_task(s, project_id, name, status, start, end, assignee_email, description, task_id, progress)
+        _on_project_write(s, t.project_id)
         s.commit()
         return t.id
+
+def save_task_edits(project_id: int, rows: List[Dict], deleted_ids: Iterable[int] = ()) -> int:
+    """
+    Apply a task grid save in one transaction: delete `deleted_ids`, then upsert `rows`
+    (add_or_update_task keywords, `task_id` None for new rows). Any invalid row (e.g. an
+    assignee who is not a member) raises ValueError and nothing is written. Returns rows saved.
+    """
+    with SessionLocal() as s:
+        for tid in deleted_ids:
+            t = s.get(Task, int(tid))
+            if t is not None and t.project_id == project_id:
+                s.delete(t)
+        for r in rows:
+            _upsert_task(s, project_id, **r)
+        _on_project_write(s, project_id)
+        s.commit()
+        return len(rows)
         
+def _kdf_result(fut):
+    """Wait for a PIN hash/verify running on the pins pool, at most pins.TIMEOUT seconds."""
+    try:
+        return fut.result(timeout=pins.TIMEOUT)
+    except FutureTimeoutError:
+        raise ValueError("PIN check timed out; try again shortly") from None
+
 def _hash_pin(pin: str | None) -> str | None:
     if not pin:
         return None
-    return hashlib.sha256(pin.encode("utf-8")).hexdigest()
+    return _kdf_result(pins.hash_pin_async(pin))
 
 def delete_task(task_id: int) -> None:
     with SessionLocal() as s:
         t = s.get(Task, task_id)
         if t:
             s.delete(t)
+            _on_project_write(s, t.project_id)
             s.commit()
 
 def delete_subtask(subtask_id: int) -> None:
     with SessionLocal() as s:
         st = s.get(SubTask, subtask_id)
         if st:
+            project_id = st.task.project_id
             s.delete(st)
+            _on_project_write(s, project_id)
             s.commit()
 
 def delete_project(project_id: int) -> None:
     with SessionLocal() as s:
         p = s.get(Project, project_id)
         if p:
+            for model in (ArchivedSubTask, ArchivedTask, ArchiveRollup):
+                s.query(model).filter(model.project_id == project_id).delete(synchronize_session=False)
             s.delete(p)  
+            _bump_project(s, project_id)
+            s.flush()
+            s.query(Tombstone).filter(Tombstone.project_id == project_id).delete(synchronize_session=False)
             s.commit()
 
 def rename_project(project_id: int, new_name: str) -> None:
@@ -226,6 +969,7 @@ def rename_project(project_id: int, new_name: str) -> None:
         p = s.get(Project, project_id)
         if p:
             p.name = new_name.strip()
+            _bump_project(s, project_id)
             s.commit()
 
 def update_project_dates(project_id: int, start_date: date, end_date: date) -> bool:
@@ -239,6 +983,7 @@ def update_project_dates(project_id: int, start_date: date, end_date: date) -> b
                 return False
             p.start_date = start_date
             p.end_date = end_date
+            _bump_project(s, project_id)
             s.commit()
             return True
     except Exception:
@@ -253,6 +998,7 @@ def update_project_description(project_id: int, new_description: str) -> bool:
         if not p:
             return False
         p.description = new_description
+        _bump_project(s, project_id)
         s.commit()
         return True
 
@@ -266,44 +1012,111 @@ def set_member_role(project_id: int, email: str, role: str = "viewer"):
             s.add(m)
         else:
             m.role = role
+        _bump_project(s, project_id)
         s.commit()
 
+@router.read_only
 def get_user_role(project_id: int, email: str) -> str | None:
-    with SessionLocal() as s:
-        u = _get_or_create_user(s, email)
-        m = s.query(ProjectMember).filter_by(project_id=project_id, user_id=u.id).one_or_none()
+    with _read_session() as s:
+        m = (
+            s.query(ProjectMember.role)
+            .join(User, User.id == ProjectMember.user_id)
+            .filter(ProjectMember.project_id == project_id, User.email == email.strip().lower())
+            .one_or_none()
+        )
         return m.role if m else None
 
+@router.read_only
+def _pin_record(project_id: int) -> Optional[tuple]:
+    with _read_session() as s:
+        row = s.query(Project.is_public, Project.pin_hash).filter(Project.id == project_id).one_or_none()
+        return tuple(row) if row else None
+
 def check_project_pin(project_id: int, pin: str | None) -> bool:
+    """
+    Verify against the cached hash (no project read per attempt); the KDF runs on the pins pool and
+    a slow or saturated pool raises ValueError. A correct PIN against a legacy or weaker hash is
+    rehashed in place; pin_version stays the same.
+    """
+    rec = project_cache.get_or_load(project_id, "pin", lambda: _pin_record(project_id))
+    if rec is None or rec[0]:
+        return True
+    ok, rehash = _kdf_result(pins.verify_pin_async(pin or "", rec[1]))
+    if ok and rehash:
+        new_hash = _hash_pin(pin)
+        with SessionLocal() as s:
+            # compare-and-set: a concurrent PIN change wins over the upgrade
+            s.query(Project).filter(Project.id == project_id, Project.pin_hash == rec[1]) \
+                .update({"pin_hash": new_hash}, synchronize_session=False)
+            s.commit()
+        project_cache.evict([project_id])
+    return ok
+
+def set_project_pin(project_id: int, pin: str) -> int:
+    """Replace the PIN; bumps pin_version so every session has to unlock again. Returns it."""
+    if not pin:
+        raise ValueError("PIN must not be empty")
+    pin_hash = _hash_pin(pin)
     with SessionLocal() as s:
         p = s.get(Project, project_id)
-        if not p or p.is_public:
-            return True
-        return p.pin_hash == _hash_pin(pin or "")
+        if p is None:
+            raise ValueError("Project not found")
+        p.pin_hash = pin_hash
+        p.pin_version = int(p.pin_version or 0) + 1
+        p.is_public = False
+        _bump_project(s, project_id)
+        s.commit()
+        return p.pin_version
+
+def _upsert_subtask(s: Session, project_id: int, task_id: int, name: str, status: str, start: Optional[date],
+                    end: Optional[date], assignee_email: Optional[str], subtask_id: Optional[int] = None,
+                    progress: float = 0.0) -> SubTask:
+    if subtask_id:
+        st = s.get(SubTask, subtask_id)
+        if not st or st.task_id != task_id:
+            raise ValueError("Subtask not found")
+        assignee_id = _member_assignee_id(s, project_id, assignee_email, keep_id=st.assignee_id)
+        st.name, st.status, st.start_date, st.end_date = name, status, start, end
+        st.assignee_id, st.progress = assignee_id, progress
+    else:
+        assignee_id = _member_assignee_id(s, project_id, assignee_email)
+        st = SubTask(task_id=task_id, name=name, status=status, start_date=start, end_date=end,
+                     assignee_id=assignee_id, progress=progress)
+        s.add(st)
+    return st
 
 def add_or_update_subtask(task_id: int, name: str, status: str, start: Optional[date], end: Optional[date],
                           assignee_email: Optional[str], subtask_id: Optional[int] = None,
                           progress: float = 0.0) -> int:
     with SessionLocal() as s:
-        assignee_id = None
-        if assignee_email:
-            assignee_id = _get_or_create_user(s, assignee_email).id
-        if subtask_id:
-            st = s.get(SubTask, subtask_id)
-            if not st:
-                raise ValueError("Subtask not found")
-            st.name, st.status, st.start_date, st.end_date = name, status, start, end
-            st.assignee_id, st.progress = assignee_id, progress
-        else:
-            st = SubTask(task_id=task_id, name=name, status=status, start_date=start, end_date=end,
-                         assignee_id=assignee_id, progress=progress)
-            s.add(st)
+        project_id = s.query(Task.project_id).filter(Task.id == task_id).scalar()
+        if project_id is None:
+            raise ValueError("Task not found")
+        st = _upsert_subtask(s, project_id, task_id, name, status, start, end, assignee_email, subtask_id, progress)
+        _on_project_write(s, project_id)
         s.commit()
         return st.id
 
+def save_subtask_edits(task_id: int, rows: List[Dict], deleted_ids: Iterable[int] = ()) -> int:
+    """Subtask grid (or CSV import) counterpart of save_task_edits: all rows or none."""
+    with SessionLocal() as s:
+        project_id = s.query(Task.project_id).filter(Task.id == task_id).scalar()
+        if project_id is None:
+            raise ValueError("Task not found")
+        for sid in deleted_ids:
+            st = s.get(SubTask, int(sid))
+            if st is not None and st.task_id == task_id:
+                s.delete(st)
+        for r in rows:
+            _upsert_subtask(s, project_id, task_id, **r)
+        _on_project_write(s, project_id)
+        s.commit()
+        return len(rows)
+
+@router.read_only
 def get_tasks_for_project(project_id: int):
     """Return plain dicts to avoid detached lazy loads."""
-    with SessionLocal() as s:
+    with _read_session() as s:
         rows = (
             s.query(
                 Task.id,
@@ -312,6 +1125,7 @@ def get_tasks_for_project(project_id: int):
                 Task.start_date,
                 Task.end_date,
                 Task.progress,
+                Task.description,
                 User.email.label("assignee_email"),
             )
             .outerjoin(User, Task.assignee_id == User.id)
@@ -327,14 +1141,16 @@ def get_tasks_for_project(project_id: int):
                 "start_date": r.start_date,
                 "end_date": r.end_date,
                 "progress": float(r.progress or 0),
+                "description": r.description,
                 "assignee_email": r.assignee_email,
             }
             for r in rows
         ]
 
+@router.read_only
 def get_subtasks_for_task(task_id: int):
     """Return plain dicts to avoid detached lazy loads."""
-    with SessionLocal() as s:
+    with _read_session() as s:
         rows = (
             s.query(
                 SubTask.id,
@@ -363,5 +1179,1474 @@ def get_subtasks_for_task(task_id: int):
             for r in rows
         ]
 
+# ---- daily stats (burndown / burnup) ----
+def backfill_daily_stats(project_id: Optional[int] = None, today: Optional[date] = None) -> int:
+    """
+    Fill missing snapshot days up to today for one project (or all) in one transaction.
+    Writes always record today's row, so a gap since the last snapshot means nothing
+    changed: status counts and mean progress carry over and overdue is recomputed
+    per day from the current end dates. Projects without any snapshot get today's row.
+    Returns the number of rows inserted.
+    """
+    today = today or date.today()
+    with SessionLocal() as s:
+        pq = s.query(Project.id)
+        if project_id is not None:
+            pq = pq.filter(Project.id == project_id)
+        pids = [r[0] for r in pq.all()]
+        if not pids:
+            return 0
+        last_days = dict(
+            s.query(ProjectDailyStat.project_id, func.max(ProjectDailyStat.day))
+             .filter(ProjectDailyStat.project_id.in_(pids))
+             .group_by(ProjectDailyStat.project_id)
+             .all()
+        )
+        items = _project_items(pids)
+        per_project: Dict[int, Dict] = {
+            pid: {"To-Do": 0, "In Progress": 0, "Done": 0, "n": 0, "progress": 0.0, "open_ends": []}
+            for pid in pids
+        }
+        rows = s.execute(select(items.c.project_id, items.c.status, items.c.end_date, items.c.progress))
+        for pid, status, end_date, progress in rows:
+            agg = per_project[pid]
+            agg[status] = agg.get(status, 0) + 1
+            agg["n"] += 1
+            agg["progress"] += float(progress or 0)
+            if end_date is not None and status != "Done":
+                agg["open_ends"].append(end_date)
+        for r in s.query(ArchiveRollup).filter(ArchiveRollup.project_id.in_(pids)):
+            agg = per_project[r.project_id]
+            agg["Done"] += r.tasks + r.subtasks
+            agg["n"] += r.tasks + r.subtasks
+            agg["progress"] += r.task_progress + r.subtask_progress
+
+        inserted = 0
+        for pid in pids:
+            last = last_days.get(pid)
+            if last is not None and last >= today:
+                continue
+            first = today if last is None else last + timedelta(days=1)
+            agg = per_project[pid]
+            ends = sorted(agg["open_ends"])
+            mean = round(agg["progress"] / agg["n"], 2) if agg["n"] else 0.0
+            d = first
+            while d <= today:
+                s.add(ProjectDailyStat(
+                    project_id=pid, day=d,
+                    todo_count=agg["To-Do"], in_progress_count=agg["In Progress"],
+                    done_count=agg["Done"], overdue_count=bisect_left(ends, d),
+                    mean_progress=mean,
+                ))
+                inserted += 1
+                d += timedelta(days=1)
+            _bump_project(s, pid)   # new revision: other replicas and feed ETags see the rows
+        s.commit()
+        return inserted
+
+@router.read_only
+def get_daily_stats(project_id: int, start: Optional[date] = None,
+                    end: Optional[date] = None) -> List[Dict]:
+    """Return the per-day snapshot rows for a project, oldest first."""
+    with _read_session() as s:
+        q = s.query(ProjectDailyStat).filter(ProjectDailyStat.project_id == project_id)
+        if start:
+            q = q.filter(ProjectDailyStat.day >= start)
+        if end:
+            q = q.filter(ProjectDailyStat.day <= end)
+        return [
+            {
+                "day": r.day,
+                "todo": r.todo_count,
+                "in_progress": r.in_progress_count,
+                "done": r.done_count,
+                "overdue": r.overdue_count,
+                "mean_progress": r.mean_progress,
+            }
+            for r in q.order_by(ProjectDailyStat.day.asc()).all()
+        ]
+
+# ---- task dependencies ----
+def _dependencies(s: Session, project_id: int) -> List[Dict]:
+    rows = (
+        s.query(TaskDependency.id, TaskDependency.predecessor_id,
+                TaskDependency.successor_id, TaskDependency.lag_days)
+        .join(Task, TaskDependency.successor_id == Task.id)
+        .filter(Task.project_id == project_id)
+        .order_by(TaskDependency.id.asc())
+        .all()
+    )
+    return [
+        {"id": r.id, "predecessor_id": r.predecessor_id,
+         "successor_id": r.successor_id, "lag_days": int(r.lag_days or 0)}
+        for r in rows
+    ]
+
+@router.read_only
+def get_dependencies_for_project(project_id: int) -> List[Dict]:
+    """Return plain dicts for every dependency between tasks of a project."""
+    with _read_session() as s:
+        return _dependencies(s, project_id)
+
+def add_task_dependency(predecessor_id: int, successor_id: int, lag_days: int = 0) -> int:
+    """
+    Link two tasks of the same project. Raises ValueError if the tasks are unknown,
+    belong to different projects, or the link would create a cycle.
+    """
+    with SessionLocal() as s:
+        pred, succ = s.get(Task, predecessor_id), s.get(Task, successor_id)
+        if not pred or not succ:
+            raise ValueError("Task not found")
+        if pred.project_id != succ.project_id:
+            raise ValueError("Dependencies must stay within one project")
+        existing = s.query(TaskDependency).filter_by(
+            predecessor_id=predecessor_id, successor_id=successor_id).one_or_none()
+        if existing:
+            existing.lag_days = int(lag_days)
+            _bump_project(s, pred.project_id)
+            s.commit()
+            return existing.id
+        tasks = [{"id": i} for (i,) in s.query(Task.id).filter(Task.project_id == pred.project_id)]
+        g = ScheduleGraph.build(pred.project.start_date, tasks, _dependencies(s, pred.project_id))
+        g.add_dependency(predecessor_id, successor_id, lag_days)  # CycleError is a ValueError
+        dep = TaskDependency(predecessor_id=predecessor_id, successor_id=successor_id, lag_days=int(lag_days))
+        s.add(dep)
+        _bump_project(s, pred.project_id)
+        s.commit()
+        return dep.id
+
+def delete_task_dependency(dependency_id: int) -> None:
+    with SessionLocal() as s:
+        dep = s.get(TaskDependency, dependency_id)
+        if dep:
+            project_id = s.get(Task, dep.successor_id).project_id
+            s.delete(dep)
+            _bump_project(s, project_id)
+            s.commit()
+
+# ---- full-text search ----
+@router.read_only
+def search_items(query: str, user_email: Optional[str] = None, project_id: Optional[int] = None,
+                 page: int = 0, page_size: int = 20, unlocked_ids: Iterable[int] = ()) -> Dict:
+    """
+    Ranked full-text search over task names/descriptions and subtask names.
+    Scope is one project (the caller has already passed its PIN gate), or every
+    project `user_email` is a member of that is public or in `unlocked_ids`.
+    Returns {"results": [...], "has_more": bool}.
+    """
+    with _read_session() as s:
+        if project_id is not None:
+            pids = [project_id]
+        else:
+            pids = [
+                pid for (pid,) in
+                s.query(ProjectMember.project_id)
+                 .join(User, User.id == ProjectMember.user_id)
+                 .join(Project, Project.id == ProjectMember.project_id)
+                 .filter(User.email == (user_email or "").strip().lower(),
+                         or_(Project.is_public.is_(True), Project.id.in_(list(unlocked_ids))))
+            ]
+        rows = search.search(s.connection(), query, pids, limit=page_size + 1, offset=page * page_size)
+        return {"results": rows[:page_size], "has_more": len(rows) > page_size}
+
+# ---- cache invalidation ----
+@router.read_only
+def get_project_revision(project_id: int) -> int:
+    """Latest revision of a project (0 if it was never written through these helpers)."""
+    with _read_session() as s:
+        row = s.get(ProjectRevision, project_id)
+        return int(row.revision) if row else 0
+
+def start_invalidation_listener(on_change=None):
+    """Start this process's listener (LISTEN/NOTIFY on Postgres, polling elsewhere)."""
+    return invalidation.start_listener(engine, project_cache, on_change=on_change)
+
+# ---- delta sync ----
+def _task_row_dict(r) -> Dict:
+    return {
+        "id": r.id,
+        "name": r.name,
+        "status": r.status,
+        "start_date": r.start_date,
+        "end_date": r.end_date,
+        "progress": float(r.progress or 0),
+        "description": r.description,
+        "assignee_email": r.assignee_email,
+    }
+
+@router.read_only
+def changes_since(project_id: int, revision: int = 0) -> Dict:
+    """
+    Rows of a project changed after `revision`, plus ids deleted since then.
+    `reset` is True when the caller must drop its copy first: a first sync
+    (revision <= 0) or a revision older than the pruned tombstones.
+    """
+    with _read_session() as s:
+        pr = s.get(ProjectRevision, project_id)
+        current = int(pr.revision) if pr else 0
+        floor = int(pr.tombstone_floor or 0) if pr else 0
+        reset = revision <= 0 or revision < floor
+        since = -1 if reset else revision
+        delta = {"revision": current, "reset": reset, "tasks": [], "subtasks": [], "members": [],
+                 "deleted": {"task": [], "subtask": [], "member": []}}
+        if not reset and revision >= current:
+            return delta
+
+        tasks = (
+            s.query(Task.id, Task.name, Task.status, Task.start_date, Task.end_date, Task.progress,
+                    Task.description, User.email.label("assignee_email"))
+            .outerjoin(User, Task.assignee_id == User.id)
+            .filter(Task.project_id == project_id, Task.revision > since)
+            .all()
+        )
+        subs = (
+            s.query(SubTask.id, SubTask.task_id, SubTask.name, SubTask.status, SubTask.start_date,
+                    SubTask.end_date, SubTask.progress, User.email.label("assignee_email"))
+            .join(Task, SubTask.task_id == Task.id)
+            .outerjoin(User, SubTask.assignee_id == User.id)
+            .filter(Task.project_id == project_id, SubTask.revision > since)
+            .all()
+        )
+        members = (
+            s.query(ProjectMember.id, ProjectMember.user_id, ProjectMember.role, User.email)
+            .join(User, ProjectMember.user_id == User.id)
+            .filter(ProjectMember.project_id == project_id, ProjectMember.revision > since)
+            .all()
+        )
+        delta["tasks"] = [_task_row_dict(r) for r in tasks]
+        delta["subtasks"] = [
+            {"id": r.id, "task_id": r.task_id, "name": r.name, "status": r.status,
+             "start_date": r.start_date, "end_date": r.end_date,
+             "progress": float(r.progress or 0), "assignee_email": r.assignee_email}
+            for r in subs
+        ]
+        delta["members"] = [{"id": r.id, "user_id": r.user_id, "email": r.email, "role": r.role}
+                            for r in members]
+        if not reset:
+            for kind, item_id in (
+                s.query(Tombstone.kind, Tombstone.item_id)
+                 .filter(Tombstone.project_id == project_id, Tombstone.revision > since)
+            ):
+                delta["deleted"][kind].append(item_id)
+        return delta
+
+def apply_changes(tree: Optional[Dict], delta: Dict) -> Dict:
+    """
+    Patch a project tree {"revision", "tasks", "subtasks", "members"} (dicts keyed by
+    id) with a `changes_since` delta. Returns the tree, creating it on reset.
+    """
+    if tree is None or delta["reset"]:
+        tree = {"revision": 0, "tasks": {}, "subtasks": {}, "members": {}}
+    for kind, key in (("task", "tasks"), ("subtask", "subtasks"), ("member", "members")):
+        for item_id in delta["deleted"][kind]:
+            tree[key].pop(item_id, None)
+    for key in ("tasks", "subtasks", "members"):
+        for row in delta[key]:
+            tree[key][row["id"]] = row
+    if delta["deleted"]["task"]:
+        gone = set(delta["deleted"]["task"])
+        for sid in [i for i, r in tree["subtasks"].items() if r["task_id"] in gone]:
+            del tree["subtasks"][sid]
+    tree["revision"] = delta["revision"]
+    return tree
+
+def prune_tombstones(keep_days: int = 30) -> int:
+    """Drop old tombstones and raise each project's floor so stale clients resync."""
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    with SessionLocal() as s:
+        floors = (
+            s.query(Tombstone.project_id, func.max(Tombstone.revision))
+             .filter(Tombstone.deleted_at < cutoff)
+             .group_by(Tombstone.project_id)
+             .all()
+        )
+        for pid, rev in floors:
+            pr = s.get(ProjectRevision, pid)
+            if pr is not None:
+                pr.tombstone_floor = max(int(pr.tombstone_floor or 0), int(rev))
+        n = s.query(Tombstone).filter(Tombstone.deleted_at < cutoff).delete(synchronize_session=False)
+        s.commit()
+        return n
+
+# ---- streaming export ----
+EXPORT_COLUMNS = ("project_id", "project", "type", "id", "parent_id", "name", "status",
+                  "start_date", "end_date", "assignee_email", "progress", "description")
+
+def count_export_rows(project_ids: List[int]) -> int:
+    with _read_session() as s:
+        return int(s.execute(select(func.count()).select_from(_project_items(project_ids))).scalar() or 0)
+
+def _export_queries(project_ids):
+    assignee = aliased(User)
+    tasks_q = (
+        select(Task.project_id, Project.name, literal("task"), Task.id, null(), Task.name,
+               Task.status, Task.start_date, Task.end_date, assignee.email, Task.progress,
+               Task.description)
+        .join(Project, Task.project_id == Project.id)
+        .outerjoin(assignee, Task.assignee_id == assignee.id)
+        .where(Task.project_id.in_(project_ids))
+        .order_by(Task.project_id, Task.id)
+    )
+    subs_q = (
+        select(Task.project_id, Project.name, literal("subtask"), SubTask.id, SubTask.task_id,
+               SubTask.name, SubTask.status, SubTask.start_date, SubTask.end_date, assignee.email,
+               SubTask.progress, null())
+        .join(Task, SubTask.task_id == Task.id)
+        .join(Project, Task.project_id == Project.id)
+        .outerjoin(assignee, SubTask.assignee_id == assignee.id)
+        .where(Task.project_id.in_(project_ids))
+        .order_by(Task.project_id, SubTask.task_id, SubTask.id)
+    )
+    return tasks_q, subs_q
+
+def _iter_export_rows(s: Session, project_ids, batch_size: int):
+    for q in _export_queries(project_ids):
+        result = s.execute(q, execution_options={"yield_per": batch_size})
+        for part in result.partitions():
+            yield [tuple(r) for r in part]
+
+def iter_export_rows(project_ids: List[int], batch_size: int = 5000):
+    """
+    Tasks, then subtasks, of `project_ids` as lists of tuples in EXPORT_COLUMNS order,
+    `batch_size` rows at a time from a server-side cursor (yield_per), so memory stays
+    flat however large the portfolio is.
+    """
+    with _read_session() as s:
+        yield from _iter_export_rows(s, project_ids, batch_size)
+
+# ---- bulk operations (CLI) ----
+def _insert_for(s: Session, table):
+    """Dialect insert() with on_conflict_* support, or None on other backends."""
+    name = (s.dialect if hasattr(s, "dialect") else s.get_bind().dialect).name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(table)
+
+def _normalise_emails(emails) -> List[str]:
+    return sorted({e.strip().lower() for e in emails if e and e.strip()})
+
+def _users_by_email(s: Session, emails) -> Dict[str, int]:
+    """email -> user id, creating missing users inside the caller's transaction."""
+    wanted = _normalise_emails(emails)
+    if not wanted:
+        return {}
+    ins = _insert_for(s, User.__table__)
+    if ins is not None:
+        now = datetime.utcnow()
+        s.execute(ins.on_conflict_do_nothing(index_elements=["email"]),
+                  [{"email": e, "created_at": now} for e in wanted])
+    found: Dict[str, int] = {}
+    for i in range(0, len(wanted), 1000):
+        for uid, email in s.query(User.id, User.email).filter(User.email.in_(wanted[i:i + 1000])):
+            found[email] = uid
+    missing = [User(email=e) for e in wanted if e not in found]
+    if missing:
+        s.add_all(missing)
+        s.flush()
+        found.update({u.email: u.id for u in missing})
+    return found
+
+def _upsert_members(s: Session, project_id: int, emails: List[str], role: str) -> None:
+    """One INSERT ... SELECT ... ON CONFLICT for all `emails`; the owner's role is never touched."""
+    ins = _insert_for(s, ProjectMember.__table__)
+    rev, now = _session_revision(s), datetime.utcnow()
+    for i in range(0, len(emails), 5000):
+        chunk = emails[i:i + 5000]
+        src = select(literal(project_id), User.id, literal(role), literal(rev), literal(now)) \
+            .where(User.email.in_(chunk))
+        stmt = ins.from_select(["project_id", "user_id", "role", "revision", "updated_at"], src)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["project_id", "user_id"],
+            set_={"role": stmt.excluded.role, "revision": stmt.excluded.revision,
+                  "updated_at": stmt.excluded.updated_at},
+            where=(ProjectMember.__table__.c.role != "owner") & (ProjectMember.__table__.c.role != stmt.excluded.role),
+        )
+        s.execute(stmt)
+    _note_role_change(s.connection(), [project_id])
+    shown = ", ".join(emails[:5]) + (" ..." if len(emails) > 5 else "")
+    _log_activity(s, project_id, "member.bulk", "member", None, f"{len(emails)} member(s) set to {role}: {shown}")
+
+def bulk_set_member_roles(project_id: int, emails: List[str], role: str = "viewer") -> int:
+    """
+    Add or re-role many members at once: users are created with one INSERT ... ON CONFLICT,
+    memberships upserted with another, one commit. Returns the number of distinct emails.
+    """
+    if role not in ("editor", "viewer"):
+        raise ValueError(f"Unsupported role: {role}")
+    wanted = _normalise_emails(emails)
+    if not wanted:
+        return 0
+    with SessionLocal() as s:
+        if _insert_for(s, ProjectMember.__table__) is None:
+            s.close()
+            sync_project_members(project_id, {e: role for e in wanted})
+            return len(wanted)
+        _users_by_email(s, wanted)
+        _upsert_members(s, project_id, wanted, role)
+        _bump_project(s, project_id)
+        s.commit()
+    return len(wanted)
+
+def _as_date(v) -> Optional[date]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, datetime):
+        return v.date()
+    if isinstance(v, date):
+        return v
+    return date.fromisoformat(str(v)[:10])
+
+def _import_items(s: Session, project_id: int, rows, shift_days: int = 0, batch_size: int = 1000) -> Dict[str, int]:
+    """Insert export-shaped rows as new tasks/subtasks of `project_id`; subtasks must follow their task."""
+    id_map: Dict[int, int] = {}
+    counts = {"task": 0, "subtask": 0}
+    shift = timedelta(days=shift_days)
+
+    def shifted(v):
+        d = _as_date(v)
+        return d + shift if d is not None and shift_days else d
+
+    def insert(batch: List[Dict]) -> None:
+        users = _users_by_email(s, [r.get("assignee_email") for r in batch])
+        pending = []
+        for r in batch:
+            kind = (r.get("type") or "task").strip().lower()
+            status = r.get("status") or "To-Do"
+            if kind not in counts:
+                raise ValueError(f"Unknown item type: {kind}")
+            if status not in TASK_STATUSES:
+                raise ValueError(f"Unknown status: {status}")
+            email = (r.get("assignee_email") or "").strip().lower()
+            fields = dict(name=str(r["name"]), status=status, start_date=shifted(r.get("start_date")),
+                          end_date=shifted(r.get("end_date")), assignee_id=users.get(email),
+                          progress=float(r.get("progress") or 0))
+            if kind == "task":
+                obj = Task(project_id=project_id, description=r.get("description") or None, **fields)
+            else:
+                parent = id_map.get(int(r["parent_id"])) if r.get("parent_id") not in (None, "") else None
+                if parent is None:
+                    raise ValueError(f"Subtask {r['name']!r} references a task that is not in the input")
+                obj = SubTask(task_id=parent, **fields)
+            s.add(obj)
+            pending.append((kind, r.get("id"), obj))
+        s.flush()
+        for kind, old_id, obj in pending:
+            counts[kind] += 1
+            if kind == "task" and old_id not in (None, ""):
+                id_map[int(old_id)] = obj.id
+        s.expunge_all()   # keep the identity map small on large imports
+
+    batch: List[Dict] = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= batch_size:
+            insert(batch)
+            batch = []
+    if batch:
+        insert(batch)
+    return counts
+
+def import_items(project_id: int, rows, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Add tasks and subtasks to a project in one transaction. Rows are dicts in the export
+    format (see EXPORT_COLUMNS); `id`/`parent_id` only link subtasks to tasks of the same
+    input and new ids are assigned. Returns {"task": n, "subtask": n}.
+    """
+    with SessionLocal() as s:
+        if s.get(Project, project_id) is None:
+            raise ValueError("Project not found")
+        s.info["activity_bulk"] = True
+        counts = _import_items(s, project_id, rows, batch_size=batch_size)
+        _log_activity(s, project_id, "task.import", "task", None,
+                      f"Imported {counts['task']} tasks and {counts['subtask']} subtasks")
+        _on_project_write(s, project_id)
+        s.commit()
+        return counts
+
+def sync_project_members(project_id: int, roles: Dict[str, str], remove_missing: bool = False) -> Dict[str, int]:
+    """
+    Make the project's editors/viewers match `roles` ({email: role}) in one transaction.
+    The owner is never changed or removed. Returns {"added", "updated", "removed"}.
+    """
+    bad = {r for r in roles.values() if r not in ("editor", "viewer")}
+    if bad:
+        raise ValueError(f"Unsupported role(s): {', '.join(sorted(bad))}")
+    with SessionLocal() as s:
+        if s.get(Project, project_id) is None:
+            raise ValueError("Project not found")
+        roles = {e.strip().lower(): r for e, r in roles.items() if e and e.strip()}
+        ids = _users_by_email(s, roles)
+        existing = {m.user_id: m for m in s.query(ProjectMember).filter_by(project_id=project_id)}
+        out = {"added": 0, "updated": 0, "removed": 0}
+        for email, uid in ids.items():
+            m = existing.get(uid)
+            if m is None:
+                s.add(ProjectMember(project_id=project_id, user_id=uid, role=roles[email]))
+                out["added"] += 1
+            elif m.role != "owner" and m.role != roles[email]:
+                m.role = roles[email]
+                out["updated"] += 1
+        s.info["activity_bulk"] = True
+        if remove_missing:
+            keep = set(ids.values())
+            for uid, m in existing.items():
+                if uid not in keep and m.role != "owner":
+                    s.delete(m)
+                    out["removed"] += 1
+        _log_activity(s, project_id, "member.sync", "member", None,
+                      f"{out['added']} added, {out['updated']} updated, {out['removed']} removed")
+        _bump_project(s, project_id)
+        s.commit()
+        return out
+
+# Per-transaction scratch table for clones (TEMPORARY: private to the connection).
+_clone_map = Table("clone_id_map", MetaData(),
+                   Column("old_id", Integer, primary_key=True),
+                   Column("new_id", Integer, nullable=False),
+                   prefixes=["TEMPORARY"])
+
+def _shift_date(s: Session, col, days: int):
+    if not days:
+        return col
+    if s.get_bind().dialect.name == "sqlite":
+        return func.date(col, f"{days:+d} days")
+    return col + days
+
+def _copy_project_items(s: Session, source_id: int, target_id: int, shift_days: int = 0,
+                        include_members: bool = True, owner_id: Optional[int] = None) -> int:
+    """
+    Copy tasks, subtasks, dependencies (and non-owner members). Tasks go in as one
+    batched INSERT ... RETURNING whose ids come back in parameter order, so each new
+    id is paired with the source row it was made from (an INSERT ... SELECT read back
+    ORDER BY id is not guaranteed to line up on Postgres). Subtasks and dependencies
+    are then copied with INSERT ... SELECT through a temporary old -> new id table.
+    Returns the number of tasks copied.
+    """
+    rev, now = _session_revision(s), datetime.utcnow()
+    t, st_, dep, pm = Task.__table__, SubTask.__table__, TaskDependency.__table__, ProjectMember.__table__
+
+    shift = timedelta(days=shift_days)
+    source = s.execute(
+        select(t.c.id, t.c.name, t.c.description, t.c.status, t.c.start_date, t.c.end_date,
+               t.c.assignee_id, t.c.progress)
+        .where(t.c.project_id == source_id).order_by(t.c.id)
+    ).all()
+    old_ids = [r.id for r in source]
+    new_ids = _insert_returning_ids(s, t, [
+        {"project_id": target_id, "name": r.name, "description": r.description, "status": r.status,
+         "start_date": r.start_date + shift if r.start_date else None,
+         "end_date": r.end_date + shift if r.end_date else None,
+         "assignee_id": r.assignee_id, "progress": r.progress, "revision": rev, "updated_at": now}
+        for r in source
+    ]) if source else []
+    n_tasks = len(new_ids)
+
+    conn = s.connection()
+    _clone_map.create(conn, checkfirst=True)
+    conn.execute(_clone_map.delete())
+    if old_ids:
+        conn.execute(_clone_map.insert(), [{"old_id": o, "new_id": n} for o, n in zip(old_ids, new_ids)])
+    id_map = _clone_map
+
+    s.execute(st_.insert().from_select(
+        ["task_id", "name", "status", "start_date", "end_date", "assignee_id", "progress",
+         "revision", "updated_at"],
+        select(id_map.c.new_id, st_.c.name, st_.c.status,
+               _shift_date(s, st_.c.start_date, shift_days), _shift_date(s, st_.c.end_date, shift_days),
+               st_.c.assignee_id, st_.c.progress, literal(rev), literal(now))
+        .join_from(st_, id_map, st_.c.task_id == id_map.c.old_id).order_by(st_.c.id)
+    ))
+    pred, succ = id_map.alias("pred_map"), id_map.alias("succ_map")
+    s.execute(dep.insert().from_select(
+        ["predecessor_id", "successor_id", "lag_days"],
+        select(pred.c.new_id, succ.c.new_id, dep.c.lag_days)
+        .join_from(dep, pred, dep.c.predecessor_id == pred.c.old_id)
+        .join(succ, dep.c.successor_id == succ.c.old_id)
+    ))
+    _clone_map.drop(conn)
+    if include_members:
+        s.execute(pm.insert().from_select(
+            ["project_id", "user_id", "role", "revision", "updated_at"],
+            select(literal(target_id), pm.c.user_id,
+                   case((pm.c.role == "owner", "editor"), else_=pm.c.role), literal(rev), literal(now))
+            .where(pm.c.project_id == source_id, pm.c.user_id != owner_id)
+        ))
+    return n_tasks
+
+def clone_project(source_id: int, name: str, owner_email: Optional[str] = None,
+                  shift_days: int = 0, include_members: bool = True,
+                  is_public: Optional[bool] = None, pin: Optional[str] = None) -> int:
+    """
+    Copy a project with its tasks, subtasks, dependencies (and members) into a new
+    project in one transaction, a handful of batched statements whatever its size.
+    Every date moves by `shift_days`; the copy is never a template.
+    """
+    with SessionLocal() as s:
+        src = s.get(Project, source_id)
+        if src is None:
+            raise ValueError("Project not found")
+        if not name or not name.strip():
+            raise ValueError("Project name is required")
+        owner_id = _users_by_email(s, [owner_email])[owner_email.strip().lower()] if owner_email else src.owner_id
+        shift = timedelta(days=shift_days)
+        public = src.is_public if is_public is None else is_public
+        p = Project(name=name.strip(), start_date=src.start_date + shift, end_date=src.end_date + shift,
+                    description=src.description, owner_id=owner_id, is_public=public,
+                    pin_hash=None if public else (_hash_pin(pin) if pin else src.pin_hash))
+        s.info["activity_bulk"] = True
+        s.add(p)
+        s.flush()
+        s.add(ProjectMember(project_id=p.id, user_id=owner_id, role="owner"))
+        s.flush()
+        n_tasks = _copy_project_items(s, source_id, p.id, shift_days, include_members, owner_id)
+        _log_activity(s, p.id, "project.clone", "project", p.id,
+                      f"Cloned from {src.name} ({n_tasks} tasks, dates {shift_days:+d} days)")
+        _on_project_write(s, p.id)
+        s.commit()
+        return p.id
+
+def create_project_from_template(template_id: int, owner_email: str, name: str, start: date,
+                                 member_emails: Optional[List[str]] = None,
+                                 is_public: bool = False, pin: Optional[str] = None) -> int:
+    """New project from a template: its structure moved to `start`, none of its members."""
+    tpl = get_project(template_id)
+    if tpl is None or not tpl.is_template:
+        raise ValueError("Template not found")
+    pid = clone_project(template_id, name, owner_email=owner_email,
+                        shift_days=(start - tpl.start_date).days, include_members=False,
+                        is_public=is_public, pin=pin)
+    if member_emails:
+        bulk_set_member_roles(pid, member_emails, "viewer")
+    return pid
+
+def set_project_template(project_id: int, is_template: bool) -> None:
+    with SessionLocal() as s:
+        p = s.get(Project, project_id)
+        if p:
+            p.is_template = bool(is_template)
+            _bump_project(s, project_id)
+            s.commit()
+
+@router.read_only
+def get_templates_for_user(user_email: str) -> List[Project]:
+    """Templates in projects the user belongs to, by name."""
+    with _read_session() as s:
+        return (
+            s.query(Project)
+            .join(ProjectMember, ProjectMember.project_id == Project.id)
+            .join(User, User.id == ProjectMember.user_id)
+            .filter(User.email == (user_email or "").strip().lower(), Project.is_template.is_(True))
+            .order_by(Project.name)
+            .all()
+        )
+
+# ---- recurring tasks ----
+RECURRENCE_HORIZON_DAYS = int(os.getenv("STRIVIO_RECURRENCE_HORIZON_DAYS", "28"))
+
+def _materialize(s: Session, rec: TaskRecurrence, through: date, batch_size: int = 500) -> int:
+    """Insert the series' occurrences up to `through` in batches; returns rows written."""
+    if rec.materialized_through is not None and rec.materialized_through >= through:
+        return 0
+    t = Task.__table__
+    ins = _insert_for(s, t)
+    stmt = ins.on_conflict_do_nothing(index_elements=["recurrence_id", "occurrence_date"]) if ins is not None else t.insert()
+    rev, now, dur = _session_revision(s), datetime.utcnow(), timedelta(days=rec.duration_days or 0)
+    written, batch = 0, []
+    for d in recurrence.occurrences(rec.rule, rec.dtstart, rec.materialized_through, through):
+        batch.append({"project_id": rec.project_id, "name": rec.name, "description": rec.description,
+                      "status": "To-Do", "start_date": d, "end_date": d + dur, "assignee_id": rec.assignee_id,
+                      "progress": 0.0, "recurrence_id": rec.id, "occurrence_date": d,
+                      "revision": rev, "updated_at": now})
+        if len(batch) >= batch_size:
+            s.execute(stmt, batch)
+            written, batch = written + len(batch), []
+    if batch:
+        s.execute(stmt, batch)
+        written += len(batch)
+    rec.materialized_through = through
+    if not recurrence.next_occurrences(rec.rule, rec.dtstart, through + timedelta(days=1), 1):
+        rec.active = False   # finite series fully materialised
+    return written
+
+def add_recurring_task(project_id: int, name: str, rule: str, dtstart: date, duration_days: int = 0,
+                       assignee_email: Optional[str] = None, description: Optional[str] = None,
+                       today: Optional[date] = None) -> int:
+    """Create a series and materialise its first horizon of occurrences."""
+    if not name or not name.strip():
+        raise ValueError("Task name is required")
+    recurrence.validate_rule(rule, dtstart)
+    today = today or date.today()
+    with SessionLocal() as s:
+        assignee_id = _member_assignee_id(s, project_id, assignee_email)
+        rec = TaskRecurrence(project_id=project_id, name=name.strip(), description=description or None,
+                             assignee_id=assignee_id, duration_days=max(0, int(duration_days)),
+                             rule=rule, dtstart=dtstart,
+                             # a series started in the past begins today; no backlog of old copies
+                             materialized_through=today - timedelta(days=1) if dtstart < today else None)
+        s.add(rec)
+        s.flush()
+        n = _materialize(s, rec, max(today, dtstart) + timedelta(days=RECURRENCE_HORIZON_DAYS))
+        _log_activity(s, project_id, "recurrence.create", "recurrence", rec.id,
+                      f"{rec.name}: {recurrence.describe(rule)} ({n} scheduled)")
+        _on_project_write(s, project_id)
+        s.commit()
+        return rec.id
+
+def materialize_recurrences(project_id: Optional[int] = None, today: Optional[date] = None,
+                            horizon_days: Optional[int] = None, batch_size: int = 500) -> int:
+    """
+    Extend every active series (optionally of one project) to today + horizon.
+    One transaction per project; cheap when nothing is due. Returns rows written.
+    """
+    through = (today or date.today()) + timedelta(days=RECURRENCE_HORIZON_DAYS if horizon_days is None else horizon_days)
+    with SessionLocal() as s:
+        q = s.query(TaskRecurrence.project_id).filter(
+            TaskRecurrence.active.is_(True),
+            (TaskRecurrence.materialized_through.is_(None)) | (TaskRecurrence.materialized_through < through))
+        if project_id is not None:
+            q = q.filter(TaskRecurrence.project_id == project_id)
+        pids = sorted({pid for (pid,) in q})
+    total = 0
+    for pid in pids:
+        with SessionLocal() as s:
+            written = 0
+            for rec in s.query(TaskRecurrence).filter(TaskRecurrence.project_id == pid,
+                                                      TaskRecurrence.active.is_(True)):
+                written += _materialize(s, rec, through, batch_size)
+            if written:
+                _on_project_write(s, pid)
+            s.commit()
+            total += written
+    return total
+
+@router.read_only
+def get_recurrences_for_project(project_id: int) -> List[Dict]:
+    with _read_session() as s:
+        rows = (
+            s.query(TaskRecurrence, User.email)
+            .outerjoin(User, TaskRecurrence.assignee_id == User.id)
+            .filter(TaskRecurrence.project_id == project_id)
+            .order_by(TaskRecurrence.active.desc(), TaskRecurrence.name)
+            .all()
+        )
+        return [
+            {"id": r.id, "name": r.name, "rule": r.rule, "summary": recurrence.describe(r.rule),
+             "dtstart": r.dtstart, "duration_days": r.duration_days, "assignee_email": email,
+             "active": bool(r.active), "materialized_through": r.materialized_through}
+            for r, email in rows
+        ]
+
+def stop_recurrence(recurrence_id: int, delete_future: bool = True, today: Optional[date] = None) -> None:
+    """End a series; optionally drop its future occurrences that nobody has started."""
+    today = today or date.today()
+    with SessionLocal() as s:
+        rec = s.get(TaskRecurrence, recurrence_id)
+        if rec is None:
+            return
+        rec.active = False
+        _log_activity(s, rec.project_id, "recurrence.stop", "recurrence", rec.id, rec.name)
+        if delete_future:
+            for t in s.query(Task).filter(Task.recurrence_id == recurrence_id, Task.occurrence_date > today,
+                                          Task.status == "To-Do"):
+                s.delete(t)
+        _on_project_write(s, rec.project_id)
+        s.commit()
+
+@router.read_only
+def list_projects() -> List[Dict]:
+    with _read_session() as s:
+        return [
+            {"id": r.id, "name": r.name, "start_date": r.start_date, "end_date": r.end_date,
+             "owner_email": r.email, "is_public": bool(r.is_public)}
+            for r in s.query(Project.id, Project.name, Project.start_date, Project.end_date,
+                             Project.is_public, User.email)
+                      .join(User, Project.owner_id == User.id)
+                      .order_by(Project.id)
+        ]
+
+# ---- archive (finished work out of the hot tables) ----
+ARCHIVE_AFTER_DAYS = int(os.getenv("STRIVIO_ARCHIVE_AFTER_DAYS", "90"))
+
+_ARCHIVED_TASK_COLUMNS = ("project_id", "name", "description", "status", "start_date", "end_date",
+                          "assignee_id", "progress", "updated_at", "recurrence_id", "occurrence_date")
+_ARCHIVED_SUBTASK_COLUMNS = ("name", "status", "start_date", "end_date", "assignee_id", "progress", "updated_at")
+
+def _archivable_task_ids(s: Session, project_id: int, today: date, older_than_days: int) -> List[int]:
+    """
+    Done tasks with no open subtask, all of them once the project has ended, otherwise
+    those finished (end date, else last update) more than `older_than_days` ago.
+    Dependency links never cross the archive: both ends go, or neither.
+    """
+    p = s.get(Project, project_id)
+    q = s.query(Task.id).filter(
+        Task.project_id == project_id, Task.status == "Done",
+        ~exists().where(SubTask.task_id == Task.id, SubTask.status != "Done"),
+    )
+    if p.end_date is None or p.end_date >= today:
+        cutoff = today - timedelta(days=older_than_days)
+        q = q.filter(or_(Task.end_date < cutoff,
+                         and_(Task.end_date.is_(None), Task.updated_at < datetime.combine(cutoff, datetime.min.time()))))
+    ids = {r[0] for r in q}
+    if not ids:
+        return []
+    # a linked group goes whole or not at all: walk out from every task that stays,
+    # one pass over the links (the groups are the connected components)
+    adjacent: Dict[int, List[int]] = defaultdict(list)
+    for d in _dependencies(s, project_id):
+        adjacent[d["predecessor_id"]].append(d["successor_id"])
+        adjacent[d["successor_id"]].append(d["predecessor_id"])
+    queue = deque(n for n in adjacent if n not in ids)
+    seen = set(queue)
+    while queue:
+        for m in adjacent[queue.popleft()]:
+            if m not in seen:
+                seen.add(m)
+                queue.append(m)
+    return sorted(ids - seen)
+
+def _archive_batch(s: Session, project_id: int, task_ids: List[int], rev: int, now: datetime) -> int:
+    """Copy tasks + subtasks into the archive, tombstone and delete them; returns subtasks moved."""
+    s.execute(ArchivedTask.__table__.insert().from_select(
+        ["original_id", *_ARCHIVED_TASK_COLUMNS, "archive_revision", "archived_at"],
+        select(Task.id, *[getattr(Task, c) for c in _ARCHIVED_TASK_COLUMNS], literal(rev), literal(now))
+        .where(Task.id.in_(task_ids)),
+    ))
+    s.execute(ArchivedSubTask.__table__.insert().from_select(
+        ["archived_task_id", "project_id", "original_id", *_ARCHIVED_SUBTASK_COLUMNS],
+        select(ArchivedTask.id, ArchivedTask.project_id, SubTask.id,
+               *[getattr(SubTask, c) for c in _ARCHIVED_SUBTASK_COLUMNS])
+        .join(ArchivedTask, and_(ArchivedTask.original_id == SubTask.task_id, ArchivedTask.archive_revision == rev))
+        .where(SubTask.task_id.in_(task_ids)),
+    ))
+    sub_ids = [r[0] for r in s.execute(select(SubTask.id).where(SubTask.task_id.in_(task_ids)))]
+    s.execute(Tombstone.__table__.insert(), [
+        {"project_id": project_id, "kind": kind, "item_id": i, "revision": rev, "deleted_at": now}
+        for kind, ids in (("task", task_ids), ("subtask", sub_ids)) for i in ids
+    ])
+    s.execute(TaskDependency.__table__.delete().where(or_(TaskDependency.predecessor_id.in_(task_ids),
+                                                          TaskDependency.successor_id.in_(task_ids))))
+    s.execute(SubTask.__table__.delete().where(SubTask.task_id.in_(task_ids)))
+    s.execute(Task.__table__.delete().where(Task.id.in_(task_ids)))
+    return len(sub_ids)
+
+def _refresh_archive_rollup(s: Session, project_id: int) -> None:
+    s.flush()
+    t = s.execute(select(func.count(), func.sum(func.coalesce(ArchivedTask.progress, 0)),
+                         func.min(ArchivedTask.start_date), func.max(ArchivedTask.end_date))
+                  .where(ArchivedTask.project_id == project_id)).one()
+    sub = s.execute(select(func.count(), func.sum(func.coalesce(ArchivedSubTask.progress, 0)),
+                           func.min(ArchivedSubTask.start_date), func.max(ArchivedSubTask.end_date))
+                    .where(ArchivedSubTask.project_id == project_id)).one()
+    starts = [d for d in (t[2], sub[2]) if d is not None]
+    ends = [d for d in (t[3], sub[3]) if d is not None]
+    row = s.get(ArchiveRollup, project_id)
+    if row is None:
+        row = ArchiveRollup(project_id=project_id)
+        s.add(row)
+    row.tasks, row.task_progress = int(t[0] or 0), float(t[1] or 0)
+    row.subtasks, row.subtask_progress = int(sub[0] or 0), float(sub[1] or 0)
+    row.first_start = min(starts) if starts else None
+    row.last_end = max(ends) if ends else None
+
+def archive_items(project_id: Optional[int] = None, older_than_days: Optional[int] = None,
+                  today: Optional[date] = None, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Move finished work of one project (or all) into the archive tables, one
+    transaction per project and `batch_size` tasks per statement. Delta-sync clients
+    get tombstones, search drops the rows through its triggers, and the project's
+    rollup keeps archived items in stats and analytics. Returns {'task', 'subtask'} moved.
+    """
+    today = today or date.today()
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    with SessionLocal() as s:
+        pq = s.query(Project.id).order_by(Project.id)
+        if project_id is not None:
+            pq = pq.filter(Project.id == project_id)
+        pids = [r[0] for r in pq]
+    totals = {"task": 0, "subtask": 0}
+    for pid in pids:
+        with SessionLocal() as s:
+            task_ids = _archivable_task_ids(s, pid, today, days)
+            if not task_ids:
+                continue
+            s.info["activity_bulk"] = True
+            rev, now = _session_revision(s), datetime.utcnow()
+            n_subs = 0
+            for i in range(0, len(task_ids), batch_size):
+                n_subs += _archive_batch(s, pid, task_ids[i:i + batch_size], rev, now)
+            _refresh_archive_rollup(s, pid)
+            _log_activity(s, pid, "task.archive", "task", None,
+                          f"Archived {len(task_ids)} finished task(s) and {n_subs} subtask(s)")
+            _on_project_write(s, pid)
+            s.commit()
+        totals["task"] += len(task_ids)
+        totals["subtask"] += n_subs
+    return totals
+
+@router.read_only
+def get_archive_rollup(project_id: int) -> Dict:
+    """Archived totals of a project (zeros when nothing is archived); no archive rows are read."""
+    with _read_session() as s:
+        r = s.get(ArchiveRollup, project_id)
+        if r is None:
+            return {"tasks": 0, "subtasks": 0, "task_progress": 0.0, "subtask_progress": 0.0,
+                    "first_start": None, "last_end": None}
+        return {"tasks": r.tasks, "subtasks": r.subtasks, "task_progress": r.task_progress,
+                "subtask_progress": r.subtask_progress, "first_start": r.first_start, "last_end": r.last_end}
+
+@router.read_only
+def get_archived_tasks(project_id: int, limit: int = 50, before_id: Optional[int] = None) -> List[Dict]:
+    """Most recently archived first; pass the last id seen as `before_id` for the next page."""
+    n_subs = (
+        select(func.count()).where(ArchivedSubTask.archived_task_id == ArchivedTask.id)
+        .correlate(ArchivedTask).scalar_subquery()
+    )
+    with _read_session() as s:
+        q = (
+            s.query(ArchivedTask, User.email, n_subs)
+            .outerjoin(User, ArchivedTask.assignee_id == User.id)
+            .filter(ArchivedTask.project_id == project_id)
+        )
+        if before_id is not None:
+            q = q.filter(ArchivedTask.id < before_id)
+        return [
+            {"id": a.id, "name": a.name, "start_date": a.start_date, "end_date": a.end_date,
+             "assignee_email": email, "progress": float(a.progress or 0), "subtasks": int(n or 0),
+             "archived_at": a.archived_at}
+            for a, email, n in q.order_by(ArchivedTask.id.desc()).limit(limit)
+        ]
+
+def restore_archived_task(archived_id: int) -> int:
+    """Move an archived task and its subtasks back into the project as new rows; returns the task id."""
+    with SessionLocal() as s:
+        a = s.get(ArchivedTask, archived_id)
+        if a is None:
+            raise ValueError("Archived task not found")
+        s.info["activity_bulk"] = True
+        # restored as a one-off: its series may be gone, and it never clashes with a new occurrence
+        t = Task(project_id=a.project_id, name=a.name, description=a.description, status=a.status,
+                 start_date=a.start_date, end_date=a.end_date, assignee_id=a.assignee_id, progress=a.progress)
+        s.add(t)
+        s.flush()
+        subs = s.query(ArchivedSubTask).filter(ArchivedSubTask.archived_task_id == a.id).order_by(ArchivedSubTask.id)
+        for x in subs:
+            s.add(SubTask(task_id=t.id, name=x.name, status=x.status, start_date=x.start_date,
+                          end_date=x.end_date, assignee_id=x.assignee_id, progress=x.progress))
+        s.query(ArchivedSubTask).filter(ArchivedSubTask.archived_task_id == a.id).delete(synchronize_session=False)
+        s.delete(a)
+        _refresh_archive_rollup(s, t.project_id)
+        _log_activity(s, t.project_id, "task.restore", "task", t.id, f"{t.name} (from the archive)")
+        _on_project_write(s, t.project_id)
+        s.commit()
+        return t.id
+
+# ---- project snapshots (backup.py) ----
+# record types in the order they are written and must be restored
+SNAPSHOT_KINDS = ("project", "member", "recurrence", "task", "subtask", "dependency",
+                  "archived_task", "archived_subtask")
+
+def _snapshot_queries(project_id: int):
+    assignee = aliased(User)
+    return [
+        ("member", select(User.email, User.name, ProjectMember.role)
+            .join(User, ProjectMember.user_id == User.id)
+            .where(ProjectMember.project_id == project_id).order_by(ProjectMember.id)),
+        ("recurrence", select(TaskRecurrence.id, TaskRecurrence.name, TaskRecurrence.description,
+                              assignee.email.label("assignee_email"), TaskRecurrence.duration_days,
+                              TaskRecurrence.rule, TaskRecurrence.dtstart, TaskRecurrence.materialized_through,
+                              TaskRecurrence.active)
+            .outerjoin(assignee, TaskRecurrence.assignee_id == assignee.id)
+            .where(TaskRecurrence.project_id == project_id).order_by(TaskRecurrence.id)),
+        ("task", select(Task.id, Task.name, Task.description, Task.status, Task.start_date, Task.end_date,
+                        assignee.email.label("assignee_email"), Task.progress, Task.recurrence_id,
+                        Task.occurrence_date)
+            .outerjoin(assignee, Task.assignee_id == assignee.id)
+            .where(Task.project_id == project_id).order_by(Task.id)),
+        ("subtask", select(SubTask.id, SubTask.task_id, SubTask.name, SubTask.status, SubTask.start_date,
+                           SubTask.end_date, assignee.email.label("assignee_email"), SubTask.progress)
+            .join(Task, SubTask.task_id == Task.id)
+            .outerjoin(assignee, SubTask.assignee_id == assignee.id)
+            .where(Task.project_id == project_id).order_by(SubTask.id)),
+        ("dependency", select(TaskDependency.predecessor_id, TaskDependency.successor_id, TaskDependency.lag_days)
+            .join(Task, TaskDependency.successor_id == Task.id)
+            .where(Task.project_id == project_id).order_by(TaskDependency.id)),
+        ("archived_task", select(ArchivedTask.id, ArchivedTask.original_id, ArchivedTask.name,
+                                 ArchivedTask.description, ArchivedTask.status, ArchivedTask.start_date,
+                                 ArchivedTask.end_date, assignee.email.label("assignee_email"),
+                                 ArchivedTask.progress, ArchivedTask.archived_at)
+            .outerjoin(assignee, ArchivedTask.assignee_id == assignee.id)
+            .where(ArchivedTask.project_id == project_id).order_by(ArchivedTask.id)),
+        ("archived_subtask", select(ArchivedSubTask.archived_task_id.label("task_id"), ArchivedSubTask.original_id,
+                                    ArchivedSubTask.name, ArchivedSubTask.status, ArchivedSubTask.start_date,
+                                    ArchivedSubTask.end_date, assignee.email.label("assignee_email"),
+                                    ArchivedSubTask.progress)
+            .outerjoin(assignee, ArchivedSubTask.assignee_id == assignee.id)
+            .where(ArchivedSubTask.project_id == project_id).order_by(ArchivedSubTask.id)),
+    ]
+
+def iter_snapshot_records(project_id: int, batch_size: int = 5000):
+    """
+    Everything that makes up a project as plain dicts with a `type` key, in
+    SNAPSHOT_KINDS order: the project itself, members, recurring series, tasks,
+    subtasks, dependencies and the archive. Streams from server-side cursors; ids
+    are the source's and only link records within one snapshot.
+    """
+    with _read_session() as s:
+        p = s.get(Project, project_id)
+        if p is None:
+            raise ValueError("Project not found")
+        pr = s.get(ProjectRevision, project_id)
+        yield {"type": "project", "name": p.name, "description": p.description, "start_date": p.start_date,
+               "end_date": p.end_date, "is_public": bool(p.is_public), "is_template": bool(p.is_template),
+               "pin_hash": p.pin_hash, "owner_email": p.owner.email if p.owner else None,
+               "revision": int(pr.revision) if pr else 0}
+        for kind, q in _snapshot_queries(project_id):
+            for part in s.execute(q, execution_options={"yield_per": batch_size}).partitions():
+                for r in part:
+                    yield {"type": kind, **r._asdict()}
+
+def _as_datetime(v) -> Optional[datetime]:
+    if v is None or v == "":
+        return None
+    return v if isinstance(v, datetime) else datetime.fromisoformat(str(v))
+
+def _insert_returning_ids(s: Session, table, rows: List[Dict]) -> List[int]:
+    """One multi-row INSERT; new ids come back in the order of `rows`."""
+    return list(s.execute(table.insert().returning(table.c.id, sort_by_parameter_order=True), rows).scalars())
+
+def _restore_batch(s: Session, project_id: int, owner_id: int, kind: str, rows: List[Dict],
+                   ids: Dict[str, Dict[int, int]]) -> None:
+    rev, now = _session_revision(s), datetime.utcnow()
+    users = _users_by_email(s, [r.get("email") or r.get("assignee_email") for r in rows])
+    user_of = lambda r: users.get((r.get("assignee_email") or "").strip().lower())
+
+    def parent(kind_: str, old_id) -> int:
+        try:
+            return ids[kind_][int(old_id)]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Snapshot {kind} record points at a {kind_} that is not in the snapshot") from None
+
+    def item(r: Dict) -> Dict:
+        status = r.get("status") or "To-Do"
+        if status not in TASK_STATUSES:
+            raise ValueError(f"Unknown status: {status}")
+        return {"name": str(r["name"]), "status": status, "start_date": _as_date(r.get("start_date")),
+                "end_date": _as_date(r.get("end_date")), "assignee_id": user_of(r),
+                "progress": float(r.get("progress") or 0)}
+
+    if kind == "member":
+        values = [{"project_id": project_id, "user_id": users[r["email"].strip().lower()],
+                   "role": "editor" if r.get("role") == "owner" else (r.get("role") or "viewer"),
+                   "revision": rev, "updated_at": now}
+                  for r in rows if users[r["email"].strip().lower()] != owner_id]
+        if values:
+            s.execute(ProjectMember.__table__.insert(), values)
+    elif kind == "recurrence":
+        new = _insert_returning_ids(s, TaskRecurrence.__table__, [
+            {"project_id": project_id, "name": r["name"], "description": r.get("description"),
+             "assignee_id": user_of(r), "duration_days": int(r.get("duration_days") or 0), "rule": r["rule"],
+             "dtstart": _as_date(r["dtstart"]), "materialized_through": _as_date(r.get("materialized_through")),
+             "active": bool(r.get("active", True)), "created_at": now}
+            for r in rows])
+        ids["recurrence"].update(zip((int(r["id"]) for r in rows), new))
+    elif kind == "task":
+        values = [{**item(r), "project_id": project_id, "description": r.get("description"),
+                   "recurrence_id": ids["recurrence"].get(r.get("recurrence_id")),
+                   "occurrence_date": _as_date(r.get("occurrence_date")), "revision": rev, "updated_at": now}
+                  for r in rows]
+        new = _insert_returning_ids(s, Task.__table__, values)
+        ids["task"].update(zip((int(r["id"]) for r in rows), new))
+        _restore_due_items(s, project_id, "task", values, new, users)
+    elif kind == "subtask":
+        values = [{**item(r), "task_id": parent("task", r["task_id"]), "revision": rev, "updated_at": now}
+                  for r in rows]
+        new = _insert_returning_ids(s, SubTask.__table__, values)
+        _restore_due_items(s, project_id, "subtask", values, new, users)
+    elif kind == "dependency":
+        s.execute(TaskDependency.__table__.insert(), [
+            {"predecessor_id": parent("task", r["predecessor_id"]), "successor_id": parent("task", r["successor_id"]),
+             "lag_days": int(r.get("lag_days") or 0)}
+            for r in rows])
+    elif kind == "archived_task":
+        new = _insert_returning_ids(s, ArchivedTask.__table__, [
+            {**item(r), "project_id": project_id, "original_id": int(r.get("original_id") or 0),
+             "description": r.get("description"), "updated_at": now, "archive_revision": rev,
+             "archived_at": _as_datetime(r.get("archived_at")) or now}
+            for r in rows])
+        ids["archived_task"].update(zip((int(r["id"]) for r in rows), new))
+    else:
+        s.execute(ArchivedSubTask.__table__.insert(), [
+            {**item(r), "archived_task_id": parent("archived_task", r["task_id"]), "project_id": project_id,
+             "original_id": int(r.get("original_id") or 0), "updated_at": now}
+            for r in rows])
+
+def _restore_due_items(s: Session, project_id: int, kind: str, values: List[Dict], new_ids: List[int],
+                       users: Dict[str, int]) -> None:
+    """Core inserts bypass the flush hook that keeps due_items current; add the open, due ones here."""
+    horizon, now = date.today() + timedelta(days=DUE_HORIZON_DAYS), datetime.utcnow()
+    email_of = {uid: e for e, uid in users.items()}
+    rows = [{"item_kind": kind, "item_id": i, "project_id": project_id, "name": v["name"], "status": v["status"],
+             "end_date": v["end_date"], "assignee_email": email_of.get(v["assignee_id"]),
+             "progress": v["progress"], "seen_at": now}
+            for v, i in zip(values, new_ids)
+            if v["status"] != "Done" and v["end_date"] is not None and v["end_date"] <= horizon]
+    if rows:
+        _upsert_due_items(s.connection(), rows)
+
+def restore_snapshot(records, owner_email: Optional[str] = None, name: Optional[str] = None,
+                     batch_size: int = 1000) -> int:
+    """
+    Create a new project from `iter_snapshot_records` output (possibly from another
+    database) in one transaction: multi-row INSERTs of `batch_size` records, source
+    ids re-pointed to the new ones. The snapshot's owner (or `owner_email`) owns the
+    copy; a replaced owner stays on as editor. Returns the new project id.
+    """
+    records = iter(records)
+    head = next(records, None)
+    if not head or head.get("type") != "project":
+        raise ValueError("A snapshot starts with its project record")
+    owner_email = (owner_email or head.get("owner_email") or "").strip().lower()
+    if not owner_email:
+        raise ValueError("The snapshot names no owner: pass one")
+    with SessionLocal() as s:
+        s.info["activity_bulk"] = True
+        owner_id = _users_by_email(s, [owner_email])[owner_email]
+        is_public = bool(head.get("is_public"))
+        p = Project(name=(name or head["name"]).strip(), description=head.get("description"),
+                    start_date=_as_date(head["start_date"]), end_date=_as_date(head["end_date"]),
+                    owner_id=owner_id, is_public=is_public, is_template=bool(head.get("is_template")),
+                    pin_hash=None if is_public else head.get("pin_hash"))
+        s.add(p)
+        s.flush()
+        s.add(ProjectMember(project_id=p.id, user_id=owner_id, role="owner"))
+        s.flush()
+
+        ids: Dict[str, Dict[int, int]] = {"recurrence": {}, "task": {}, "archived_task": {}}
+        counts = dict.fromkeys(SNAPSHOT_KINDS[1:], 0)
+        kind, batch = None, []
+        for r in records:
+            if r.get("type") != kind:
+                if batch:
+                    _restore_batch(s, p.id, owner_id, kind, batch, ids)
+                    batch = []
+                if r.get("type") not in counts:
+                    raise ValueError(f"Unknown snapshot record type: {r.get('type')}")
+                if kind is not None and SNAPSHOT_KINDS.index(r["type"]) < SNAPSHOT_KINDS.index(kind):
+                    raise ValueError(f"Snapshot records out of order: {r['type']} after {kind}")
+                kind = r["type"]
+            batch.append(r)
+            counts[kind] += 1
+            if len(batch) >= batch_size:
+                _restore_batch(s, p.id, owner_id, kind, batch, ids)
+                batch = []
+        if batch:
+            _restore_batch(s, p.id, owner_id, kind, batch, ids)
+        if counts["archived_task"]:
+            _refresh_archive_rollup(s, p.id)
+        _log_activity(s, p.id, "project.restore", "project", p.id,
+                      f"Restored from a snapshot of {head['name']} ({counts['task']} tasks, "
+                      f"{counts['subtask']} subtasks, {counts['archived_task']} archived)")
+        _on_project_write(s, p.id)
+        s.commit()
+        return p.id
+
+# ---- calendar feeds (feeds.py) ----
+@router.read_only
+def get_member_pin_versions(user_email: str) -> Dict[int, int]:
+    """project id -> pin_version for every project the user is a member of."""
+    with _read_session() as s:
+        return {r.project_id: int(r.pin_version or 0)
+                for r in s.query(ProjectMember.project_id, Project.pin_version)
+                          .join(User, User.id == ProjectMember.user_id)
+                          .join(Project, Project.id == ProjectMember.project_id)
+                          .filter(User.email == (user_email or "").strip().lower())
+                          .order_by(ProjectMember.project_id)}
+
+@router.read_only
+def get_project_revisions(project_ids: List[int]) -> Dict[int, tuple]:
+    """project id -> (revision, changed_at); one indexed lookup, no item rows read."""
+    if not project_ids:
+        return {}
+    with _read_session() as s:
+        return {r.project_id: (int(r.revision), r.changed_at)
+                for r in s.query(ProjectRevision.project_id, ProjectRevision.revision, ProjectRevision.changed_at)
+                          .filter(ProjectRevision.project_id.in_(project_ids))}
+
+@router.read_only
+def get_feed_items(project_ids: List[int], assignee_email: Optional[str] = None,
+                   open_only: bool = False) -> List[Dict]:
+    """Dated tasks and subtasks of `project_ids` (optionally one assignee's, or open ones), by date."""
+    if not project_ids:
+        return []
+    assignee = aliased(User)
+    common = lambda model: (model.name.label("name"), model.status.label("status"),
+                            model.start_date.label("start_date"), model.end_date.label("end_date"),
+                            assignee.email.label("assignee_email"), model.progress.label("progress"),
+                            model.updated_at.label("updated_at"))
+    tasks_q = (
+        select(literal("task").label("kind"), Task.id.label("id"), Task.project_id.label("project_id"),
+               Project.name.label("project"), null().label("parent"), *common(Task))
+        .join(Project, Task.project_id == Project.id)
+        .outerjoin(assignee, Task.assignee_id == assignee.id)
+        .where(Task.project_id.in_(project_ids), or_(Task.start_date.isnot(None), Task.end_date.isnot(None)))
+    )
+    parent = aliased(Task)
+    subs_q = (
+        select(literal("subtask").label("kind"), SubTask.id.label("id"), parent.project_id.label("project_id"),
+               Project.name.label("project"), parent.name.label("parent"), *common(SubTask))
+        .join(parent, SubTask.task_id == parent.id)
+        .join(Project, parent.project_id == Project.id)
+        .outerjoin(assignee, SubTask.assignee_id == assignee.id)
+        .where(parent.project_id.in_(project_ids), or_(SubTask.start_date.isnot(None), SubTask.end_date.isnot(None)))
+    )
+    if assignee_email:
+        email = assignee_email.strip().lower()
+        tasks_q, subs_q = tasks_q.where(assignee.email == email), subs_q.where(assignee.email == email)
+    if open_only:
+        tasks_q, subs_q = tasks_q.where(Task.status != "Done"), subs_q.where(SubTask.status != "Done")
+    items = union_all(tasks_q, subs_q).subquery()
+    q = select(items).order_by(func.coalesce(items.c.end_date, items.c.start_date), items.c.kind, items.c.id)
+    with _read_session() as s:
+        return [dict(r._mapping) for r in s.execute(q)]
+
+# ---- activity log ----
+ACTIVITY_RETENTION_DAYS = int(os.getenv("STRIVIO_ACTIVITY_RETENTION_DAYS", "180"))
+
+def set_actor(email: Optional[str]) -> None:
+    """Who the following writes are attributed to in the activity log."""
+    activity.actor.set((email or "").strip().lower() or None)
+
+@router.read_only
+def get_activity(project_id: int, limit: int = 50, before_id: Optional[int] = None) -> List[Dict]:
+    """Newest first; pass the last id seen as `before_id` for the next page (keyset, index-only)."""
+    with _read_session() as s:
+        q = s.query(ActivityEntry).filter(ActivityEntry.project_id == project_id)
+        if before_id is not None:
+            q = q.filter(ActivityEntry.id < before_id)
+        return [
+            {"id": e.id, "at": e.created_at, "actor": e.actor, "action": e.action,
+             "item_kind": e.item_kind, "item_id": e.item_id, "summary": e.summary}
+            for e in q.order_by(ActivityEntry.id.desc()).limit(limit)
+        ]
+
+def prune_activity(keep_days: Optional[int] = None, chunk: int = 10_000) -> int:
+    """Delete entries older than the retention window, in chunks to keep transactions short."""
+    cutoff = datetime.utcnow() - timedelta(days=ACTIVITY_RETENTION_DAYS if keep_days is None else keep_days)
+    total = 0
+    while True:
+        with SessionLocal() as s:
+            ids = select(ActivityEntry.id).where(ActivityEntry.created_at < cutoff).limit(chunk)
+            n = s.query(ActivityEntry).filter(ActivityEntry.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+        total += n
+        if n < chunk:
+            return total
+
+# ---- notifications ----
+def _due_batch(s: Session, model, hi: date, after: Optional[tuple], batch_size: int):
+    """
+    One keyset page of open items with end_date <= hi, ordered by (end_date, id): a range
+    scan of the partial (end_date, id) index, so done items cost nothing however many exist.
+    """
+    item_kind = "task" if model is Task else "subtask"
+    q = select(literal(item_kind), model.id, Task.project_id, model.name, model.status, model.end_date,
+               User.email, func.coalesce(model.progress, 0.0))
+    q = q.select_from(model)
+    if model is SubTask:
+        q = q.join(Task, Task.id == SubTask.task_id)
+    q = q.outerjoin(User, User.id == model.assignee_id) \
+        .where(model.status != literal_column("'Done'"), model.end_date <= hi)
+    if after is not None:
+        q = q.where((model.end_date > after[0]) | ((model.end_date == after[0]) & (model.id > after[1])))
+    return s.execute(q.order_by(model.end_date, model.id).limit(batch_size)).all()
 
+def scan_due_items(today: Optional[date] = None, horizon_days: Optional[int] = None,
+                   batch_size: int = 1000) -> int:
+    """
+    Rebuild due_items across all projects: every open item overdue or due by today + horizon.
+    Works in keyset-paginated batches, one short transaction each; rows the scan did not
+    see (completed, moved out of range, deleted by raw SQL) are dropped at the end.
+    """
+    today = today or date.today()
+    horizon = DUE_HORIZON_DAYS if horizon_days is None else horizon_days
+    hi = today + timedelta(days=horizon)
+    with SessionLocal() as s:
+        scan = DueScan(day=today, horizon_days=horizon, started_at=datetime.utcnow())
+        s.add(scan)
+        s.commit()
+        scan_id, started = scan.id, scan.started_at
+    total = 0
+    cols = ("item_kind", "item_id", "project_id", "name", "status", "end_date", "assignee_email", "progress")
+    for model in (Task, SubTask):
+        after = None
+        while True:
+            with SessionLocal() as s:
+                rows = _due_batch(s, model, hi, after, batch_size)
+                if not rows:
+                    break
+                now = datetime.utcnow()
+                _upsert_due_items(s.connection(), [dict(zip(cols, r), seen_at=now) for r in rows])
+                s.commit()
+            total += len(rows)
+            after = (rows[-1][5], rows[-1][1])
+            if len(rows) < batch_size:
+                break
+    with SessionLocal() as s:
+        s.query(DueItem).filter(DueItem.seen_at < started).delete(synchronize_session=False)
+        s.query(DueScan).filter(DueScan.id == scan_id).update(
+            {"finished_at": datetime.utcnow(), "items": total}, synchronize_session=False)
+        s.commit()
+    return total
+
+def ensure_due_scan(today: Optional[date] = None) -> bool:
+    """Run the scan unless one already finished today; True if it ran."""
+    today = today or date.today()
+    with SessionLocal() as s:
+        done = s.query(DueScan.id).filter(DueScan.day == today, DueScan.finished_at.isnot(None)).first()
+    if done:
+        return False
+    scan_due_items(today)
+    return True
+
+@router.read_only
+def get_due_items(project_id: int, today: Optional[date] = None, horizon_days: Optional[int] = None) -> Dict:
+    """{'overdue': [...], 'upcoming': [...]} for the project from the scanner's table."""
+    today = today or date.today()
+    hi = today + timedelta(days=DUE_HORIZON_DAYS if horizon_days is None else horizon_days)
+    with _read_session() as s:
+        rows = s.query(DueItem).filter(DueItem.project_id == project_id, DueItem.end_date <= hi) \
+            .order_by(DueItem.end_date, DueItem.item_kind, DueItem.item_id).all()
+        out = {"overdue": [], "upcoming": []}
+        for r in rows:
+            out["overdue" if r.end_date < today else "upcoming"].append({
+                "id": r.item_id, "name": r.name, "_type": "Task" if r.item_kind == "task" else "Subtask",
+                "assignee_email": r.assignee_email, "status": r.status, "end_date": r.end_date,
+                "progress": float(r.progress or 0)})
+        return out
+
+def queue_due_notifications(today: Optional[date] = None, soon_days: Optional[int] = None) -> int:
+    """
+    Queue 'due_soon' (due within `soon_days`) and 'overdue' notices from due_items.
+    Keyed by item and due date, so each fires once per due date however often this runs.
+    """
+    today = today or date.today()
+    soon = NOTIFY_DUE_SOON_DAYS if soon_days is None else soon_days
+    ensure_due_scan(today)
+    cols = ["recipient", "project_id", "kind", "item_kind", "item_id", "text", "dedupe_key",
+            "status", "attempts", "created_at"]
+    windows = [("due_soon", today, today + timedelta(days=soon)),
+               ("overdue", today - timedelta(days=30), today - timedelta(days=1))]
+    total = 0
+    with SessionLocal() as s:
+        for kind, lo, hi in windows:
+            end = cast(DueItem.end_date, String)
+            key = literal(f"{kind}|") + DueItem.item_kind + literal("|") + cast(DueItem.item_id, String) \
+                + literal("|") + end
+            src = select(DueItem.assignee_email, DueItem.project_id, literal(kind), DueItem.item_kind,
+                         DueItem.item_id, DueItem.name + literal(" (due ") + end + literal(")"), key,
+                         literal("pending"), literal(0), literal(datetime.utcnow())) \
+                .where(DueItem.end_date >= lo, DueItem.end_date <= hi, DueItem.assignee_email.isnot(None),
+                       ~exists().where(Notification.dedupe_key == key))
+            ins = _insert_for(s, Notification.__table__)
+            stmt = (ins if ins is not None else Notification.__table__.insert()).from_select(cols, src)
+            if ins is not None:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["dedupe_key"])
+            total += s.execute(stmt).rowcount or 0
+        s.commit()
+    return total
+
+def claim_notification_digests(max_recipients: int = 100, min_age_minutes: int = 0,
+                               stale_minutes: int = 15) -> Dict[str, List[Dict]]:
+    """
+    Claim pending notifications for up to `max_recipients` recipients whose oldest pending
+    item is at least `min_age_minutes` old (so bursts coalesce into one digest).
+    Claims are atomic UPDATEs, so several workers never send the same row twice;
+    a claim older than `stale_minutes` (crashed worker) is taken over.
+    """
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    claimable = (Notification.status == "pending") & (
+        Notification.claimed_at.is_(None) | (Notification.claimed_at < now - timedelta(minutes=stale_minutes)))
+    with SessionLocal() as s:
+        recipients = list(s.scalars(
+            select(Notification.recipient).where(claimable)
+            .group_by(Notification.recipient)
+            .having(func.min(Notification.created_at) <= now - timedelta(minutes=min_age_minutes))
+            .order_by(func.min(Notification.created_at))
+            .limit(max_recipients)))
+        if not recipients:
+            return {}
+        s.query(Notification).filter(claimable, Notification.recipient.in_(recipients)) \
+            .update({"claim_token": token, "claimed_at": now}, synchronize_session=False)
+        rows = s.execute(
+            select(Notification, Project.name).outerjoin(Project, Project.id == Notification.project_id)
+            .where(Notification.claim_token == token, Notification.status == "pending")
+            .order_by(Notification.recipient, Notification.project_id, Notification.id)).all()
+        s.commit()
+        out: Dict[str, List[Dict]] = {}
+        for n, project_name in rows:
+            out.setdefault(n.recipient, []).append({
+                "id": n.id, "project_id": n.project_id, "project": project_name or f"Project {n.project_id}",
+                "kind": n.kind, "item_kind": n.item_kind, "item_id": n.item_id, "text": n.text,
+                "created_at": n.created_at})
+        return out
+
+def finish_notifications(ids: List[int], error: Optional[str] = None) -> None:
+    """Mark claimed rows sent, or release them for a retry (failed after NOTIFY_MAX_ATTEMPTS)."""
+    if not ids:
+        return
+    with SessionLocal() as s:
+        q = s.query(Notification).filter(Notification.id.in_(ids))
+        if error is None:
+            q.update({"status": "sent", "sent_at": datetime.utcnow(), "claim_token": None},
+                     synchronize_session=False)
+        else:
+            q.update({"attempts": Notification.attempts + 1, "last_error": error[:500],
+                      "claim_token": None, "claimed_at": None,
+                      "status": case((Notification.attempts + 1 >= NOTIFY_MAX_ATTEMPTS, "failed"),
+                                     else_="pending")},
+                     synchronize_session=False)
+        s.commit()
+
+def prune_notifications(keep_days: int = 30) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    with SessionLocal() as s:
+        n = s.query(Notification).filter(Notification.status != "pending",
+                                         Notification.created_at < cutoff).delete(synchronize_session=False)
+        s.commit()
+    return n
+
+# ---- session-token revocations ----
+def revoke_session_token(jti: str, expires_at: float) -> None:
+    with SessionLocal() as s:
+        s.add(AuthRevocation(jti=jti, expires_at=datetime.utcfromtimestamp(expires_at)))
+        s.commit()
+
+def load_auth_revocations(after_id: int = 0) -> List[Dict]:
+    """Rows newer than `after_id` (primary, not the replica: revocations must not lag)."""
+    epoch = datetime(1970, 1, 1)
+    with SessionLocal() as s:
+        rows = s.query(AuthRevocation).filter(AuthRevocation.id > after_id).order_by(AuthRevocation.id).all()
+        return [{"id": r.id, "jti": r.jti, "project_id": r.project_id,
+                 "at": (r.at - epoch).total_seconds(),
+                 "expires": (r.expires_at - epoch).total_seconds() if r.expires_at else None} for r in rows]
+
+def prune_auth_revocations(max_token_age_days: float) -> int:
+    """Drop rows no live token can be affected by: expired jtis, role changes older than any token."""
+    now = datetime.utcnow()
+    with SessionLocal() as s:
+        n = s.query(AuthRevocation).filter(
+            (AuthRevocation.expires_at < now)
+            | (AuthRevocation.jti.is_(None) & (AuthRevocation.at < now - timedelta(days=max_token_age_days)))
+        ).delete(synchronize_session=False)
+        s.commit()
+    return n
 
+# ---- read routing ----
+def set_route_key(key: Optional[str]) -> None:
+    """Identify the current user session so reads after its own writes stay consistent."""
+    routing.route_key.set(key)
@@ -0,0 +1,148 @@
+# export.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Streaming export of tasks + subtasks to CSV, #
+#               Parquet or NDJSON in bounded memory, for the #
+#               UI (via jobs.py) and the command line.       #
+#============================================================#
+
+
+from __future__ import annotations
+
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import sys
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, List, Optional, Union
+
+import db
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "ndjson": ".ndjson"}
+
+
+def available_formats() -> List[str]:
+    """FORMATS this install can write (Parquet only with pyarrow importable)."""
+    return [f for f in FORMATS if f != "parquet" or importlib.util.find_spec("pyarrow") is not None]
+
+Progress = Callable[[float, str], None]
+
+
+def _csv(batches: Iterable[List[tuple]], fh: BinaryIO, on_batch: Callable[[int], None]) -> None:
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    try:
+        w = csv.writer(text)
+        w.writerow(db.EXPORT_COLUMNS)
+        for batch in batches:
+            w.writerows(batch)
+            on_batch(len(batch))
+        text.flush()
+    finally:
+        text.detach()   # leave the caller's stream open
+
+
+def _ndjson(batches: Iterable[List[tuple]], fh: BinaryIO, on_batch: Callable[[int], None]) -> None:
+    cols = db.EXPORT_COLUMNS
+    for batch in batches:
+        fh.write("".join(
+            json.dumps(dict(zip(cols, row)), default=str, ensure_ascii=False) + "\n" for row in batch
+        ).encode("utf-8"))
+        on_batch(len(batch))
+
+
+def _parquet(batches: Iterable[List[tuple]], fh: BinaryIO, on_batch: Callable[[int], None]) -> None:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:   # ships with streamlit, but the CLI may run without it
+        raise ValueError("Parquet export needs pyarrow: pip install pyarrow") from e
+
+    schema = pa.schema([
+        ("project_id", pa.int64()), ("project", pa.string()), ("type", pa.string()),
+        ("id", pa.int64()), ("parent_id", pa.int64()), ("name", pa.string()),
+        ("status", pa.string()), ("start_date", pa.date32()), ("end_date", pa.date32()),
+        ("assignee_email", pa.string()), ("progress", pa.float64()), ("description", pa.string()),
+    ])
+    with pq.ParquetWriter(fh, schema, compression="zstd") as writer:
+        for batch in batches:
+            columns = list(zip(*batch))   # row batch -> columns, one row group per batch
+            writer.write_batch(pa.record_batch(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            on_batch(len(batch))
+
+
+_WRITERS = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}
+
+
+def export_projects(project_ids: List[int], fmt: str, dest: Union[str, Path, BinaryIO],
+                    progress: Optional[Progress] = None, batch_size: int = 5000) -> int:
+    """
+    Stream every task and subtask of `project_ids` to `dest` (a path or a binary file
+    object) as `fmt`. Returns the number of rows written.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt} (choose from {', '.join(FORMATS)})")
+    total = db.count_export_rows(project_ids) if progress else 0
+    written = [0]
+
+    def on_batch(n: int) -> None:
+        written[0] += n
+        if progress:
+            progress(written[0] / total if total else 1.0, f"{written[0]:,} of {total:,} rows")
+
+    batches = db.iter_export_rows(project_ids, batch_size=batch_size)
+    if isinstance(dest, (str, Path)):
+        with open(dest, "wb") as fh:
+            _WRITERS[fmt](batches, fh, on_batch)
+    else:
+        _WRITERS[fmt](batches, dest, on_batch)
+    return written[0]
+
+
+def project_ids_for(project_ids: Optional[List[int]] = None, user_email: Optional[str] = None) -> List[int]:
+    """Explicit ids, else every project `user_email` can see."""
+    if project_ids:
+        return [int(p) for p in project_ids]
+    if user_email:
+        return [p.id for p in db.get_projects_for_user(user_email)]
+    raise ValueError("Pass project ids or a user email")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("-f", "--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("-p", "--project", type=int, action="append", dest="projects",
+                        help="project id (repeatable)")
+    parser.add_argument("-u", "--user", help="export every project this email can see")
+    parser.add_argument("-o", "--out", default="-", help="output file, '-' for stdout (csv/ndjson)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+
+
+def run(args: argparse.Namespace) -> int:
+    pids = project_ids_for(args.projects, args.user)
+    if args.out == "-":
+        if args.format == "parquet":
+            raise ValueError("Parquet needs a file: pass --out")
+        n = export_projects(pids, args.format, sys.stdout.buffer, batch_size=args.batch_size)
+        sys.stdout.buffer.flush()
+    else:
+        n = export_projects(pids, args.format, args.out, batch_size=args.batch_size)
+    print(f"exported {n:,} rows from {len(pids)} project(s)", file=sys.stderr)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream Strivio tasks and subtasks to a file.")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        return run(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
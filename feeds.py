@@ -0,0 +1,303 @@
+# feeds.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Read-only calendar (ICS) and timeline (JSON) #
+#               feeds over HTTP for calendar clients, with   #
+#               ETag/Last-Modified taken from project        #
+#               revisions so repeat polls are cheap 304s.    #
+#============================================================#
+
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import auth
+import db
+
+log = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("STRIVIO_FEED_URL", "").rstrip("/")     # public address of the feed server, for links
+TOKEN_DAYS = float(os.getenv("STRIVIO_FEED_TOKEN_DAYS", "365"))
+MAX_AGE = int(os.getenv("STRIVIO_FEED_MAX_AGE", "300"))        # seconds clients may reuse a feed unchecked
+UID_DOMAIN = os.getenv("STRIVIO_FEED_UID_DOMAIN", "strivio-pm")
+FEED_KEY = os.getenv("STRIVIO_FEED_KEY", "")                   # signs feed links; never the cookie key
+CACHE_ENTRIES = 256
+TOKEN_PURPOSE = "feed"
+
+_ROUTE = re.compile(r"^/feeds/(?:(me)|project/(\d+))\.(ics|json)$")
+_CONTENT_TYPES = {"ics": "text/calendar; charset=utf-8", "json": "application/json"}
+
+
+# ---- feed links ----
+def _feed_key() -> str:
+    """STRIVIO_FEED_KEY, or ValueError while it is unset, the sample value or too short to be a secret."""
+    if FEED_KEY.strip().lower() in ("", "changeme") or len(FEED_KEY.encode("utf-8")) < 32:
+        raise ValueError("Feed links need STRIVIO_FEED_KEY set to a random secret of at least 32 bytes, "
+                         "e.g. python -c \"import secrets; print(secrets.token_urlsafe(32))\"")
+    return FEED_KEY
+
+
+def issue_token(user: Dict, project_id: Optional[int] = None, pin_version: int = 0) -> str:
+    """
+    Long-lived signed link token: one user's feed (`project_id` None) or one project's.
+    Membership is checked on every request; changing a project's PIN voids its links.
+    A user's feed records the PIN version of each of their projects, so it stops
+    showing a project whose PIN changed (or that they joined) after it was issued.
+    """
+    key = _feed_key()
+    now = time.time()
+    claims = {"jti": secrets.token_hex(8), "uid": int(user["id"]), "email": user["email"],
+              "feed": int(project_id or 0), "pv": int(pin_version or 0), "iat": now,
+              "exp": now + TOKEN_DAYS * 86400}
+    if not project_id:
+        claims["pvs"] = {str(pid): pv for pid, pv in db.get_member_pin_versions(user["email"]).items()}
+    return auth.encode(claims, purpose=TOKEN_PURPOSE, key=key)
+
+
+def feed_url(token: str, project_id: Optional[int] = None, fmt: str = "ics", **params) -> str:
+    path = f"/feeds/project/{project_id}.{fmt}" if project_id else f"/feeds/me.{fmt}"
+    return f"{BASE_URL}{path}?{urlencode({'token': token, **params})}"
+
+
+# ---- rendering ----
+def _ics_text(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+                 .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """RFC 5545 folding: at most 75 octets per line, never splitting a UTF-8 character."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line
+    parts, start, limit = [], 0, 75
+    while start < len(raw):
+        end = min(len(raw), start + limit)
+        while end < len(raw) and (raw[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(raw[start:end].decode("utf-8"))
+        start, limit = end, 74   # continuation lines start with a space
+    return "\r\n ".join(parts)
+
+
+def _utc_stamp(dt: Optional[datetime]) -> str:
+    return (dt or datetime.utcnow()).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_ics(title: str, items: List[Dict]) -> bytes:
+    """All-day VEVENTs from start to end date (either alone gives a one-day event)."""
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Strivio-PM//Feeds//EN", "CALSCALE:GREGORIAN",
+             "METHOD:PUBLISH", f"X-WR-CALNAME:{_ics_text(title)}",
+             f"REFRESH-INTERVAL;VALUE=DURATION:PT{max(1, MAX_AGE // 60)}M",
+             f"X-PUBLISHED-TTL:PT{max(1, MAX_AGE // 60)}M"]
+    for it in items:
+        dates = [d for d in (it["start_date"], it["end_date"]) if d is not None]
+        first, last = min(dates), max(dates)
+        name = it["name"] if it["kind"] == "task" else f"{it['parent']}: {it['name']}"
+        details = [f"Project: {it['project']}", f"Status: {it['status']}",
+                   f"Progress: {float(it['progress'] or 0):.0f}%"]
+        if it["assignee_email"]:
+            details.append(f"Assignee: {it['assignee_email']}")
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{it['kind']}-{it['id']}@{UID_DOMAIN}",
+            f"DTSTAMP:{_utc_stamp(it['updated_at'])}",
+            f"LAST-MODIFIED:{_utc_stamp(it['updated_at'])}",
+            f"DTSTART;VALUE=DATE:{first:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{last + timedelta(days=1):%Y%m%d}",   # exclusive end
+            f"SUMMARY:{_ics_text(name + (' (done)' if it['status'] == 'Done' else ''))}",
+            f"DESCRIPTION:{_ics_text(chr(10).join(details))}",
+            f"CATEGORIES:{_ics_text(it['project'])}",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(l) for l in lines) + "\r\n").encode("utf-8")
+
+
+def render_json(title: str, items: List[Dict], revisions: Dict[int, Tuple[int, datetime]]) -> bytes:
+    body = {
+        "title": title,
+        "revisions": {str(pid): rev for pid, (rev, _) in sorted(revisions.items())},
+        "items": [{**it, "start_date": it["start_date"] and it["start_date"].isoformat(),
+                   "end_date": it["end_date"] and it["end_date"].isoformat(),
+                   "updated_at": it["updated_at"] and it["updated_at"].isoformat(timespec="seconds"),
+                   "progress": float(it["progress"] or 0)}
+                  for it in items],
+    }
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ---- responses (bodies cached by ETag, so every client of one revision shares one render) ----
+class _BodyCache:
+    def __init__(self, entries: int = CACHE_ENTRIES):
+        self._lock = threading.Lock()
+        self._bodies: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+        self.entries = entries
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            variants = self._bodies.get(etag)
+            if variants is None:
+                return None
+            self._bodies.move_to_end(etag)
+            if encoding not in variants and encoding == "gzip" and "identity" in variants:
+                variants["gzip"] = gzip.compress(variants["identity"], compresslevel=6)
+            return variants.get(encoding)
+
+    def put(self, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._bodies[etag] = {"identity": body}
+            self._bodies.move_to_end(etag)
+            while len(self._bodies) > self.entries:
+                self._bodies.popitem(last=False)
+
+
+bodies = _BodyCache()
+
+
+class FeedError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _resolve(kind: str, project_id: Optional[int], params: Dict[str, str]):
+    """(claims, project ids, title) for a request, or FeedError."""
+    claims = auth.decode(params.get("token"), purpose=TOKEN_PURPOSE, key=_feed_key())
+    if not auth.is_valid(claims):
+        raise FeedError(403, "invalid or expired feed link")
+    if kind == "me":
+        if claims["feed"]:
+            raise FeedError(403, "this link is for a single project")
+        issued = claims.get("pvs") or {}
+        pids = [pid for pid, pv in db.get_member_pin_versions(claims["email"]).items()
+                if issued.get(str(pid)) == pv]
+        return claims, pids, f"Strivio: {claims['email']}"
+    if claims["feed"] != project_id:
+        raise FeedError(403, "this link is for another feed")
+    project = db.get_project(project_id)
+    if project is None:
+        raise FeedError(404, "no such project")
+    if int(project.pin_version or 0) != claims["pv"] or db.get_user_role(project_id, claims["email"]) is None:
+        raise FeedError(403, "feed link no longer valid for this project")
+    return claims, [project_id], f"Strivio: {project.name}"
+
+
+def validators(key: str, revisions: Dict[int, Tuple[int, datetime]]) -> Tuple[str, Optional[datetime]]:
+    """Weak ETag over the feed's identity and its projects' revisions, and their latest change."""
+    digest = hashlib.sha1(
+        (key + "|" + ",".join(f"{pid}:{rev}" for pid, (rev, _) in sorted(revisions.items()))).encode("utf-8")
+    ).hexdigest()[:32]
+    changed = [c for _, c in revisions.values() if c is not None]
+    return f'W/"{digest}"', max(changed).replace(microsecond=0) if changed else None
+
+
+def not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    inm = headers.get("If-None-Match")
+    if inm is not None:   # takes precedence over If-Modified-Since (RFC 9110)
+        tags = {t.strip() for t in inm.split(",")}
+        return "*" in tags or etag in tags or etag[2:] in tags
+    ims = headers.get("If-Modified-Since")
+    if ims and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+        return since.replace(tzinfo=None) >= last_modified
+    return False
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    server_version = "StrivioFeeds/1.0"
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def _serve(self, send_body: bool) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/healthz":
+            return self._send(200, b"ok", "text/plain", send_body=send_body)
+        m = _ROUTE.match(url.path)
+        if m is None:
+            return self._send(404, b"not found", "text/plain", send_body=send_body)
+        kind, fmt = "me" if m.group(1) else "project", m.group(3)
+        project_id = int(m.group(2)) if m.group(2) else None
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            claims, pids, title = _resolve(kind, project_id, params)
+        except FeedError as e:
+            return self._send(e.status, str(e).encode("utf-8"), "text/plain", send_body=send_body)
+
+        # user feeds: the user's own items unless ?scope=all; ?open=1 skips Done items
+        mine = kind == "me" and params.get("scope") != "all"
+        open_only = params.get("open") in ("1", "true", "yes")
+        revisions = db.get_project_revisions(pids)
+        etag, last_modified = validators(
+            f"{kind}|{project_id}|{fmt}|{claims['email']}|{mine}|{open_only}|{','.join(map(str, pids))}", revisions)
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={MAX_AGE}", "Vary": "Accept-Encoding"}
+        if last_modified is not None:
+            headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+        if not_modified(self.headers, etag, last_modified):
+            return self._send(304, b"", None, headers, send_body=False)
+
+        encoding = "gzip" if "gzip" in (self.headers.get("Accept-Encoding") or "") else "identity"
+        body = bodies.get(etag, encoding)
+        if body is None:
+            items = db.get_feed_items(pids, assignee_email=claims["email"] if mine else None, open_only=open_only)
+            body = render_ics(title, items) if fmt == "ics" else render_json(title, items, revisions)
+            bodies.put(etag, body)
+            if encoding == "gzip":
+                body = gzip.compress(body, compresslevel=6)
+        if encoding == "gzip":
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, body, _CONTENT_TYPES[fmt], headers, send_body=send_body)
+
+    def _send(self, status: int, body: bytes, content_type: Optional[str],
+              headers: Optional[Dict[str, str]] = None, send_body: bool = True) -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def log_message(self, fmt: str, *args) -> None:
+        # feed links carry their token in the query string: keep it out of the logs
+        log.info("%s %s", self.address_string(), (fmt % args).split("?", 1)[0])
+
+
+def serve(host: str = "0.0.0.0", port: int = 8502) -> None:
+    """Run the feed server until interrupted (one thread per request); ValueError without a feed key."""
+    _feed_key()
+    httpd = ThreadingHTTPServer((host, port), FeedHandler)
+    httpd.daemon_threads = True
+    log.info("serving feeds on http://%s:%d", host, port)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
@@ -0,0 +1,211 @@
+# invalidation.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Per-process project read cache and a change  #
+#               bus that evicts it when any replica writes:  #
+#               Postgres LISTEN/NOTIFY, or SQLite polling of #
+#               PRAGMA data_version + project_revisions.     #
+#============================================================#
+
+
+from __future__ import annotations
+
+import logging
+import select as _select
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, ContextManager, Dict, Hashable, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "strivio_invalidate"
+
+
+class ProjectCache:
+    """
+    Thread-safe read cache grouped by project, so a write evicts exactly that
+    project's entries. Values are shared between sessions: treat them as read-only.
+    Loaders run outside the lock; a value is only stored if no eviction of its
+    project (or clear) happened while it was loading, so a stale read never
+    outlives the write that evicted it. `load_context`, if given, wraps every
+    loader call (db uses it to fill the cache from the primary only).
+    """
+
+    def __init__(self, max_projects: int = 256,
+                 load_context: Optional[Callable[[], ContextManager]] = None):
+        self.max_projects = max_projects
+        self.load_context = load_context
+        self._data: "OrderedDict[int, Dict[Hashable, Any]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}   # project id -> evictions so far
+        self._epoch = 0                          # clears so far
+        self._lock = threading.Lock()
+
+    def get_or_load(self, project_id: int, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entries = self._data.get(project_id)
+            if entries is not None and key in entries:
+                self._data.move_to_end(project_id)
+                return entries[key]
+            seen = (self._epoch, self._generations.get(project_id, 0))
+        if self.load_context is None:
+            value = loader()
+        else:
+            with self.load_context():
+                value = loader()
+        with self._lock:
+            if seen != (self._epoch, self._generations.get(project_id, 0)):
+                return value   # evicted while loading: serve it once, don't keep it
+            self._data.setdefault(project_id, {})[key] = value
+            self._data.move_to_end(project_id)
+            while len(self._data) > self.max_projects:
+                self._data.popitem(last=False)
+        return value
+
+    def evict(self, project_ids: Iterable[int]) -> None:
+        with self._lock:
+            for pid in project_ids:
+                pid = int(pid)
+                self._data.pop(pid, None)
+                self._generations[pid] = self._generations.get(pid, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+
+class _Listener(threading.Thread):
+    def __init__(self, engine: Engine, on_change: Callable[[Iterable[int]], None]):
+        super().__init__(daemon=True, name=f"{type(self).__name__}")
+        self.engine = engine
+        self.on_change = on_change
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+class PollingListener(_Listener):
+    """
+    SQLite fallback. `PRAGMA data_version` changes whenever another connection
+    commits to the file, so the idle cost is one pragma per interval; only then
+    is `project_revisions` read for rows newer than the last seen revision.
+    """
+
+    def __init__(self, engine: Engine, on_change, interval: float = 0.5):
+        super().__init__(engine, on_change)
+        self.interval = interval
+
+    def run(self) -> None:
+        raw = self.engine.raw_connection()
+        try:
+            cur = raw.cursor()
+            last_rev = cur.execute("SELECT coalesce(max(revision), 0) FROM project_revisions").fetchone()[0]
+            last_version = cur.execute("PRAGMA data_version").fetchone()[0]
+            raw.commit()
+            while not self._stop_event.wait(self.interval):
+                try:
+                    version = cur.execute("PRAGMA data_version").fetchone()[0]
+                    if version == last_version:
+                        continue
+                    last_version = version
+                    rows = cur.execute(
+                        "SELECT project_id, revision FROM project_revisions WHERE revision > ?",
+                        (last_rev,),
+                    ).fetchall()
+                    raw.commit()
+                    if rows:
+                        last_rev = max(r[1] for r in rows)
+                        self.on_change([r[0] for r in rows])
+                except Exception:
+                    log.exception("invalidation poll failed")
+        finally:
+            raw.close()
+
+
+class NotifyListener(_Listener):
+    """Postgres: LISTEN on CHANNEL; payload is the project id. Reconnects on failure."""
+
+    def run(self) -> None:
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                # anything written while disconnected is unknown: drop everything
+                self.on_change(None)
+                backoff = 1.0
+                while not self._stop_event.is_set():
+                    if _select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    pids = set()
+                    while conn.notifies:
+                        pids.add(int(conn.notifies.pop(0).payload))
+                    if pids:
+                        self.on_change(pids)
+            except Exception:
+                log.exception("invalidation listener lost its connection")
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+def publish(connection, project_id: int) -> None:
+    """
+    Announce a project change inside the writer's transaction. On Postgres NOTIFY is
+    delivered at COMMIT (and dropped on rollback); polling dialects read the revision
+    table the writer already bumped, so there is nothing more to send.
+    """
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_notify(:ch, :pid)"), {"ch": CHANNEL, "pid": str(project_id)})
+
+
+def start_listener(engine: Engine, cache: ProjectCache,
+                   on_change: Optional[Callable[[Iterable[int]], None]] = None) -> _Listener:
+    """Start the background listener that evicts `cache` entries for changed projects."""
+    def _evict(pids):
+        if pids is None:
+            cache.clear()
+        else:
+            cache.evict(pids)
+        if on_change:
+            on_change(pids)
+
+    cls = NotifyListener if engine.dialect.name == "postgresql" else PollingListener
+    listener = cls(engine, _evict)
+    listener.start()
+    return listener
+
+
+if __name__ == "__main__":
+    # Two-process check: run `python invalidation.py` in one terminal, then edit
+    # a task (UI or another Python shell) against the same DATABASE_URL.
+    import db
+
+    db.init_db()
+    start_listener(db.engine, db.project_cache,
+                   on_change=lambda pids: print(f"{time.strftime('%X')} evicted projects: "
+                                                f"{'all' if pids is None else sorted(set(pids))}",
+                                                flush=True))
+    print(f"Listening for project changes on {db.engine.url.render_as_string(hide_password=True)} ...")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
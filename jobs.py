@@ -0,0 +1,289 @@
+# jobs.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Background jobs (PDF reports, exports) run   #
+#               in a process pool off the Streamlit rerun,   #
+#               persisted in `jobs`, deduped and cached by   #
+#               project revision, claimed with a heartbeat   #
+#               so replicas never run the same job twice.    #
+#============================================================#
+
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+import db
+
+log = logging.getLogger(__name__)
+
+ARTIFACT_DIR = Path(os.getenv("STRIVIO_ARTIFACT_DIR", "artifacts"))
+MAX_WORKERS = int(os.getenv("STRIVIO_JOB_WORKERS", "2"))
+# queued rows older than this, or running rows without a heartbeat for this long, are
+# assumed abandoned (e.g. the server was killed)
+STALE_AFTER = timedelta(minutes=int(os.getenv("STRIVIO_JOB_STALE_MINUTES", "30")))
+HEARTBEAT_SECONDS = float(os.getenv("STRIVIO_JOB_HEARTBEAT_SECONDS", "30"))
+
+# kind -> fn(job: dict, progress: Callable[[float, str], None]) -> Path of the finished artifact
+_HANDLERS: Dict[str, Callable] = {}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def handler(kind: str):
+    """Register a job handler under `kind`."""
+    def register(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded web server is unsafe
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _dispatch(job_id: int) -> None:
+    """Hand a job to the pool; a worker that dies takes its job down with it, not the app."""
+    def _done(fut: Future) -> None:
+        exc = fut.exception()
+        if exc is None:
+            return
+        if isinstance(exc, BrokenProcessPool):
+            global _executor
+            with _executor_lock:
+                if _executor is pool:
+                    _executor = None
+        log.error("job %s crashed its worker: %r", job_id, exc)
+        _update(job_id, status="failed", message=f"Worker crashed: {exc!r}"[:500],
+                finished_at=datetime.utcnow())
+
+    pool = _pool()
+    pool.submit(_run, job_id).add_done_callback(_done)
+
+
+def artifact_path(job: Dict, filename: str) -> Path:
+    ARTIFACT_DIR.mkdir(parents=True, exist_ok=True)
+    return ARTIFACT_DIR / f"job{job['id']}-{filename}"
+
+
+def _job_dict(j: "db.Job") -> Dict:
+    return {
+        "id": j.id,
+        "kind": j.kind,
+        "project_id": j.project_id,
+        "params": json.loads(j.params or "{}"),
+        "revision": int(j.revision or 0),
+        "status": j.status,
+        "progress": float(j.progress or 0),
+        "message": j.message,
+        "artifact_path": j.artifact_path,
+        "requested_by": j.requested_by,
+        "created_at": j.created_at,
+        "finished_at": j.finished_at,
+    }
+
+
+# ---- submission / status (server side) ----
+def _is_stale(job: "db.Job", now: datetime) -> bool:
+    seen = job.heartbeat_at if job.status == "running" and job.heartbeat_at else job.created_at
+    return seen is None or now - seen >= STALE_AFTER
+
+
+def _active_job_id(s, key: str) -> Optional[int]:
+    return s.query(db.Job.id).filter(db.Job.dedupe_key == key,
+                                     db.Job.status.in_(("queued", "running"))).scalar()
+
+
+def submit(kind: str, project_id: Optional[int], params: Optional[Dict] = None,
+           requested_by: Optional[str] = None) -> int:
+    """
+    Queue a job and return its id. An identical request (same kind, project, params and
+    project revision) that is queued, running, or done with its artifact on disk is
+    returned instead of starting new work. A unique index allows one queued/running job
+    per request, so replicas racing on the same request end up sharing one job.
+    """
+    if kind not in _HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    params_json = json.dumps(params or {}, sort_keys=True, default=str)
+    revision = db.get_project_revision(project_id) if project_id else 0
+    key = hashlib.sha1(f"{kind}|{project_id}|{params_json}|{revision}".encode("utf-8")).hexdigest()
+    now = datetime.utcnow()
+    with db.SessionLocal() as s:
+        existing = (
+            s.query(db.Job)
+            .filter(db.Job.dedupe_key == key, db.Job.status != "failed")
+            .order_by(db.Job.id.desc())
+            .first()
+        )
+        if existing is not None:
+            if existing.status == "done":
+                if existing.artifact_path and Path(existing.artifact_path).is_file():
+                    return existing.id
+            elif not _is_stale(existing, now):
+                return existing.id
+            else:
+                # abandoned: retire it (unless its worker just finished) so the new one can take the key
+                s.query(db.Job).filter(db.Job.id == existing.id, db.Job.status == existing.status) \
+                    .update({"status": "failed", "message": "Abandoned", "finished_at": now},
+                            synchronize_session=False)
+        job = db.Job(kind=kind, project_id=project_id, params=params_json, revision=revision,
+                     dedupe_key=key, requested_by=requested_by)
+        s.add(job)
+        try:
+            s.commit()
+        except IntegrityError:
+            s.rollback()
+            job_id = _active_job_id(s, key)
+            if job_id is None:
+                raise
+            return job_id   # another replica queued it first
+        job_id = job.id
+    _dispatch(job_id)
+    return job_id
+
+
+def get_job(job_id: int) -> Optional[Dict]:
+    with db.SessionLocal() as s:
+        j = s.get(db.Job, job_id)
+        return _job_dict(j) if j else None
+
+
+def latest_jobs(project_id: int, limit: int = 5) -> List[Dict]:
+    with db.SessionLocal() as s:
+        rows = (
+            s.query(db.Job)
+            .filter(db.Job.project_id == project_id)
+            .order_by(db.Job.id.desc())
+            .limit(limit)
+            .all()
+        )
+        return [_job_dict(j) for j in rows]
+
+
+def resume_pending() -> int:
+    """
+    Dispatch queued jobs, including those a previous or crashed process left behind, after
+    re-queueing running jobs whose heartbeat went stale. Safe on every replica at once:
+    a job only runs in the worker that claims it.
+    """
+    cutoff = datetime.utcnow() - STALE_AFTER
+    with db.SessionLocal() as s:
+        s.query(db.Job).filter(
+            db.Job.status == "running",
+            or_(db.Job.heartbeat_at < cutoff, and_(db.Job.heartbeat_at.is_(None), db.Job.created_at < cutoff)),
+        ).update({"status": "queued", "claimed_by": None, "progress": 0.0, "message": "Re-queued after restart"},
+                 synchronize_session=False)
+        s.commit()
+        ids = [j for (j,) in s.query(db.Job.id).filter(db.Job.status == "queued").order_by(db.Job.id)]
+    for job_id in ids:
+        _dispatch(job_id)
+    return len(ids)
+
+
+# ---- worker side ----
+def _update(job_id: int, **fields) -> None:
+    with db.SessionLocal() as s:
+        s.query(db.Job).filter(db.Job.id == job_id).update(fields, synchronize_session=False)
+        s.commit()
+
+
+def _claim(job_id: int) -> bool:
+    """Take a queued job for this worker; False if another worker (on any replica) has it."""
+    with db.SessionLocal() as s:
+        taken = s.query(db.Job).filter(db.Job.id == job_id, db.Job.status == "queued").update(
+            {"status": "running", "claimed_by": f"{socket.gethostname()}:{os.getpid()}",
+             "heartbeat_at": datetime.utcnow(), "progress": 0.0, "message": "Starting"},
+            synchronize_session=False)
+        s.commit()
+        return taken == 1
+
+
+def _heartbeat(job_id: int, stop: threading.Event) -> None:
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            _update(job_id, heartbeat_at=datetime.utcnow())
+        except Exception:
+            log.warning("job %s heartbeat failed", job_id, exc_info=True)
+
+
+def _run(job_id: int) -> None:
+    """Entry point in the worker process."""
+    if not _claim(job_id):
+        return
+    job = get_job(job_id)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, stop), daemon=True).start()
+    last = [0.0]
+
+    def progress(fraction: float, message: str = "") -> None:
+        now = time.monotonic()
+        if now - last[0] >= 0.5 or fraction >= 1.0:   # throttle DB writes
+            last[0] = now
+            _update(job_id, progress=max(0.0, min(1.0, float(fraction))), message=message)
+
+    try:
+        path = _HANDLERS[job["kind"]](job, progress)
+        _update(job_id, status="done", progress=1.0, message="Finished",
+                artifact_path=str(path), finished_at=datetime.utcnow())
+    except Exception as e:
+        log.exception("job %s failed", job_id)
+        _update(job_id, status="failed", message=str(e)[:500], finished_at=datetime.utcnow())
+    finally:
+        stop.set()
+
+
+# ---- handlers ----
+def _project_snapshot(project_id: int):
+    p = db.get_project(project_id)
+    if p is None:
+        raise ValueError("Project not found")
+    tree = db.apply_changes(None, db.changes_since(project_id, 0))
+    project = {"name": p.name, "start_date": p.start_date, "end_date": p.end_date,
+               "description": p.description}
+    return project, list(tree["tasks"].values()), list(tree["subtasks"].values())
+
+
+@handler("report_pdf")
+def _report_pdf(job: Dict, progress) -> Path:
+    import reports
+
+    progress(0.05, "Loading project")
+    project, tasks, subtasks = _project_snapshot(job["project_id"])
+    pdf = reports.build_project_pdf(project, tasks, subtasks, progress)
+    path = artifact_path(job, f"project{job['project_id']}-report.pdf")
+    path.write_bytes(pdf)
+    return path
+
+
+@handler("export")
+def _export(job: Dict, progress) -> Path:
+    import export
+
+    fmt = job["params"].get("format", "csv")
+    path = artifact_path(job, f"project{job['project_id']}-tasks{export.FORMATS.get(fmt, '')}")
+    export.export_projects([job["project_id"]], fmt, path, progress=progress)
+    return path
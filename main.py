@@ -32,11 +32,23 @@ from dateutil import parser
 import plotly.express as px
 import plotly.graph_objects as go
 import base64
+import html
 from pathlib import Path
 from PIL import Image
+import threading
+import uuid
 import db
-import importlib
-importlib.reload(db)
+from critical_path import ScheduleGraph
+import capacity
+from project_model import ProjectFrame
+import recurrence
+import jobs
+import export
+import notify
+import auth
+import session_store
+import people
+import feeds
 
 def load_icon(name="logo_1.png"):
     p = Path(name)
@@ -98,8 +110,10 @@ STATUS_COLORS = {
 }
 
 def parse_date(x):
-    if not x:
+    if x is pd.NaT or not x:
         return None
+    if isinstance(x, pd.Timestamp):
+        return x.date()
     if isinstance(x, date):
         return x
     try:
@@ -118,31 +132,9 @@ def _norm_status(s: str) -> str:
     }
     return mapping.get(s, s.title())
 
-def _to_task_dict(t):
-    if isinstance(t, dict): return t
-    assignee_email = getattr(getattr(t, "assignee", None), "email", None)
-    return {
-        "id": getattr(t, "id", None),
-        "name": getattr(t, "name", None),
-        "status": getattr(t, "status", None),
-        "start_date": getattr(t, "start_date", None),
-        "end_date": getattr(t, "end_date", None),
-        "progress": float(getattr(t, "progress", 0) or 0),
-        "assignee_email": assignee_email,
-    }
-
-def _to_subtask_dict(s):
-    if isinstance(s, dict): return s
-    assignee_email = getattr(getattr(s, "assignee", None), "email", None)
-    return {
-        "id": getattr(s, "id", None),
-        "name": getattr(s, "name", None),
-        "status": getattr(s, "status", None),
-        "start_date": getattr(s, "start_date", None),
-        "end_date": getattr(s, "end_date", None),
-        "progress": float(getattr(s, "progress", 0) or 0),
-        "assignee_email": assignee_email,
-    }
+def _cell_text(v) -> str | None:
+    """Stripped text of a grid/CSV cell; None for empty cells (None, NaN, blank)."""
+    return (v.strip() or None) if isinstance(v, str) else None
 
 @st.cache_resource
 def _init_db_once():
@@ -151,6 +143,101 @@ def _init_db_once():
 
 _init_db_once()
 
+@st.cache_resource
+def _start_invalidation_listener():
+    """One listener per server process; evicts db.project_cache when any replica writes."""
+    return db.start_invalidation_listener()
+
+_start_invalidation_listener()
+
+@st.cache_resource
+def _resume_jobs_once():
+    """Pick up jobs a previous server process left queued or running."""
+    return jobs.resume_pending()
+
+_resume_jobs_once()
+
+@st.cache_resource
+def _start_notifier():
+    """One digest sender per server process (STRIVIO_NOTIFY_INTERVAL=0 leaves it to the CLI)."""
+    return notify.start_background_worker()
+
+_start_notifier()
+
+# ---- cached project reads (shared across sessions; treat results as read-only) ----
+@st.cache_resource
+def _project_trees() -> dict:
+    """Process-wide {pid: project tree}, patched with db.changes_since deltas."""
+    return {"lock": threading.Lock(), "trees": {}}
+
+def project_tree(pid: int) -> dict:
+    """
+    Task/subtask/member tree of a project. The revision check is itself cached (and
+    evicted on writes), so an unchanged project costs no query and a changed one
+    only fetches the rows that changed.
+    """
+    rev = db.project_cache.get_or_load(pid, "revision", lambda: db.get_project_revision(pid))
+    holder = _project_trees()
+    with holder["lock"]:
+        tree = holder["trees"].get(pid)
+        if tree is None or tree["revision"] != rev:
+            tree = db.apply_changes(tree, db.changes_since(pid, tree["revision"] if tree else 0))
+            tree["views"] = {}
+            holder["trees"][pid] = tree
+        return tree
+
+def project_frame(pid: int) -> ProjectFrame:
+    """Columnar model of the current revision, built once and shared read-only by every view."""
+    tree = project_tree(pid)
+    with _project_trees()["lock"]:
+        if "frame" not in tree["views"]:
+            tree["views"]["frame"] = ProjectFrame.build(tree["tasks"].values(), tree["subtasks"].values())
+        return tree["views"]["frame"]
+
+def project_members(pid: int) -> list[dict]:
+    """[{'email', 'role'}] by email, from the same revision-checked tree (no query of its own)."""
+    tree = project_tree(pid)
+    with _project_trees()["lock"]:
+        if "members" not in tree["views"]:
+            tree["views"]["members"] = sorted(({"email": m["email"], "role": m["role"]}
+                                               for m in tree["members"].values()), key=lambda m: m["email"])
+        return tree["views"]["members"]
+
+def assignee_options(pid: int, frame: ProjectFrame) -> list[str]:
+    """Members, plus anyone still assigned after leaving the project (kept valid on re-save)."""
+    emails = [m["email"] for m in project_members(pid)]
+    former = set(frame.tasks["assignee_email"].cat.categories) - set(emails)
+    return [""] + emails + sorted(former)
+
+def cached_dependencies(pid: int) -> list[dict]:
+    return db.project_cache.get_or_load(pid, "dependencies", lambda: db.get_dependencies_for_project(pid))
+
+def archive_rollup(pid: int) -> dict:
+    return db.project_cache.get_or_load(pid, "archive", lambda: db.get_archive_rollup(pid))
+
+def cached_daily_stats(pid: int) -> list[dict]:
+    return db.project_cache.get_or_load(pid, "daily_stats", lambda: db.get_daily_stats(pid))
+
+@st.cache_data(show_spinner=False)
+def _backfill_stats_once(pid: int, day: date) -> int:
+    """Fill snapshot gaps for a project at most once per day per server process."""
+    return db.backfill_daily_stats(pid, today=day)
+
+@st.cache_data(show_spinner=False)
+def _materialize_recurrences_once(pid: int, day: date) -> int:
+    """Roll recurring-task horizons forward at most once per day per project and process."""
+    return db.materialize_recurrences(pid, today=day)
+
+@st.cache_data(show_spinner=False)
+def _scan_due_once(day: date) -> bool:
+    """Refresh the due-date table at most once per day per process (writes keep it current)."""
+    return db.ensure_due_scan(day)
+
+def due_items(pid: int) -> dict:
+    today = date.today()
+    _scan_due_once(today)
+    return db.project_cache.get_or_load(pid, f"due:{today}", lambda: db.get_due_items(pid, today=today))
+
 def centered_logo(path: str = "logo_1.png", width: int = 160) -> None:
     p = Path(path)
     if not p.is_file():
@@ -162,20 +249,6 @@ def centered_logo(path: str = "logo_1.png", width: int = 160) -> None:
     except Exception:
         st.image(str(p), width=width)
 
-def fetch_project_members(pid: int) -> list[dict]:
-    """Return [{'email': ..., 'role': ...}, ...] for this project."""
-    import db as _db
-    with _db.SessionLocal() as s:
-        rows = (
-            s.query(_db.User.email, _db.ProjectMember.role)
-             .join(_db.ProjectMember, _db.ProjectMember.user_id == _db.User.id)
-             .filter(_db.ProjectMember.project_id == pid)
-             .order_by(_db.User.email)
-             .all()
-        )
-    return [{"email": e, "role": r} for (e, r) in rows]
-
-
 # ---------- Auth & project gate ----------
 def full_screen_login():
     st.markdown("""
@@ -196,6 +269,8 @@ def full_screen_login():
                 st.warning("Please enter your email.")
             else:
                 st.session_state["user"] = db.login(email, name)
+                st.session_state["auth_claims"] = auth.issue(st.session_state["user"])
+                st.session_state["auth_cookie"] = "set"
                 force_rerun()
 
 def full_screen_project_gate(user_email: str):
@@ -218,7 +293,12 @@ def full_screen_project_gate(user_email: str):
                 force_rerun()
 
         st.markdown("---")
+        templates = db.get_templates_for_user(user_email)
         with st.form("center_new_project", clear_on_submit=True):
+            tpl = (st.selectbox("Start from template", options=[None] + templates, key="center_template",
+                                format_func=lambda p: "Blank project" if p is None else p.name,
+                                help="Copies the template's tasks and subtasks; its dates move to your start date.")
+                   if templates else None)
             p_name = st.text_input("Project name", placeholder="Please enter a project name")
             c1, c2 = st.columns(2)
             with c1:
@@ -236,13 +316,17 @@ def full_screen_project_gate(user_email: str):
         if submit_new:
             if not p_name:
                 st.warning("Please enter a project name.")
-            elif p_end < p_start:
+            elif p_end < p_start and tpl is None:
                 st.warning("End date must be after start date.")
             elif not is_public and not pin_val:
                 st.warning("Private projects require a PIN.")
             else:
                 members = [m.strip() for m in members_csv.split(",") if m.strip()]
-                pid = db.create_project(user_email, p_name, p_start, p_end, members, is_public=is_public, pin=(pin_val or None))
+                if tpl is not None:
+                    pid = db.create_project_from_template(tpl.id, user_email, p_name, p_start, members,
+                                                          is_public=is_public, pin=(pin_val or None))
+                else:
+                    pid = db.create_project(user_email, p_name, p_start, p_end, members, is_public=is_public, pin=(pin_val or None))
                 st.session_state["selected_project_id"] = pid
                 st.success("Project created.")
                 force_rerun()
@@ -299,10 +383,41 @@ def render_contacts_sidebar():
 
 
 
+# Read routing: reads after this session's own saves stay on the primary until the replica catches up
+if "route_key" not in st.session_state:
+    st.session_state["route_key"] = uuid.uuid4().hex
+db.set_route_key(st.session_state["route_key"])
+
+# Per-task / per-project UI state lives in one bounded store instead of a session_state key per id
+scoped = session_store.ScopedState(
+    st.session_state, limits={"sub_rows": 8, "pin_ok": 32, "gantt_expanded": 16, "activity_pages": 16,
+                                      "archive_pages": 16, "feed_tokens": 8})
+
+# Session: signed claims (identity + per-project roles) checked in memory on every rerun;
+# with AUTH_ENABLED they also live in a cookie, so a new browser tab skips the login form.
+claims = st.session_state.get("auth_claims")
+if claims is not None and not auth.is_valid(claims):   # signed out elsewhere, or expired
+    for k in ("auth_claims", "user", "selected_project_id"):
+        st.session_state.pop(k, None)
+    scoped.clear()
+    claims = None
+if claims is None and auth.ENABLED and not st.session_state.get("user"):
+    cookie_claims = auth.decode(st.context.cookies.get(auth.COOKIE_NAME))
+    cookie_user = auth.user_of(cookie_claims) if auth.is_valid(cookie_claims) else None
+    if cookie_user is not None:
+        claims = st.session_state["auth_claims"] = cookie_claims
+        st.session_state["user"] = cookie_user
+
 user = st.session_state.get("user")
+if auth.ENABLED and st.session_state.get("auth_cookie"):
+    st.html(auth.cookie_script(auth.encode(claims) if user and claims else None), unsafe_allow_javascript=True)
+    st.session_state.pop("auth_cookie")
 if not user:
     full_screen_login()
     st.stop()
+if claims is None:
+    claims = st.session_state["auth_claims"] = auth.issue(user)
+db.set_actor(user["email"])   # attribute this rerun's writes in the activity log
 
 if not st.session_state.get("selected_project_id"):
     full_screen_project_gate(user["email"])
@@ -317,6 +432,13 @@ with st.sidebar:
     with c2:
         st.image(load_logo(), width='stretch')
     st.caption(f"Signed in as **{user['email']}**")
+    if st.button("Sign out", key="sign_out"):
+        auth.revoke(claims)
+        for k in ("auth_claims", "user", "selected_project_id"):
+            st.session_state.pop(k, None)
+        scoped.clear()   # PIN unlocks and editor maps don't outlive the sign-in
+        st.session_state["auth_cookie"] = "clear"
+        force_rerun()
     st.markdown("---")
     # Always-visible Contacts (pill buttons)
     
@@ -337,12 +459,17 @@ with st.sidebar:
         force_rerun()
 
     with st.expander("New project"):
+        sb_templates = db.get_templates_for_user(user["email"])
+        sb_tpl = (st.selectbox("Start from template", options=[None] + sb_templates, key="sb_template",
+                               format_func=lambda p: "Blank project" if p is None else p.name)
+                  if sb_templates else None)
         p_name = st.text_input("Project name", placeholder="Please enter a project name!", key="sb_p_name")
         col_p1, col_p2 = st.columns(2)
         with col_p1:
             p_start = st.date_input("Start", value=date.today(), key="sb_p_start")
         with col_p2:
-            p_end = st.date_input("End", value=date.today(), key="sb_p_end")
+            p_end = st.date_input("End", value=date.today(), key="sb_p_end", disabled=sb_tpl is not None,
+                                  help="Follows the template's length." if sb_tpl is not None else None)
         colx1, colx2 = st.columns(2)
         with colx1:
             is_public = st.checkbox("Public project (no PIN required)", value=False, key="sb_public")
@@ -353,13 +480,17 @@ with st.sidebar:
         if st.button("Create project", width='stretch', key="sb_create"):
             if not p_name:
                 st.warning("Please enter a project name!")
-            elif p_end < p_start:
+            elif p_end < p_start and sb_tpl is None:
                 st.warning("End date must be after start date.")
             elif not is_public and not pin_val:
                 st.warning("Private projects require a PIN.")
             else:
                 members = [m.strip() for m in members_csv.split(",") if m.strip()]
-                pid = db.create_project(user["email"], p_name, p_start, p_end, members, is_public=is_public, pin=(pin_val or None))
+                if sb_tpl is not None:
+                    pid = db.create_project_from_template(sb_tpl.id, user["email"], p_name, p_start, members,
+                                                          is_public=is_public, pin=(pin_val or None))
+                else:
+                    pid = db.create_project(user["email"], p_name, p_start, p_end, members, is_public=is_public, pin=(pin_val or None))
                 st.session_state["selected_project_id"] = pid
                 st.success("Project created.")
                 force_rerun()
@@ -367,21 +498,31 @@ with st.sidebar:
         
 
 # PIN gate
-pin_key = f"pin_ok_{current_project.id}"
-if not getattr(current_project, "is_public", True) and not st.session_state.get(pin_key):
+# a successful unlock is remembered per session for this PIN version; changing the PIN re-locks
+pin_version = int(getattr(current_project, "pin_version", 0) or 0)
+if not getattr(current_project, "is_public", True) and scoped.get("pin_ok", current_project.id) != ("v", pin_version):
     with st.sidebar.expander("🔒 Enter project PIN to view"):
         entered_pin = st.text_input("Project PIN", type="password", key=f"pin_in_{current_project.id}")
         if st.button("Unlock", key=f"unlock_{current_project.id}"):
-            if db.check_project_pin(current_project.id, entered_pin):
-                st.session_state[pin_key] = True
+            with st.spinner("Checking PIN..."):
+                try:
+                    pin_ok = db.check_project_pin(current_project.id, entered_pin)
+                except ValueError as e:   # KDF pool busy or too slow
+                    pin_ok = None
+                    st.error(str(e))
+            if pin_ok:
+                scoped.set("pin_ok", current_project.id, ("v", pin_version))
                 force_rerun()
-            else:
+            elif pin_ok is not None:
                 st.error("Incorrect PIN.")
     render_contacts_sidebar()
     st.stop()
 
 # Roles
-role = db.get_user_role(current_project.id, user["email"]) or "viewer"
+role, roles_refreshed = auth.project_role(claims, current_project.id)
+if roles_refreshed:
+    st.session_state["auth_cookie"] = "set"   # carry the resolved role into the cookie too
+role = role or "viewer"
 CAN_WRITE = role in ("owner", "editor")
 IS_OWNER  = role == "owner"
 
@@ -444,26 +585,49 @@ else:
 
 # === BEGIN: Collapsible Gantt helpers =========================================
 # ---- Gantt state helpers ---------------------------------
-def _expanded_key(pid: int) -> str:
-    return f"gantt_expanded_{pid}"
-
 def _init_expanded_set(pid: int):
     """
-    Make sure session_state has a set() of task_ids whose subtasks
+    Make sure the session has a set() of task_ids whose subtasks
     are currently expanded in the Gantt.
     """
-    if _expanded_key(pid) not in st.session_state:
-        st.session_state[_expanded_key(pid)] = set()
+    if scoped.get("gantt_expanded", pid) is None:
+        scoped.set("gantt_expanded", pid, set())
 
 def _set_all_expanded(pid: int, task_ids_with_children):
-    st.session_state[_expanded_key(pid)] = set(task_ids_with_children)
+    scoped.set("gantt_expanded", pid, set(task_ids_with_children))
 
 def _collapse_all(pid: int):
-    st.session_state[_expanded_key(pid)] = set()
+    scoped.set("gantt_expanded", pid, set())
 
 def _expanded(pid: int):
-    return st.session_state[_expanded_key(pid)]
+    return scoped.get("gantt_expanded", pid, set())
     
+# ---- critical path ----------------------------------------------------------
+@st.cache_resource
+def _schedule_graphs() -> dict:
+    """Process-wide {pid: ScheduleGraph}, patched in place between reruns."""
+    return {"lock": threading.Lock(), "graphs": {}}
+
+def project_schedule(pid: int, origin: date, tasks: list[dict]) -> dict:
+    """
+    Reuse the cached graph when only task dates moved (incremental recompute);
+    rebuild when tasks or dependencies were added/removed. Everything the chart reads
+    is copied out under the lock, since other sessions patch the same graph.
+    """
+    deps = cached_dependencies(pid)
+    edges = {(d["predecessor_id"], d["successor_id"], d["lag_days"]) for d in deps}
+    holder = _schedule_graphs()
+    with holder["lock"]:
+        g = holder["graphs"].get(pid)
+        if (g is None or g.origin != origin.toordinal()
+                or set(g.duration) != {t["id"] for t in tasks} or g.edges() != edges):
+            g = ScheduleGraph.build(origin, tasks, deps)
+            holder["graphs"][pid] = g
+        else:
+            g.sync_tasks(tasks)
+        return {"tasks": g.schedule(), "has_edges": bool(edges),
+                "critical_path": g.critical_path(), "projected_finish": g.projected_finish()}
+
 # ---- data builder ------------------------------------------------------------
 def render_collapsible_gantt(pid: int):
     """
@@ -475,81 +639,58 @@ def render_collapsible_gantt(pid: int):
     - Dynamic chart height so subtasks view isn't squished.
     """
 
-    raw_tasks = [_to_task_dict(t) for t in db.get_tasks_for_project(pid)]
-
-    def _sort_key(t):
-        return (t["start_date"] is None,
-                t["start_date"] or pd.Timestamp.max.date())
-    raw_tasks = sorted(raw_tasks, key=_sort_key)
-
-    subtasks_map = {}
-    for t in raw_tasks:
-        subs = [_to_subtask_dict(s) for s in db.get_subtasks_for_task(t["id"])]
-        subs = sorted(
-            subs,
-            key=lambda s: (
-                s["start_date"] is None,
-                s["start_date"] or pd.Timestamp.max.date()
-            )
+    frame = project_frame(pid)
+    plan = project_schedule(pid, current_project.start_date, list(project_tree(pid)["tasks"].values()))
+    schedule = plan["tasks"]
+
+    # checkboxes (default False / True)
+    c_sub, c_crit = st.columns(2)
+    with c_sub:
+        show_subtasks = st.checkbox(
+            "Show subtasks",
+            value=False,
+            key=f"show_subtasks_{pid}",
+            help="Turn on to include subtasks in the timeline."
+        )
+    with c_crit:
+        show_critical = st.checkbox(
+            "Highlight critical path",
+            value=True,
+            key=f"show_critical_{pid}",
+            help="Red underline marks zero-slack tasks; slack is shown on hover."
         )
-        subtasks_map[t["id"]] = subs
-
-    # checkbox (default False)
-    show_subtasks = st.checkbox(
-        "Show subtasks",
-        value=False,
-        key=f"show_subtasks_{pid}",
-        help="Turn on to include subtasks in the timeline."
-    )
 
-    def _safe_dates(start_d, end_d):
-        if not start_d or not end_d:
-            return None, None
-        s = pd.to_datetime(start_d)
-        e = pd.to_datetime(end_d)
-        if e <= s:
-            e = s + pd.Timedelta(days=1)
-        return s.date(), e.date()
-
-    rows = []
-    task_rows_for_vlines = []
-
-    for t in raw_tasks:
-        start_fixed, end_fixed = _safe_dates(t["start_date"], t["end_date"])
-        if start_fixed and end_fixed:
-            task_label = f"<b>{t['name']}</b>"
-            parent_row = {
-                "Label": task_label,
-                "Start": start_fixed,
-                "Finish": end_fixed,
-                "Status": _norm_status(t.get("status", "")),
-                "Assignee": t.get("assignee_email", None),
-                "Progress": round(float(t.get("progress", 0.0)), 1),
-                "Level": "task",
-            }
-            rows.append(parent_row)
-            task_rows_for_vlines.append(parent_row)
-
-        if show_subtasks:
-            for s in subtasks_map.get(t["id"], []):
-                st_fixed, en_fixed = _safe_dates(s["start_date"], s["end_date"])
-                if st_fixed and en_fixed:
-                    rows.append({
-                        "Label": f"↳ {s['name']}",
-                        "Start": st_fixed,
-                        "Finish": en_fixed,
-                        "Status": _norm_status(s.get("status", "")),
-                        "Assignee": s.get("assignee_email", None),
-                        "Progress": round(float(s.get("progress", 0.0)), 1),
-                        "Level": "subtask",
-                    })
-
-    if not rows:
+    def _bars(items: pd.DataFrame, level: str) -> pd.DataFrame:
+        """Dated items as timeline bars; an end on or before the start shows as one day."""
+        items = items[items["start_date"].notna() & items["end_date"].notna()]
+        start = items["start_date"]
+        finish = items["end_date"].where(items["end_date"] > start, start + pd.Timedelta(days=1))
+        names = items["name"].astype(str)
+        return pd.DataFrame({
+            "Label": "<b>" + names + "</b>" if level == "task" else "↳ " + names,
+            "Start": start,
+            "Finish": finish,
+            "Status": items["status"],
+            "Assignee": items["assignee_email"],
+            "Progress": items["progress"].round(1),
+            "Level": level,
+            "TaskId": items["id"] if level == "task" else items["task_id"],
+        })
+
+    task_bars = _bars(frame.tasks, "task")
+    task_bars["Slack (days)"] = task_bars["TaskId"].map(lambda i: schedule[i]["slack_days"])
+    task_bars["Critical"] = task_bars["TaskId"].map(lambda i: schedule[i]["critical"]).astype(bool)
+    df = task_bars
+    if show_subtasks:
+        sub_bars = _bars(frame.subtasks, "subtask")
+        sub_bars["Slack (days)"] = None
+        sub_bars["Critical"] = False
+        df = pd.concat([task_bars, sub_bars], ignore_index=True)
+
+    if df.empty:
         st.info("Add start/end dates to tasks to see them on the timeline.")
         return
 
-    df = pd.DataFrame(rows)
-
     # --- enforce y-order by date (oldest first), task before its subtasks ---
     df["LevelOrder"] = df["Level"].map({"task": 0, "subtask": 1})
     df_sorted_for_axis = (
@@ -570,7 +711,7 @@ def render_collapsible_gantt(pid: int):
         x_end="Finish",
         y="Label",
         color="Status",
-        hover_data=["Status", "Assignee", "Progress"],
+        hover_data=["Status", "Assignee", "Progress", "Slack (days)"],
         color_discrete_map=STATUS_COLORS,  # <--- enforce colors
     )
 
@@ -587,25 +728,38 @@ def render_collapsible_gantt(pid: int):
         height=chart_height,   
     )
 
-    # dotted vlines only for top-level tasks
-    vline_dates = set()
-    for tr in task_rows_for_vlines:
-        vline_dates.add(pd.to_datetime(tr["Start"]))
-        vline_dates.add(pd.to_datetime(tr["Finish"]))
-
-    for d in sorted(vline_dates):
-        fig.add_vline(
-            x=d,
-            line_dash="dot",
-            line_color="rgba(0,0,0,0.3)",
-            line_width=1,
-        )
+    # dotted vlines only for top-level tasks, added as one batch of layout shapes
+    vline_dates = pd.concat([task_bars["Start"], task_bars["Finish"]]).drop_duplicates().sort_values()
+    fig.update_layout(shapes=[
+        dict(type="line", xref="x", yref="paper", x0=d, x1=d, y0=0, y1=1,
+             line=dict(dash="dot", color="rgba(0,0,0,0.3)", width=1))
+        for d in vline_dates
+    ])
+
+    if show_critical:
+        crit = df[df["Critical"]]
+        xs, ys = [], []
+        for start, finish, label in zip(crit["Start"], crit["Finish"], crit["Label"]):
+            xs += [start, finish, None]
+            ys += [label, label, None]
+        if xs:
+            fig.add_trace(go.Scatter(
+                x=xs, y=ys, mode="lines", name="Critical path",
+                line=dict(color="#DC2626", width=3), hoverinfo="skip",
+            ))
 
     st.plotly_chart(
         fig,
         width='stretch',
         config={"displaylogo": False},
     )
+    if plan["has_edges"]:
+        names = frame.task_names()
+        crit_names = [names[n] for n in plan["critical_path"]]
+        st.caption(
+            f"Projected finish: **{plan['projected_finish']}** · "
+            f"Critical path: {' → '.join(crit_names) if crit_names else '—'}"
+        )
 
 
 # === END: Collapsible Gantt helpers =========================================
@@ -649,9 +803,58 @@ with st.sidebar.expander("Manage current project"):
                 st.session_state["selected_project_id"] = None
                 force_rerun()
 
+        new_pin = st.text_input("New project PIN", type="password", key=f"new_pin_{current_project.id}",
+                                help="Every other open session has to unlock the project again.")
+        if st.button("Change PIN", key=f"change_pin_{current_project.id}"):
+            if not new_pin:
+                st.warning("Please enter a PIN.")
+            else:
+                try:
+                    scoped.set("pin_ok", current_project.id, ("v", db.set_project_pin(current_project.id, new_pin)))
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success("PIN changed.")
+                    force_rerun()
+
+        is_tpl = st.checkbox("Use as template", value=bool(getattr(current_project, "is_template", False)),
+                             key=f"is_template_{current_project.id}",
+                             help="Templates can be picked when creating a new project.")
+        if is_tpl != bool(getattr(current_project, "is_template", False)):
+            db.set_project_template(current_project.id, is_tpl)
+            force_rerun()
+
+        if st.button("Archive finished work", key=f"archive_btn_{current_project.id}",
+                     help=f"Moves Done tasks out of the active list once the project has ended, or "
+                          f"{db.ARCHIVE_AFTER_DAYS} days after they finish. They stay in the totals "
+                          "and can be restored from the Tasks tab."):
+            moved = db.archive_items(current_project.id)
+            st.success(f"Archived {moved['task']} task(s) and {moved['subtask']} subtask(s).")
+            force_rerun()
+
     else:
         st.caption("Only the owner can manage this project.")
 
+    if CAN_WRITE:
+        st.markdown("---")
+        with st.expander("Clone project", expanded=False):
+            clone_name = st.text_input("Name of the copy", value=f"{current_project.name} (copy)",
+                                       key=f"clone_name_{current_project.id}")
+            clone_start = st.date_input("Copy starts on", value=current_project.start_date,
+                                        key=f"clone_start_{current_project.id}",
+                                        help="Every task and subtask date moves by the same amount.")
+            clone_members = st.checkbox("Copy members", value=True, key=f"clone_members_{current_project.id}")
+            if st.button("Clone project", key=f"clone_btn_{current_project.id}"):
+                if not clone_name.strip():
+                    st.warning("Please enter a project name.")
+                else:
+                    st.session_state["selected_project_id"] = db.clone_project(
+                        current_project.id, clone_name, owner_email=user["email"],
+                        shift_days=(clone_start - current_project.start_date).days,
+                        include_members=clone_members)
+                    st.success("Project cloned.")
+                    force_rerun()
+
     # description editor in the sidebar for owner/editor
     if CAN_WRITE:
         st.markdown("---")
@@ -687,8 +890,26 @@ with st.sidebar.expander("Manage current project"):
 
     render_contacts_sidebar()
 
+# calendar links, issued once per session (0 = the user's own feed) so they stay stable across reruns
+if feeds.BASE_URL:
+    with st.sidebar.expander("📅 Calendar feeds"):
+        try:
+            for feed_pid, label in ((0, "My tasks, all projects"), (current_project.id, f"All of {current_project.name}")):
+                key = (feed_pid, pin_version if feed_pid else 0)
+                token = scoped.get("feed_tokens", key)
+                if token is None:
+                    token = feeds.issue_token(user, project_id=feed_pid or None, pin_version=key[1])
+                    scoped.set("feed_tokens", key, token)
+                st.caption(label)
+                st.code(feeds.feed_url(token, project_id=feed_pid or None), language=None)
+            st.caption("Subscribe from any calendar app; add `&open=1` to hide finished items. "
+                       "Anyone with a link can read that feed, and changing a project PIN voids its links.")
+        except ValueError as e:
+            st.warning(str(e))
+
 # ---------- Tabs ----------
-tab1, tab2, tab3 = st.tabs(["Tasks", "Project Analytics", "Members"])
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+    ["Tasks", "Project Analytics", "Members", "Portfolio", "Search", "Activity"])
 
 # ---------- row-id mapping helpers (no index-based IDs) ----------
 def _build_row_id_map(df_sorted: pd.DataFrame, ids_sorted: list[int]) -> dict[int, int]:
@@ -705,27 +926,21 @@ with tab1:
     if not CAN_WRITE:
         st.info("You have read-only access to this project.")
 
-    raw_tasks = [_to_task_dict(t) for t in db.get_tasks_for_project(current_project.id)]
+    _materialize_recurrences_once(current_project.id, date.today())
+    frame = project_frame(current_project.id)
+    assignees = assignee_options(current_project.id, frame)
 
     task_cols = ["Task", "Status", "Start", "End", "Assignee", "Progress%", "Description"]
-    rows, ids_for_rows = [], []
-    for t in raw_tasks:
-        pct = float(round(t["progress"] or 0, 1))
-        rows.append({
-            "Task": t["name"] or "",
-            "Status": _norm_status(t["status"]) if t["status"] else "To-Do",
-            "Start": t["start_date"],
-            "End": t["end_date"],
-            "Assignee": t["assignee_email"] or "",
-            "Progress%": pct,        
-            "Description": "",
-        })
-        ids_for_rows.append(t["id"])
-
-    df_tasks = pd.DataFrame(rows, columns=task_cols)
-    order = df_tasks.sort_values(by="Start", ascending=True, na_position="last").index.tolist()
-    df_tasks_sorted = df_tasks.iloc[order].reset_index(drop=True)
-    ids_sorted = [ids_for_rows[i] for i in order]
+    df_tasks_sorted = pd.DataFrame({
+        "Task": frame.tasks["name"].fillna(""),
+        "Status": frame.tasks["status"],
+        "Start": frame.tasks["start_date"],
+        "End": frame.tasks["end_date"],
+        "Assignee": frame.tasks["assignee_email"].astype(object).fillna(""),
+        "Progress%": frame.tasks["progress"].round(1),
+        "Description": frame.tasks["description"].fillna(""),
+    }, columns=task_cols)
+    ids_sorted = frame.tasks["id"].tolist()
     task_row_id_map = _build_row_id_map(df_tasks_sorted, ids_sorted)
     st.session_state["task_row_id_map"] = task_row_id_map
     st.session_state["task_orig_ids"] = set([i for i in ids_sorted if i is not None])
@@ -742,7 +957,8 @@ with tab1:
             "Status": st.column_config.SelectboxColumn("Status", options=STATUS_OPTIONS),
             "Start": st.column_config.DateColumn("Start"),
             "End": st.column_config.DateColumn("End"),
-            "Assignee": st.column_config.TextColumn("Assignee"),
+            "Assignee": st.column_config.SelectboxColumn("Assignee", options=assignees,
+                                                         help="Project members; type to filter"),
             "Progress%": st.column_config.NumberColumn("Progress %", min_value=0, max_value=100, step=1, format="%d%%"),
             "Description": st.column_config.TextColumn("Description", help="Optional notes"),
         },
@@ -758,84 +974,183 @@ with tab1:
             edited_row_indices = set(int(i) for i in edited_df.index)
             all_row_indices = set(row_map.keys())
             removed_rows = all_row_indices - edited_row_indices
-            for r in removed_rows:
-                del_id = row_map.get(r)
-                if del_id in orig_ids:
-                    db.delete_task(int(del_id))
+            deleted = [row_map[r] for r in removed_rows if row_map.get(r) in orig_ids]
 
-            # Upserts
+            # Upserts: collected first, then saved with the deletions in one transaction
+            rows = []
             for row_idx, row in edited_df.iterrows():
-                name = str(row.get("Task", "")).strip()
+                name = _cell_text(row.get("Task"))
                 if not name:
                     continue
                 status = _norm_status(row.get("Status", "To-Do"))
-                start = parse_date(row.get("Start"))
-                end   = parse_date(row.get("End"))
-                assg  = (str(row.get("Assignee", "")).strip() or None)
                 try:
                     prog = float(row.get("Progress%", 0) or 0)
                 except Exception:
                     prog = 0.0
-                prog = float(max(0, min(100, prog)))
-                desc  = str(row.get("Description", "")).strip() or None
-
                 maybe_id = _resolve_row_to_id(row_idx, row_map)
-                db.add_or_update_task(
-                    project_id=current_project.id,
+                rows.append(dict(
                     name=name,
                     status=status if status in STATUS_OPTIONS else "To-Do",
-                    start=start,
-                    end=end,
-                    assignee_email=assg,
-                    description=desc,
+                    start=parse_date(row.get("Start")),
+                    end=parse_date(row.get("End")),
+                    assignee_email=_cell_text(row.get("Assignee")),
+                    description=_cell_text(row.get("Description")),
                     task_id=int(maybe_id) if (maybe_id in orig_ids) else None,
-                    progress=prog,
-                )
+                    progress=float(max(0, min(100, prog))),
+                ))
+            db.save_task_edits(current_project.id, rows, deleted)
 
             st.success("Tasks saved.")
             force_rerun()
         except Exception as e:
             st.error(f"Save failed: {e}")
 
+    # -------- Recurring tasks --------
+    st.markdown("---")
+    st.subheader("Recurring tasks")
+    st.caption(f"Occurrences are created as normal tasks {db.RECURRENCE_HORIZON_DAYS} days ahead.")
+    series = db.project_cache.get_or_load(current_project.id, "recurrences",
+                                          lambda: db.get_recurrences_for_project(current_project.id))
+    if series:
+        today_ = date.today()
+        st.data_editor(
+            pd.DataFrame([{
+                "Task": r["name"],
+                "Repeats": r["summary"],
+                "Assignee": r["assignee_email"] or "",
+                "Next": ", ".join(d.strftime("%b %d") for d in
+                                  recurrence.next_occurrences(r["rule"], r["dtstart"], max(today_, r["dtstart"])))
+                        if r["active"] else "",
+                "Active": r["active"],
+            } for r in series]),
+            width="stretch", hide_index=True, disabled=True,
+        )
+    else:
+        st.info("No recurring tasks yet.")
+
+    if CAN_WRITE:
+        with st.expander("Add a recurring task"):
+            with st.form(f"recurring_form_{current_project.id}", clear_on_submit=True):
+                r_name = st.text_input("Task name", placeholder="e.g. Weekly status report")
+                rc1, rc2, rc3 = st.columns(3)
+                with rc1:
+                    r_freq = st.selectbox("Repeats", ["WEEKLY", "DAILY", "MONTHLY", "YEARLY"],
+                                          format_func=lambda f: f.title())
+                with rc2:
+                    r_interval = st.number_input("Every", min_value=1, max_value=52, value=1, step=1)
+                with rc3:
+                    r_duration = st.number_input("Duration (days)", min_value=0, max_value=60, value=0, step=1)
+                r_days = st.multiselect("On (weekly)", list(recurrence.WEEKDAYS),
+                                        format_func=lambda d: {"MO": "Mon", "TU": "Tue", "WE": "Wed", "TH": "Thu",
+                                                               "FR": "Fri", "SA": "Sat", "SU": "Sun"}[d])
+                rd1, rd2 = st.columns(2)
+                with rd1:
+                    r_start = st.date_input("Starts", value=date.today())
+                with rd2:
+                    r_until = st.date_input("Ends (optional)", value=None)
+                r_assignee = st.selectbox("Assignee (optional)", assignees)
+                r_desc = st.text_area("Description (optional)", height=68)
+                if st.form_submit_button("Add recurring task"):
+                    try:
+                        rule = recurrence.build_rule(r_freq, int(r_interval),
+                                                     r_days if r_freq == "WEEKLY" else None, until=r_until)
+                        db.add_recurring_task(current_project.id, r_name, rule, r_start,
+                                              duration_days=int(r_duration),
+                                              assignee_email=r_assignee or None, description=r_desc)
+                        st.success("Recurring task added.")
+                        force_rerun()
+                    except ValueError as e:
+                        st.error(str(e))
+
+        active_series = [r for r in series if r["active"]]
+        if active_series:
+            rs1, rs2 = st.columns([3, 1])
+            with rs1:
+                stop_pick = st.selectbox("Stop a series", active_series, key=f"stop_series_{current_project.id}",
+                                         format_func=lambda r: f"{r['name']} ({r['summary']})")
+            with rs2:
+                st.write("")
+                if st.button("Stop series", key=f"stop_series_btn_{current_project.id}",
+                             help="Future occurrences that are still To-Do are removed."):
+                    db.stop_recurrence(stop_pick["id"])
+                    force_rerun()
+
+    # -------- Dependencies --------
+    st.markdown("---")
+    st.subheader("Dependencies")
+    task_names = frame.task_names()
+    deps = cached_dependencies(current_project.id)
+    if deps:
+        st.data_editor(
+            pd.DataFrame([{
+                "Predecessor": task_names.get(d["predecessor_id"], d["predecessor_id"]),
+                "Successor": task_names.get(d["successor_id"], d["successor_id"]),
+                "Lag (days)": d["lag_days"],
+            } for d in deps]),
+            width="stretch", hide_index=True, disabled=True,
+        )
+    else:
+        st.caption("No dependencies yet. A successor starts after its predecessor finishes (plus lag).")
+
+    if CAN_WRITE and len(task_names) >= 2:
+        with st.form(f"dep_form_{current_project.id}", clear_on_submit=True):
+            cd1, cd2, cd3 = st.columns([3, 3, 1])
+            with cd1:
+                dep_pred = st.selectbox("Predecessor", options=list(task_names), format_func=task_names.get)
+            with cd2:
+                dep_succ = st.selectbox("Successor", options=list(task_names), format_func=task_names.get)
+            with cd3:
+                dep_lag = st.number_input("Lag (days)", min_value=0, value=0, step=1)
+            ca, cb = st.columns(2)
+            add_dep = ca.form_submit_button("➕ Add dependency")
+            del_dep = cb.form_submit_button("🗑 Remove dependency")
+        if add_dep:
+            try:
+                db.add_task_dependency(int(dep_pred), int(dep_succ), int(dep_lag))
+                st.success("Dependency saved.")
+                force_rerun()
+            except ValueError as e:
+                st.error(f"Could not add dependency: {e}")
+        if del_dep:
+            match = next((d for d in deps if d["predecessor_id"] == dep_pred and d["successor_id"] == dep_succ), None)
+            if match:
+                db.delete_task_dependency(match["id"])
+                st.success("Dependency removed.")
+                force_rerun()
+            else:
+                st.warning("No such dependency.")
+
     # -------- Subtasks --------
     st.markdown("---")
     st.subheader("Subtasks")
-    all_tasks_for_picker = [_to_task_dict(t) for t in db.get_tasks_for_project(current_project.id)]
-    if not all_tasks_for_picker:
+    if not task_names:
         st.caption("Create a task first to add subtasks.")
     else:
-        task_for_sub = st.selectbox(
+        picked_task_id = st.selectbox(
             "Task",
-            options=all_tasks_for_picker,
-            format_func=lambda t: (t["name"] or "Untitled Task"),
+            options=list(task_names),
+            format_func=task_names.get,
             key="task_picker_for_subtasks",
         )
-        picked_task_id = task_for_sub["id"] if task_for_sub else None
 
         if picked_task_id:
-            raw_subs = [_to_subtask_dict(s) for s in db.get_subtasks_for_task(picked_task_id)]
+            subs_view = frame.subtasks_of(picked_task_id)
 
             sub_cols = ["Subtask","Status","Start","End","Assignee","Progress%"]
-            rows_s, ids_for_rows_s = [], []
-            for s_ in raw_subs:
-                pct = float(round(s_["progress"] or 0, 1))
-                rows_s.append({
-                    "Subtask": s_["name"] or "",
-                    "Status": _norm_status(s_["status"]) if s_["status"] else "To-Do",
-                    "Start": s_["start_date"],
-                    "End": s_["end_date"],
-                    "Assignee": s_["assignee_email"] or "",
-                    "Progress%": pct,
-                })
-                ids_for_rows_s.append(s_["id"])
-
-            df_subs = pd.DataFrame(rows_s, columns=sub_cols)
-            order_s = df_subs.sort_values(by="Start", ascending=True, na_position="last").index.tolist()
-            df_subs_sorted = df_subs.iloc[order_s].reset_index(drop=True)
-            ids_sorted_s = [ids_for_rows_s[i] for i in order_s]
+            df_subs_sorted = pd.DataFrame({
+                "Subtask": subs_view["name"].fillna(""),
+                "Status": subs_view["status"],
+                "Start": subs_view["start_date"],
+                "End": subs_view["end_date"],
+                "Assignee": subs_view["assignee_email"].astype(object).fillna(""),
+                "Progress%": subs_view["progress"].round(1),
+            }, columns=sub_cols).reset_index(drop=True)
+            ids_sorted_s = subs_view["id"].tolist()
             sub_row_id_map = _build_row_id_map(df_subs_sorted, ids_sorted_s)
-            st.session_state[f"sub_row_id_map_{picked_task_id}"] = sub_row_id_map
-            st.session_state[f"sub_orig_ids_{picked_task_id}"] = set([i for i in ids_sorted_s if i is not None])
+            scoped.set("sub_rows", picked_task_id, {
+                "row_map": sub_row_id_map,
+                "orig_ids": set([i for i in ids_sorted_s if i is not None]),
+            })
 
             edited_subs = st.data_editor(
                 df_subs_sorted,
@@ -849,7 +1164,8 @@ with tab1:
                     "Status": st.column_config.SelectboxColumn("Status", options=STATUS_OPTIONS),
                     "Start": st.column_config.DateColumn("Start"),
                     "End": st.column_config.DateColumn("End"),
-                    "Assignee": st.column_config.TextColumn("Assignee"),
+                    "Assignee": st.column_config.SelectboxColumn("Assignee", options=assignees,
+                                                                 help="Project members; type to filter"),
                     "Progress%": st.column_config.NumberColumn("Progress %", min_value=0, max_value=100, step=1, format="%d%%"),
                 },
             )
@@ -857,42 +1173,36 @@ with tab1:
             if CAN_WRITE and st.button("💾 Save subtask changes"):
                 try:
                     edited_df = edited_subs.copy()
-                    row_map = st.session_state.get(f"sub_row_id_map_{picked_task_id}", {})
-                    orig_ids = st.session_state.get(f"sub_orig_ids_{picked_task_id}", set())
+                    sub_rows = scoped.get("sub_rows", picked_task_id, {})
+                    row_map = sub_rows.get("row_map", {})
+                    orig_ids = sub_rows.get("orig_ids", set())
 
                     edited_row_indices = set(int(i) for i in edited_df.index)
                     all_row_indices = set(row_map.keys())
                     removed_rows = all_row_indices - edited_row_indices
-                    for r in removed_rows:
-                        del_id = row_map.get(r)
-                        if del_id in orig_ids:
-                            db.delete_subtask(int(del_id))
+                    deleted = [row_map[r] for r in removed_rows if row_map.get(r) in orig_ids]
 
+                    rows = []
                     for row_idx, row in edited_df.iterrows():
-                        name = str(row.get("Subtask", "")).strip()
+                        name = _cell_text(row.get("Subtask"))
                         if not name:
                             continue
                         status = _norm_status(row.get("Status", "To-Do"))
-                        start = parse_date(row.get("Start"))
-                        end   = parse_date(row.get("End"))
-                        assg  = (str(row.get("Assignee", "")).strip() or None)
                         try:
                             prog = float(row.get("Progress%", 0) or 0)
                         except Exception:
                             prog = 0.0
-                        prog = float(max(0, min(100, prog)))
-
                         maybe_id = _resolve_row_to_id(row_idx, row_map)
-                        db.add_or_update_subtask(
-                            task_id=picked_task_id,
+                        rows.append(dict(
                             name=name,
                             status=status if status in STATUS_OPTIONS else "To-Do",
-                            start=start,
-                            end=end,
-                            assignee_email=assg,
+                            start=parse_date(row.get("Start")),
+                            end=parse_date(row.get("End")),
+                            assignee_email=_cell_text(row.get("Assignee")),
                             subtask_id=int(maybe_id) if (maybe_id in orig_ids) else None,
-                            progress=prog,
-                        )
+                            progress=float(max(0, min(100, prog))),
+                        ))
+                    db.save_subtask_edits(picked_task_id, rows, deleted)
 
                     st.success("Subtasks saved.")
                     force_rerun()
@@ -905,94 +1215,82 @@ with tab1:
             if up_sub is not None and CAN_WRITE:
                 try:
                     imp = pd.read_csv(up_sub)
-                    created = 0
+                    rows = []
                     for _, r in imp.iterrows():
-                        name = str(r.get("Subtask", "")).strip()
+                        name = _cell_text(r.get("Subtask"))
                         if not name:
                             continue
                         status = _norm_status(r.get("Status", "To-Do"))
-                        start = parse_date(r.get("Start"))
-                        end   = parse_date(r.get("End"))
-                        assg  = str(r.get("Assignee", "")).strip() or None
                         try:
                             prog = float(r.get("Progress%", 0) or 0)
                         except Exception:
                             prog = 0.0
-                        prog = float(max(0, min(100, prog)))
-                        db.add_or_update_subtask(
-                            task_id=picked_task_id,
+                        rows.append(dict(
                             name=name,
                             status=status if status in STATUS_OPTIONS else "To-Do",
-                            start=start,
-                            end=end,
-                            assignee_email=assg,
-                            subtask_id=None,
-                            progress=prog,
-                        )
-                        created += 1
+                            start=parse_date(r.get("Start")),
+                            end=parse_date(r.get("End")),
+                            assignee_email=_cell_text(r.get("Assignee")),
+                            progress=float(max(0, min(100, prog))),
+                        ))
+                    created = db.save_subtask_edits(picked_task_id, rows)
                     st.success(f"Imported {created} subtask(s).")
                     force_rerun()
                 except Exception as e:
                     st.error(f"Import failed: {e}")
 
+    # -------- Archived tasks (loaded only when shown) --------
+    st.markdown("---")
+    st.subheader("Archived tasks")
+    arch = archive_rollup(current_project.id)
+    if not arch["tasks"]:
+        st.caption(f"Nothing archived yet. Finished tasks move here once the project has ended, "
+                   f"or {db.ARCHIVE_AFTER_DAYS} days after they finish.")
+    elif st.toggle(f"Show {arch['tasks']:,} archived task(s)", key=f"show_archive_{current_project.id}"):
+        n_pages = scoped.get("archive_pages", current_project.id, 1)
+        archived, before, more = [], None, True
+        for _ in range(n_pages):   # keyset pages, newest archived first
+            page = db.get_archived_tasks(current_project.id, limit=50, before_id=before)
+            archived.extend(page)
+            more = len(page) == 50
+            if not more:
+                break
+            before = page[-1]["id"]
+        st.dataframe(
+            pd.DataFrame([{
+                "Task": a["name"], "Start": a["start_date"], "End": a["end_date"],
+                "Assignee": a["assignee_email"] or "", "Subtasks": a["subtasks"],
+                "Archived (UTC)": a["archived_at"].strftime("%Y-%m-%d"),
+            } for a in archived]),
+            hide_index=True, width="stretch",
+        )
+        ca1, ca2 = st.columns([3, 1])
+        with ca2:
+            if more and st.button("Load older", key=f"archive_older_{current_project.id}"):
+                scoped.set("archive_pages", current_project.id, n_pages + 1)
+                force_rerun()
+        if CAN_WRITE:
+            with ca1:
+                names = {a["id"]: a["name"] for a in archived}
+                to_restore = st.selectbox("Restore a task", list(names), format_func=names.get,
+                                          key=f"restore_pick_{current_project.id}")
+                if st.button("Restore", key=f"restore_btn_{current_project.id}"):
+                    db.restore_archived_task(to_restore)
+                    st.success("Task restored.")
+                    force_rerun()
+
 # =======================
 # Project Analytics Tab
 # =======================
 with tab2:
     st.subheader("Project Analytics")
 
-    # Load tasks
-    tasks_raw = [_to_task_dict(t) for t in db.get_tasks_for_project(current_project.id)]
-
-    # Include subtasks in rollups (toggle)
+    # Include subtasks in rollups (toggle); the shared table is read-only, derive, don't assign
     include_subtasks = st.checkbox("Include subtasks in analytics", value=True)
-    if include_subtasks:
-        subs_all = []
-        for t in tasks_raw:
-            subs = [_to_subtask_dict(s) for s in db.get_subtasks_for_task(t["id"])]
-            for s in subs:
-                subs_all.append({
-                    "id": s["id"], "name": s["name"],
-                    "status": _norm_status(s["status"]),
-                    "start_date": s["start_date"], "end_date": s["end_date"],
-                    "assignee_email": s["assignee_email"],
-                    "progress": float(s["progress"] or 0),
-                    "_type": "Subtask"
-                })
-        tasks_table = [
-            {
-                "id": t["id"], "name": t["name"],
-                "status": _norm_status(t["status"]),
-                "start_date": t["start_date"], "end_date": t["end_date"],
-                "assignee_email": t["assignee_email"],
-                "progress": float(t["progress"] or 0),
-                "_type": "Task"
-            } for t in tasks_raw
-        ] + subs_all
-    else:
-        tasks_table = [
-            {
-                "id": t["id"], "name": t["name"],
-                "status": _norm_status(t["status"]),
-                "start_date": t["start_date"], "end_date": t["end_date"],
-                "assignee_email": t["assignee_email"],
-                "progress": float(t["progress"] or 0),
-                "_type": "Task"
-            } for t in tasks_raw
-        ]
-
     today = date.today()
-    dfA = pd.DataFrame(tasks_table)
-
-    # Derived fields
-    if not dfA.empty:
-        dfA["is_done"] = dfA["status"].fillna("").eq("Done")
-        dfA["has_dates"] = dfA["start_date"].notna() & dfA["end_date"].notna()
-        dfA["is_overdue"] = dfA["end_date"].notna() & (dfA["end_date"] < today) & (~dfA["is_done"])
-    else:
-        dfA["is_done"] = []
-        dfA["has_dates"] = []
-        dfA["is_overdue"] = []
+    dfA = project_frame(current_project.id).items(include_subtasks)
+    is_done = dfA["status"].eq("Done")
+    has_dates = dfA["start_date"].notna() & dfA["end_date"].notna()
 
     # Project timeframe KPIs
     p_start = current_project.start_date
@@ -1004,12 +1302,18 @@ with tab2:
         elapsed_days = max(0, min(elapsed_days, total_days))
     remaining_days = max(0, total_days - elapsed_days)
 
-    # Work KPIs
-    total_items = len(dfA)
-    done_items = int(dfA["is_done"].sum()) if total_items else 0
+    # Work KPIs (archived items are all Done and come from the rollup, not the archive tables)
+    arch = archive_rollup(current_project.id)
+    n_archived = arch["tasks"] + (arch["subtasks"] if include_subtasks else 0)
+    archived_progress = arch["task_progress"] + (arch["subtask_progress"] if include_subtasks else 0.0)
+    total_items = len(dfA) + n_archived
+    done_items = int(is_done.sum()) + n_archived
     open_items = total_items - done_items
-    overdue_items = int(dfA["is_overdue"].sum()) if total_items else 0
-    overall_progress = round(float(dfA["progress"].mean()) if total_items else 0.0, 1)
+    due = due_items(current_project.id)
+    if not include_subtasks:   # same scope as every other figure on this tab
+        due = {k: [r for r in rows if r["_type"] == "Task"] for k, rows in due.items()}
+    overdue_items = len(due["overdue"])
+    overall_progress = round((float(dfA["progress"].sum()) + archived_progress) / total_items, 1) if total_items else 0.0
 
     c1, c2, c3, c4, c5 = st.columns(5)
     with c1: st.metric("Days Total", total_days)
@@ -1017,6 +1321,8 @@ with tab2:
     with c3: st.metric("Items (Open/Total)", f"{open_items}/{total_items}")
     with c4: st.metric("Overdue", overdue_items)
     with c5: st.metric("Overall % Complete", f"{overall_progress}%")
+    if n_archived:
+        st.caption(f"Counts include {n_archived:,} archived item(s); the Gantt and workload show active items only.")
 
     st.markdown("---")
 
@@ -1024,6 +1330,38 @@ with tab2:
     st.markdown("### Timeline - Gantt Chart")
     render_collapsible_gantt(current_project.id)
     st.markdown("---")
+
+    # ---- Burndown & Burnup (reads project_daily_stats only) ----
+    st.markdown("### Burndown & Burnup")
+    _backfill_stats_once(current_project.id, today)
+    stats_df = pd.DataFrame(cached_daily_stats(current_project.id))
+    if stats_df.empty:
+        st.info("Trend charts appear once the project has daily snapshots.")
+    else:
+        stats_df["open"] = stats_df["todo"] + stats_df["in_progress"]
+        stats_df["scope"] = stats_df["open"] + stats_df["done"]
+        col_bd, col_bu = st.columns(2, gap="medium")
+        with col_bd:
+            st.markdown("**Burndown (open items)**")
+            fig_bd = go.Figure()
+            fig_bd.add_trace(go.Scatter(x=stats_df["day"], y=stats_df["open"], mode="lines+markers",
+                                        name="Open", line=dict(color=STATUS_COLORS["In Progress"])))
+            fig_bd.add_trace(go.Scatter(x=[p_start, p_end], y=[int(stats_df["scope"].iloc[0]), 0], mode="lines",
+                                        name="Ideal", line=dict(dash="dot", color="rgba(0,0,0,0.35)")))
+            fig_bd.add_trace(go.Scatter(x=stats_df["day"], y=stats_df["overdue"], mode="lines",
+                                        name="Overdue", line=dict(color="#DC2626")))
+            fig_bd.update_layout(margin=dict(l=10, r=10, t=10, b=10), yaxis_title="", xaxis_title="")
+            st.plotly_chart(fig_bd, width='stretch', config={"displaylogo": False, "responsive": True})
+        with col_bu:
+            st.markdown("**Burnup (done vs. scope)**")
+            fig_bu = go.Figure()
+            fig_bu.add_trace(go.Scatter(x=stats_df["day"], y=stats_df["scope"], mode="lines",
+                                        name="Scope", line=dict(color=STATUS_COLORS["To-Do"])))
+            fig_bu.add_trace(go.Scatter(x=stats_df["day"], y=stats_df["done"], mode="lines+markers",
+                                        name="Done", line=dict(color=STATUS_COLORS["Done"])))
+            fig_bu.update_layout(margin=dict(l=10, r=10, t=10, b=10), yaxis_title="", xaxis_title="")
+            st.plotly_chart(fig_bu, width='stretch', config={"displaylogo": False, "responsive": True})
+    st.markdown("---")
    # ---- Status & Assignee Breakdown (side-by-side, single titles) ----
     st.markdown("### Status & Assignee Breakdown")
     
@@ -1032,10 +1370,9 @@ with tab2:
     with col1:
         st.markdown("**Distribution by Status**")
         status_order = ["To-Do","In Progress","Done"]
-        status_counts = (
-            dfA.groupby("status").size().reindex(status_order).fillna(0).astype(int).reset_index(name="count")
-            if not dfA.empty else pd.DataFrame({"status": status_order, "count": [0,0,0]})
-        )
+        status_counts = dfA["status"].value_counts().reindex(status_order, fill_value=0)
+        status_counts["Done"] += n_archived
+        status_counts = status_counts.rename_axis("status").reset_index(name="count")
         fig_status = px.bar(
             status_counts, 
             y="status", 
@@ -1052,11 +1389,11 @@ with tab2:
     
     with col2:
         st.markdown("**Workload by Assignee**")
-        assignee_counts = (
-            dfA.assign(assignee=dfA["assignee_email"].fillna("Unassigned"))
-               .groupby("assignee").size().sort_values(ascending=True).reset_index(name="count")
-            if not dfA.empty else pd.DataFrame({"assignee": [], "count": []})
-        )
+        # counted on the category codes; unused categories (other view) drop out
+        assignee_counts = dfA["assignee_email"].value_counts(dropna=False)
+        assignee_counts = assignee_counts[assignee_counts > 0]
+        assignee_counts.index = assignee_counts.index.astype(object).fillna("Unassigned")
+        assignee_counts = assignee_counts.sort_values(ascending=True).rename_axis("assignee").reset_index(name="count")
         fig_assignee = px.bar(
             assignee_counts, y="assignee", x="count", text="count", orientation="h"
         )
@@ -1065,14 +1402,44 @@ with tab2:
         st.plotly_chart(fig_assignee, width='stretch', config={"displaylogo": False, "responsive": True})
 
     st.markdown("---")
-    # ---- Upcoming deadlines (next 14 days)
-    st.markdown("### Upcoming deadlines (next 14 days)")
-    #st.caption("Upcoming deadlines (next 14 days)")
-    if not dfA.empty:
-        soon_mask = dfA["end_date"].notna() & (~dfA["is_done"]) & (dfA["end_date"] >= today) & (dfA["end_date"] <= (today + pd.Timedelta(days=14)))
-        upcoming = dfA.loc[soon_mask, ["name","_type","assignee_email","status","end_date","progress"]].sort_values("end_date")
+    # ---- Capacity heatmap (per-day allocation, shown as weekly peak) ----
+    st.markdown("### Capacity by Assignee")
+    cap_limit = st.number_input(
+        "Max concurrent open items per person", min_value=1, value=2, step=1,
+        key=f"cap_limit_{current_project.id}",
+        help="Weeks where someone's busiest day exceeds this are flagged as over-allocated."
+    )
+    cap_labels, cap_days, cap_matrix = capacity.capacity_frame(dfA)
+    if cap_matrix.size == 0:
+        st.info("Assign people and dates to open items to see their load over time.")
     else:
-        upcoming = pd.DataFrame(columns=["name","_type","assignee_email","status","end_date","progress"])
+        week_starts, week_peak = capacity.weekly_peak(cap_days, cap_matrix)
+        fig_cap = px.imshow(
+            week_peak,
+            x=pd.to_datetime(week_starts),
+            y=list(cap_labels),
+            color_continuous_scale=[[0, "#F3F4F6"], [0.5, "#2563EB"], [1, "#DC2626"]],
+            zmin=0,
+            zmax=max(float(cap_limit) * 2, float(week_peak.max())),
+            aspect="auto",
+            labels=dict(x="Week of", y="", color="Peak load"),
+        )
+        fig_cap.update_layout(margin=dict(l=10, r=10, t=10, b=10),
+                              height=max(260, min(1200, 60 + 22 * len(cap_labels))))
+        st.plotly_chart(fig_cap, width='stretch', config={"displaylogo": False, "responsive": True})
+
+        overloaded = capacity.over_allocation(cap_labels, cap_days, cap_matrix, capacity=float(cap_limit))
+        if overloaded.empty:
+            st.success("Nobody is over-allocated.")
+        else:
+            st.warning(f"{len(overloaded)} assignee(s) over-allocated:")
+            st.data_editor(overloaded, width="stretch", hide_index=True, disabled=True)
+
+    st.markdown("---")
+    # ---- Upcoming deadlines (next 14 days)
+    st.markdown(f"### Upcoming deadlines (next {db.DUE_HORIZON_DAYS} days)")
+    due_cols = ["name","_type","assignee_email","status","end_date","progress"]
+    upcoming = pd.DataFrame(due["upcoming"], columns=due_cols)
     if not upcoming.empty:
         st.data_editor(
             upcoming.rename(columns={
@@ -1085,15 +1452,15 @@ with tab2:
             }
         )
     else:
-        st.info("No upcoming deadlines in the next 14 days.")
+        st.info(f"No upcoming deadlines in the next {db.DUE_HORIZON_DAYS} days.")
 
     st.markdown("---")
 
     # ---- At-Risk 
     st.markdown("### At-Risk Tasks")
     
-    missing_dates = dfA.loc[~dfA["has_dates"], ["name","_type","assignee_email","status","progress"]] if not dfA.empty else pd.DataFrame(columns=["name","_type","assignee_email","status","progress"])
-    overdue_df    = dfA.loc[dfA["is_overdue"], ["name","_type","assignee_email","status","end_date","progress"]].sort_values("end_date") if not dfA.empty else pd.DataFrame(columns=["name","_type","assignee_email","status","end_date","progress"])
+    missing_dates = dfA.loc[~has_dates, ["name","_type","assignee_email","status","progress"]]
+    overdue_df    = pd.DataFrame(due["overdue"], columns=due_cols)
     
     if missing_dates.empty and overdue_df.empty:
         st.success("Nothing is out of order right now.")
@@ -1119,15 +1486,60 @@ with tab2:
             )
 
 
+    st.markdown("---")
+    # ---- Reports & exports (built by background workers, see jobs.py)
+    st.markdown("### Reports & exports")
+    st.caption("Built in the background; identical requests for an unchanged project reuse the last file.")
+    rc1, rc2, rc3 = st.columns([1, 1, 1])
+    with rc1:
+        if st.button("Build PDF report", key=f"job_pdf_{current_project.id}"):
+            jobs.submit("report_pdf", current_project.id, requested_by=user["email"])
+    with rc2:
+        export_fmt = st.selectbox("Export format", export.available_formats(), key=f"export_fmt_{current_project.id}",
+                                  format_func=lambda f: {"csv": "CSV", "parquet": "Parquet", "ndjson": "NDJSON"}[f],
+                                  label_visibility="collapsed")
+    with rc3:
+        if st.button("Build export", key=f"job_export_{current_project.id}"):
+            jobs.submit("export", current_project.id, params={"format": export_fmt}, requested_by=user["email"])
+
+    _job_list = jobs.latest_jobs(current_project.id)
+    _jobs_active = any(j["status"] in ("queued", "running") for j in _job_list)
+
+    @st.fragment(run_every=2 if _jobs_active else None)
+    def _render_jobs(pid: int, was_active: bool):
+        """Poll job rows only while something is in flight."""
+        job_list = jobs.latest_jobs(pid)
+        active = any(j["status"] in ("queued", "running") for j in job_list)
+        if was_active and not active:
+            st.rerun()   # full rerun turns polling off
+        if not job_list:
+            st.info("No reports built yet.")
+        for j in job_list:
+            label = ("PDF report" if j["kind"] == "report_pdf"
+                     else f"{j['params'].get('format', 'csv').upper()} export" if j["kind"] == "export"
+                     else j["kind"])
+            when = j["created_at"].strftime("%Y-%m-%d %H:%M") if j["created_at"] else ""
+            if j["status"] in ("queued", "running"):
+                st.progress(j["progress"], text=f"{label} ({when}): {j['message'] or j['status']}")
+            elif j["status"] == "failed":
+                st.error(f"{label} ({when}) failed: {j['message']}")
+            else:
+                path = Path(j["artifact_path"] or "")
+                if path.is_file():
+                    # read on click, off the script thread; a rerun never loads the file
+                    st.download_button(f"Download {label} ({when})", data=path.read_bytes,
+                                       file_name=path.name.split("-", 1)[-1], key=f"job_dl_{j['id']}")
+                else:
+                    st.caption(f"{label} ({when}): file no longer available, build it again.")
+
+    _render_jobs(current_project.id, _jobs_active)
+
+
 # ---------- Members Tab ----------
 with tab3:
     st.subheader("Project Members")
     # --- NEW: Who has access table (email + role) ---
-    try:
-        _members = fetch_project_members(current_project.id)
-    except Exception as e:
-        _members = []
-        st.warning(f"Could not load members: {e}")
+    _members = project_members(current_project.id)
 
     if not _members:
         st.info("No members yet.")
@@ -1148,16 +1560,143 @@ with tab3:
     if not CAN_WRITE:
         st.info("Read-only members cannot manage users.")
     else:
-        members_line = st.text_area("Add members by email (comma-separated)")
+        people_q = st.text_input("Find people", placeholder="name or email", key=f"people_q_{current_project.id}")
+        found_people = people.directory.search(people_q, limit=20) if people_q.strip() else []
+        kept = st.session_state.get(f"people_pick_{current_project.id}", [])   # picks survive a new search
+        picked_people = st.multiselect(
+            "Existing users", kept + [p_["email"] for p_ in found_people if p_["email"] not in kept],
+            format_func=lambda e: next((f"{p_['name']} <{e}>" for p_ in found_people if p_["email"] == e and p_["name"]), e),
+            key=f"people_pick_{current_project.id}",
+        )
+        members_line = st.text_area("Or invite by email (comma-separated)")
         role_choice = st.selectbox("Role for new members", ["viewer", "editor"])
         if st.button("Add Members"):
-            emails = [e.strip() for e in members_line.split(",") if e.strip()]
+            emails = picked_people + [e.strip() for e in members_line.split(",") if e.strip()]
             if not emails:
                 st.warning("No valid emails.")
             else:
-                import db as _db
-                with _db.SessionLocal() as s:
-                    for e in emails:
-                        _db.set_member_role(current_project.id, e, role_choice)
-                st.success(f"Added/updated {len(emails)} member(s) as {role_choice}.")
+                n = db.bulk_set_member_roles(current_project.id, emails, role_choice)
+                st.success(f"Added/updated {n} member(s) as {role_choice}.")
                 force_rerun()
+
+# ---------- Portfolio Tab ----------
+with tab4:
+    st.subheader("Portfolio")
+    st.caption("Every project you are a member of, from one aggregated query.")
+    portfolio = db.get_portfolio_for_user(user["email"])
+    if not portfolio:
+        st.info("You are not a member of any project yet.")
+    else:
+        pf = pd.DataFrame(portfolio)
+        k1, k2, k3, k4 = st.columns(4)
+        with k1: st.metric("Projects", len(pf))
+        with k2: st.metric("Items (Open/Total)", f"{int(pf['items'].sum() - pf['done'].sum())}/{int(pf['items'].sum())}")
+        with k3: st.metric("Overdue", int(pf["overdue"].sum()))
+        with k4: st.metric("Projects with overdue items", int((pf["overdue"] > 0).sum()))
+        st.data_editor(
+            pf.rename(columns={
+                "name": "Project", "role": "Role", "items": "Items", "done": "Done",
+                "overdue": "Overdue", "progress": "Progress%", "start_date": "Start",
+                "end_date": "End", "first_start": "First task start", "last_end": "Last task end",
+            })[["Project", "Role", "Items", "Done", "Overdue", "Progress%",
+                "Start", "End", "First task start", "Last task end"]],
+            width="stretch", hide_index=True, disabled=True,
+            column_config={
+                "Progress%": st.column_config.ProgressColumn("% Complete", min_value=0, max_value=100, format="%.0f%%"),
+            },
+        )
+        open_pid = st.selectbox(
+            "Jump to project", options=[p["id"] for p in portfolio],
+            format_func=lambda i: next(p["name"] for p in portfolio if p["id"] == i),
+            index=next((i for i, p in enumerate(portfolio) if p["id"] == current_project.id), 0),
+            key="portfolio_jump",
+        )
+        if open_pid != current_project.id and st.button("Open project", key="portfolio_open"):
+            st.session_state["selected_project_id"] = open_pid
+            force_rerun()
+
+# ---------- Search Tab ----------
+with tab5:
+    st.subheader("Search")
+    cq1, cq2 = st.columns([3, 1])
+    with cq1:
+        search_q = st.text_input("Search tasks and subtasks", placeholder="e.g. quarterly report",
+                                 key="search_q")
+    with cq2:
+        search_scope = st.radio("Scope", ["This project", "All my projects"], key="search_scope",
+                                horizontal=True)
+    page_key = "search_page"
+    if st.session_state.get("search_last") != (search_q, search_scope):
+        st.session_state["search_last"] = (search_q, search_scope)
+        st.session_state[page_key] = 0
+    page = st.session_state.get(page_key, 0)
+
+    if search_q.strip():
+        all_scope = search_scope != "This project"
+        # PIN-protected projects only count once this session has unlocked their current PIN
+        unlocked = ([pid for pid, ver in db.get_member_pin_versions(user["email"]).items()
+                     if scoped.get("pin_ok", pid) == ("v", ver)] if all_scope else [])
+        found = db.search_items(
+            search_q,
+            user_email=user["email"],
+            project_id=None if all_scope else current_project.id,
+            page=page,
+            page_size=20,
+            unlocked_ids=unlocked,
+        )
+        if not found["results"]:
+            st.info("No matches.")
+        else:
+            for r in found["results"]:
+                # titles and project names are user input: escape them, this markdown allows HTML
+                where = f" · {html.escape(r['project_name'])}" if all_scope else ""
+                st.markdown(f"**{html.escape(r['title'])}**  \n"
+                            f"<span style='color:#6b7280;font-size:.8rem'>{r['kind'].title()}{where}</span>",
+                            unsafe_allow_html=True)
+                if r["snippet"]:
+                    st.caption(r["snippet"])
+            cp1, cp2, cp3 = st.columns([1, 1, 4])
+            with cp1:
+                if page > 0 and st.button("← Previous", key="search_prev"):
+                    st.session_state[page_key] = page - 1
+                    force_rerun()
+            with cp2:
+                if found["has_more"] and st.button("Next →", key="search_next"):
+                    st.session_state[page_key] = page + 1
+                    force_rerun()
+            with cp3:
+                st.caption(f"Page {page + 1}")
+
+# ---------- Activity Tab ----------
+with tab6:
+    st.subheader("Activity")
+    st.caption("Who changed what in this project, newest first. Entries can take a second to appear.")
+    n_pages = scoped.get("activity_pages", current_project.id, 1)
+    entries, before, more = [], None, True
+    for _ in range(n_pages):   # keyset pages: each one starts below the last id already shown
+        page = db.get_activity(current_project.id, limit=50, before_id=before)
+        entries.extend(page)
+        more = len(page) == 50
+        if not more:
+            break
+        before = page[-1]["id"]
+    if not entries:
+        st.info("No activity recorded yet.")
+    else:
+        adf = pd.DataFrame(entries)
+        adf["at"] = pd.to_datetime(adf["at"]).dt.strftime("%Y-%m-%d %H:%M")
+        adf["actor"] = adf["actor"].fillna("system")
+        st.dataframe(
+            adf[["at", "actor", "action", "summary"]].rename(
+                columns={"at": "When (UTC)", "actor": "Who", "action": "Action", "summary": "Details"}),
+            hide_index=True,
+            width="stretch",
+        )
+        if more and st.button("Load older", key="activity_older"):
+            scoped.set("activity_pages", current_project.id, n_pages + 1)
+            force_rerun()
+
+# ---------- Session footprint (measured after everything this rerun stored) ----------
+_session_bytes = session_store.record_session_size(st.session_state["route_key"], st.session_state)
+st.sidebar.caption(f"Session state: {_session_bytes / 1024:,.1f} KB "
+                   f"({len(scoped)} scoped entr{'y' if len(scoped) == 1 else 'ies'}, {scoped.evicted} evicted)")
@@ -0,0 +1,269 @@
+# notify.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Notification digests: queued rows in         #
+#               `notifications` are coalesced per recipient  #
+#               and mailed off the request path through a    #
+#               pluggable, rate-limited transport.           #
+#============================================================#
+
+
+from __future__ import annotations
+
+import logging
+import os
+import smtplib
+import ssl
+import threading
+import time
+from collections import Counter
+from datetime import date
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+import db
+
+log = logging.getLogger(__name__)
+
+MAIL_FROM = os.getenv("MAIL_FROM", "noreply@pm.local")
+APP_URL = os.getenv("STRIVIO_APP_URL", "")
+MAIL_RATE = float(os.getenv("STRIVIO_MAIL_RATE", "5"))              # messages per second
+DIGEST_DELAY_MINUTES = int(os.getenv("STRIVIO_DIGEST_DELAY_MINUTES", "10"))
+NOTIFY_INTERVAL = int(os.getenv("STRIVIO_NOTIFY_INTERVAL", "60"))  # seconds; 0 = no in-app worker
+
+_KIND_TITLES = {"overdue": "Overdue", "due_soon": "Due soon", "assigned": "Assigned to you"}
+
+
+# ---- transports ----
+class Transport:
+    """Sends EmailMessages; may hold a connection open between `send` calls until `close`."""
+
+    def send(self, msg: EmailMessage) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryTransport(Transport):
+    """Keeps messages in `sent` (tests, dry runs)."""
+
+    def __init__(self):
+        self.sent: List[EmailMessage] = []
+
+    def send(self, msg: EmailMessage) -> None:
+        self.sent.append(msg)
+
+
+class LogTransport(Transport):
+    """Development default when no mail server is configured: log instead of sending."""
+
+    def send(self, msg: EmailMessage) -> None:
+        log.info("mail to %s: %s\n%s", msg["To"], msg["Subject"], msg.get_content())
+
+
+class SMTPTransport(Transport):
+    """
+    One SMTP connection reused across messages; reconnects after `max_per_connection`
+    messages (many relays cap this) or when the server drops the connection.
+    """
+
+    def __init__(self, host: str, port: int = 25, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = False, use_ssl: bool = False,
+                 timeout: float = 30.0, max_per_connection: int = 100):
+        self.host, self.port = host, port
+        self.username, self.password = username, password
+        self.starttls, self.use_ssl = starttls, use_ssl
+        self.timeout = timeout
+        self.max_per_connection = max_per_connection
+        self._conn: Optional[smtplib.SMTP] = None
+        self._count = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                conn.starttls(context=ssl.create_default_context())
+        if self.username:
+            conn.login(self.username, self.password or "")
+        self._count = 0
+        return conn
+
+    def send(self, msg: EmailMessage) -> None:
+        if self._conn is not None and self._count >= self.max_per_connection:
+            self.close()
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                self._conn.send_message(msg)
+                self._count += 1
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._conn = None   # idle timeout on the server side: reconnect once
+                if attempt == 2:
+                    raise
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except smtplib.SMTPException:
+                pass
+            self._conn = None
+
+
+def transport_from_url(url: str) -> Transport:
+    """smtp://[user:pass@]host[:port][?starttls=1], smtps://..., log://, memory://"""
+    u = urlparse(url)
+    if u.scheme == "log":
+        return LogTransport()
+    if u.scheme == "memory":
+        return MemoryTransport()
+    if u.scheme not in ("smtp", "smtps"):
+        raise ValueError(f"Unsupported mail transport: {url}")
+    query = parse_qs(u.query)
+    return SMTPTransport(
+        u.hostname or "localhost",
+        u.port or (465 if u.scheme == "smtps" else 25),
+        username=unquote(u.username) if u.username else None,
+        password=unquote(u.password) if u.password else None,
+        starttls=query.get("starttls", ["0"])[0] in ("1", "true", "yes"),
+        use_ssl=u.scheme == "smtps",
+    )
+
+
+def transport_from_env() -> Transport:
+    """STRIVIO_SMTP_URL if set, else SendGrid's SMTP relay with SENDGRID_API_KEY, else log only."""
+    url = os.getenv("STRIVIO_SMTP_URL")
+    if url:
+        return transport_from_url(url)
+    key = os.getenv("SENDGRID_API_KEY")
+    if key:
+        return SMTPTransport("smtp.sendgrid.net", 587, username="apikey", password=key, starttls=True)
+    return LogTransport()
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            time.sleep((1 - self._tokens) / self.rate)
+
+
+# ---- digests ----
+def build_digest(recipient: str, items: List[Dict]) -> EmailMessage:
+    """One plain-text mail for all of a recipient's pending items, grouped by project and kind."""
+    counts = Counter(i["kind"] for i in items)
+    summary = ", ".join(f"{counts[k]} {_KIND_TITLES[k].lower()}" for k in _KIND_TITLES if counts[k])
+    msg = EmailMessage()
+    msg["From"] = MAIL_FROM
+    msg["To"] = recipient
+    msg["Subject"] = f"Strivio: {len(items)} update{'s' if len(items) != 1 else ''} ({summary})"
+
+    lines: List[str] = []
+    projects: Dict[str, List[Dict]] = {}
+    for i in items:
+        projects.setdefault(i["project"], []).append(i)
+    for project, rows in projects.items():
+        lines.append(project)
+        lines.append("-" * len(project))
+        for kind, title in _KIND_TITLES.items():
+            texts = [r["text"] for r in rows if r["kind"] == kind]
+            if texts:
+                lines.append(f"{title}:")
+                lines.extend(f"  - {t}" for t in texts)
+        lines.append("")
+    if APP_URL:
+        lines.append(f"Open Strivio: {APP_URL}")
+    msg.set_content("\n".join(lines))
+    return msg
+
+
+def send_pending(transport: Optional[Transport] = None, max_recipients: int = 200,
+                 min_age_minutes: Optional[int] = None, rate: Optional[float] = None) -> Dict[str, int]:
+    """
+    Send one digest per recipient with pending notifications. A failed send releases
+    that recipient's rows for a later retry; it does not stop the batch.
+    """
+    own = transport is None
+    transport = transport or transport_from_env()
+    limiter = RateLimiter(MAIL_RATE if rate is None else rate)
+    out = {"digests": 0, "items": 0, "failed": 0}
+    try:
+        digests = db.claim_notification_digests(
+            max_recipients=max_recipients,
+            min_age_minutes=DIGEST_DELAY_MINUTES if min_age_minutes is None else min_age_minutes)
+        for recipient, items in digests.items():
+            ids = [i["id"] for i in items]
+            limiter.acquire()
+            try:
+                transport.send(build_digest(recipient, items))
+            except (smtplib.SMTPException, OSError) as e:
+                log.warning("digest to %s failed: %s", recipient, e)
+                db.finish_notifications(ids, error=str(e) or repr(e))
+                out["failed"] += 1
+                continue
+            db.finish_notifications(ids)
+            out["digests"] += 1
+            out["items"] += len(items)
+    finally:
+        if own:
+            transport.close()
+    return out
+
+
+def run_once(today: Optional[date] = None, transport: Optional[Transport] = None, **kw) -> Dict[str, int]:
+    """Queue due-date notices, then send whatever digests are ready."""
+    queued = db.queue_due_notifications(today=today)
+    out = send_pending(transport, **kw)
+    out["queued"] = queued
+    return out
+
+
+def run_forever(interval: int = NOTIFY_INTERVAL, stop: Optional[threading.Event] = None) -> None:
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            out = run_once()
+            if out["digests"] or out["failed"]:
+                log.info("notifications: %s", out)
+        except Exception:
+            log.exception("notification run failed")
+        stop.wait(max(1, interval))
+
+
+def start_background_worker(interval: int = NOTIFY_INTERVAL) -> Optional[threading.Thread]:
+    """Daemon sender thread for the app process (claims make several replicas safe)."""
+    if interval <= 0:
+        return None
+    t = threading.Thread(target=run_forever, args=(interval,), name="Notifier", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,157 @@
+# people.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : In-memory people directory over users.email  #
+#               and users.name: sorted prefix keys plus a    #
+#               trigram index, loaded incrementally by id so #
+#               lookups stay instant with 100k+ users.       #
+#============================================================#
+
+
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+import db
+
+log = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("STRIVIO_PEOPLE_REFRESH_SECONDS", "30"))
+
+
+def _words(email: str, name: str) -> Set[str]:
+    local = email.split("@", 1)[0]
+    return {w for w in (email, local, *local.replace("_", ".").replace("-", ".").split("."),
+                        *name.lower().split()) if w}
+
+
+def _gram_codes(data: np.ndarray) -> np.ndarray:
+    """Trigram codes (3 bytes packed into an int) at every offset of a uint8 array."""
+    d = data.astype(np.int64)
+    return (d[:-2] << 16) | (d[1:-1] << 8) | d[2:]
+
+
+class PeopleIndex:
+    """
+    Users are only ever inserted, so new rows are fetched by id (at most every
+    REFRESH_SECONDS) and land in a small delta that is scanned directly; the sorted
+    prefix keys and the trigram postings are rebuilt once the delta passes 10% of
+    the indexed users. Prefix keys are the email, its local part split at '.', '_'
+    and '-', and each word of the name; queries of three or more characters also
+    match anywhere in the email or name through the trigram postings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_refresh = 0.0
+        self.ids: List[int] = []
+        self.emails: List[str] = []
+        self.names: List[str] = []
+        # swapped as one tuple so a search never sees half of a rebuild:
+        # (users covered, sorted prefix keys, user position per key,
+        #  sorted distinct trigram codes, CSR offsets per code, user positions)
+        self._built = (0, [], [], np.zeros(0, np.int64), np.zeros(1, np.int64), np.zeros(0, np.int64))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _text(self, pos: int) -> str:
+        return f"{self.emails[pos]}\n{self.names[pos].lower()}"
+
+    def _rebuild(self) -> None:
+        n = len(self.ids)
+        keys = [(w, pos) for pos in range(n) for w in _words(self.emails[pos], self.names[pos])]
+        keys.sort()
+        # one byte string for everyone; '\0' separators keep trigrams from spanning two users
+        texts = [self._text(pos).encode("utf-8") for pos in range(n)]
+        data = np.frombuffer(b"\0".join(texts) + b"\0", dtype=np.uint8)
+        owner = np.repeat(np.arange(n, dtype=np.int64), [len(t) + 1 for t in texts])
+        codes = _gram_codes(data)
+        keep = (data[:-2] != 0) & (data[1:-1] != 0) & (data[2:] != 0)
+        pairs = np.sort((codes[keep] << 32) | owner[:-2][keep])   # by code, then user
+        pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+        code = pairs >> 32
+        starts = np.flatnonzero(np.r_[True, code[1:] != code[:-1]])
+        gram_codes = code[starts]
+
+        self._built = (n, [k for k, _ in keys], [p for _, p in keys],
+                       gram_codes, np.append(starts, len(pairs)), pairs & 0xFFFFFFFF)
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_refresh:
+            return
+        with self._lock:
+            if not force and now < self._next_refresh:
+                return
+            self._next_refresh = now + REFRESH_SECONDS
+            try:
+                while True:
+                    rows = db.list_users(after_id=self.ids[-1] if self.ids else 0)
+                    if not rows:
+                        break
+                    for uid, email, name in rows:
+                        self.ids.append(uid)
+                        self.emails.append(email)
+                        self.names.append(name or "")
+            except Exception:
+                log.warning("could not refresh the people index", exc_info=True)
+            base = self._built[0]
+            if len(self.ids) - base > max(1000, base // 10):
+                self._rebuild()
+
+    def _prefix(self, q: str, limit: int) -> List[int]:
+        base, keys, key_pos = self._built[:3]
+        out: List[int] = []
+        i = bisect.bisect_left(keys, q)
+        while i < len(keys) and keys[i].startswith(q) and len(out) < limit:
+            if key_pos[i] not in out:
+                out.append(key_pos[i])
+            i += 1
+        for pos in range(base, len(self.ids)):
+            if len(out) >= limit:
+                break
+            if pos not in out and any(w.startswith(q) for w in _words(self.emails[pos], self.names[pos])):
+                out.append(pos)
+        return out
+
+    def _substring(self, q: str, limit: int, skip: List[int]) -> List[int]:
+        base, _, _, codes, starts, users = self._built
+        wanted = np.unique(_gram_codes(np.frombuffer(q.encode("utf-8"), dtype=np.uint8)))
+        at = np.searchsorted(codes, wanted).clip(max=max(0, len(codes) - 1))
+        candidates: Optional[np.ndarray] = None
+        if len(codes) and np.array_equal(codes[at], wanted):   # every trigram of q occurs somewhere
+            for i in at:
+                owners = users[starts[i]:starts[i + 1]]
+                candidates = owners if candidates is None else np.intersect1d(candidates, owners, assume_unique=True)
+        positions = [] if candidates is None else candidates.tolist()
+        out = []
+        for pos in positions + list(range(base, len(self.ids))):
+            if pos not in skip and q in self._text(pos):
+                out.append(pos)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Prefix matches first, then substring matches; [{'id', 'email', 'name'}]."""
+        self.refresh()
+        q = (query or "").strip().lower()
+        if not q:
+            return []
+        hits = self._prefix(q, limit)
+        if len(hits) < limit and len(q) >= 3:
+            hits += self._substring(q, limit - len(hits), hits)
+        return [{"id": self.ids[p], "email": self.emails[p], "name": self.names[p] or None} for p in hits]
+
+
+directory = PeopleIndex()
@@ -0,0 +1,113 @@
+# pins.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Project PIN hashing with a salted, tunable    #
+#               KDF (scrypt, PBKDF2 fallback), run in a      #
+#               small bounded thread pool; legacy SHA-256    #
+#               hashes are recognised and flagged for rehash.#
+#============================================================#
+
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+# scrypt cost: memory ~ 128 * n * r bytes (16 MiB at the defaults), tuned via env.
+SCRYPT_N = int(os.getenv("STRIVIO_PIN_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("STRIVIO_PIN_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("STRIVIO_PIN_SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.getenv("STRIVIO_PIN_PBKDF2_ITERATIONS", "600000"))
+# hashes run off the rerun threads; the pool caps concurrent KDF memory/CPU
+WORKERS = int(os.getenv("STRIVIO_PIN_WORKERS", "2"))
+# KDF jobs running or queued at once; a caller waits at most TIMEOUT for a slot and for its result
+QUEUE = int(os.getenv("STRIVIO_PIN_QUEUE", "16"))
+TIMEOUT = float(os.getenv("STRIVIO_PIN_TIMEOUT", "10"))
+
+_HAS_SCRYPT = hasattr(hashlib, "scrypt")
+_pool = ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix="pin-kdf")
+_slots = threading.BoundedSemaphore(max(1, WORKERS, QUEUE))
+
+
+def _b64e(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64d(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(pin: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(pin.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p + 1024 * 1024, dklen=32)
+
+
+def _pbkdf2(pin: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", pin.encode("utf-8"), salt, iterations, dklen=32)
+
+
+def hash_pin(pin: str) -> str:
+    """'scrypt$n$r$p$salt$hash' (or 'pbkdf2_sha256$iterations$salt$hash' without scrypt)."""
+    salt = secrets.token_bytes(16)
+    if _HAS_SCRYPT:
+        dk = _scrypt(pin, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64e(salt)}${_b64e(dk)}"
+    dk = _pbkdf2(pin, salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64e(salt)}${_b64e(dk)}"
+
+
+def needs_rehash(stored: str) -> bool:
+    """Legacy unsalted SHA-256, another algorithm, or weaker parameters than configured."""
+    parts = stored.split("$")
+    if _HAS_SCRYPT:
+        return parts[0] != "scrypt" or tuple(map(int, parts[1:4])) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return parts[0] != "pbkdf2_sha256" or int(parts[1]) != PBKDF2_ITERATIONS
+
+
+def verify_pin(pin: str, stored: Optional[str]) -> Tuple[bool, bool]:
+    """(matches, needs_rehash); constant-time comparison for every format."""
+    if not stored:
+        return False, False
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = map(int, parts[1:4])
+            ok = hmac.compare_digest(_scrypt(pin, _b64d(parts[4]), n, r, p), _b64d(parts[5]))
+        elif parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            ok = hmac.compare_digest(_pbkdf2(pin, _b64d(parts[2]), int(parts[1])), _b64d(parts[3]))
+        elif len(stored) == 64:   # pre-KDF releases: hex SHA-256 of the PIN, no salt
+            ok = hmac.compare_digest(hashlib.sha256(pin.encode("utf-8")).hexdigest(), stored)
+        else:
+            return False, False
+    except (ValueError, TypeError):
+        return False, False
+    return ok, ok and needs_rehash(stored)
+
+
+def _submit(fn: Callable, *args) -> Future:
+    """Queue `fn` on the KDF pool; ValueError if no slot frees up within TIMEOUT."""
+    if not _slots.acquire(timeout=TIMEOUT):
+        raise ValueError("Too many PIN checks in progress; try again shortly")
+    try:
+        fut = _pool.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    fut.add_done_callback(lambda _f: _slots.release())
+    return fut
+
+
+def hash_pin_async(pin: str) -> "Future[str]":
+    return _submit(hash_pin, pin)
+
+
+def verify_pin_async(pin: str, stored: Optional[str]) -> "Future[Tuple[bool, bool]]":
+    return _submit(verify_pin, pin, stored)
@@ -0,0 +1,103 @@
+# project_model.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Column-oriented view of one project revision #
+#               (categorical status/assignee codes, datetime #
+#               arrays) built once per revision and shared   #
+#               read-only by the grid, analytics and Gantt.  #
+#============================================================#
+
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from db import TASK_STATUSES
+
+STATUS_DTYPE = pd.CategoricalDtype(list(TASK_STATUSES), ordered=True)
+TYPE_DTYPE = pd.CategoricalDtype(["Task", "Subtask"])
+ITEM_COLUMNS = ["id", "name", "status", "start_date", "end_date", "assignee_email", "progress", "_type"]
+
+_TASK_FIELDS = ["id", "name", "status", "start_date", "end_date", "assignee_email", "progress", "description"]
+_SUBTASK_FIELDS = ["id", "task_id", "name", "status", "start_date", "end_date", "assignee_email", "progress"]
+
+
+def _columns(rows: List[Dict], fields: List[str], assignees: pd.CategoricalDtype) -> pd.DataFrame:
+    """One list per field straight from the row dicts, converted to typed arrays."""
+    data = {}
+    for f in fields:
+        values = [r[f] for r in rows]
+        if f in ("id", "task_id"):
+            data[f] = np.asarray(values, dtype=np.int64)
+        elif f == "status":
+            # unknown statuses (older rows, manual edits) read as To-Do, like the grid did
+            data[f] = pd.Categorical([v if v in TASK_STATUSES else TASK_STATUSES[0] for v in values],
+                                     dtype=STATUS_DTYPE)
+        elif f in ("start_date", "end_date"):
+            data[f] = pd.to_datetime(pd.Series(values, dtype=object))
+        elif f == "assignee_email":
+            data[f] = pd.Categorical(values, dtype=assignees)
+        elif f == "progress":
+            data[f] = np.asarray([v or 0.0 for v in values], dtype=np.float64)
+        else:
+            data[f] = pd.Series(values, dtype=object)
+    return pd.DataFrame(data, columns=fields)
+
+
+def _type_column(label: str, n: int) -> pd.Categorical:
+    return pd.Categorical.from_codes(np.full(n, TYPE_DTYPE.categories.get_loc(label), dtype=np.int8),
+                                     dtype=TYPE_DTYPE)
+
+
+class ProjectFrame:
+    """
+    Immutable columnar snapshot of a project's tasks and subtasks.
+
+    `tasks` is ordered by start date (undated last, newest first among ties) and
+    `subtasks` by (task_id, start date, id), so each task's subtasks are one
+    contiguous slice. Callers must treat every frame returned here as read-only:
+    it is shared by all sessions viewing the same revision.
+    """
+
+    def __init__(self, tasks: pd.DataFrame, subtasks: pd.DataFrame):
+        self.tasks = tasks
+        self.subtasks = subtasks
+        self._sub_task_ids = subtasks["task_id"].to_numpy()
+        self._items: Dict[bool, pd.DataFrame] = {}
+
+    @classmethod
+    def build(cls, tasks: Iterable[Dict], subtasks: Iterable[Dict]) -> "ProjectFrame":
+        tasks, subtasks = list(tasks), list(subtasks)
+        emails = {r["assignee_email"] for r in tasks} | {r["assignee_email"] for r in subtasks}
+        assignees = pd.CategoricalDtype(sorted(e for e in emails if e))
+
+        t = _columns(tasks, _TASK_FIELDS, assignees)
+        t = t.sort_values("id", ascending=False, kind="stable")
+        t = t.sort_values("start_date", na_position="last", kind="stable").reset_index(drop=True)
+
+        s = _columns(subtasks, _SUBTASK_FIELDS, assignees)
+        s = s.sort_values(["task_id", "start_date", "id"], na_position="last", kind="stable").reset_index(drop=True)
+        return cls(t, s)
+
+    def subtasks_of(self, task_id: int) -> pd.DataFrame:
+        lo, hi = np.searchsorted(self._sub_task_ids, [task_id, task_id + 1])
+        return self.subtasks.iloc[lo:hi]
+
+    def task_names(self) -> Dict[int, str]:
+        return dict(zip(self.tasks["id"].tolist(), self.tasks["name"].fillna("Untitled Task").tolist()))
+
+    def items(self, include_subtasks: bool = True) -> pd.DataFrame:
+        """The analytics table: tasks (and subtasks) with a categorical `_type` column."""
+        out: Optional[pd.DataFrame] = self._items.get(include_subtasks)
+        if out is None:
+            parts = [self.tasks.assign(_type=_type_column("Task", len(self.tasks)))]
+            if include_subtasks:
+                parts.append(self.subtasks.assign(_type=_type_column("Subtask", len(self.subtasks))))
+            out = pd.concat([p[ITEM_COLUMNS] for p in parts], ignore_index=True)
+            self._items[include_subtasks] = out
+        return out
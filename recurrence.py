@@ -0,0 +1,96 @@
+# recurrence.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : RRULE helpers for recurring tasks: build,    #
+#               validate, describe, and lazily enumerate     #
+#               occurrences inside a date window.            #
+#============================================================#
+
+
+from __future__ import annotations
+
+from datetime import date, datetime, time
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence
+
+from dateutil.rrule import rrulestr
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+_WEEKDAY_NAMES = dict(zip(WEEKDAYS, ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")))
+_UNITS = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month", "YEARLY": "year"}
+
+
+def build_rule(freq: str, interval: int = 1, weekdays: Optional[Sequence[str]] = None,
+               until: Optional[date] = None, count: Optional[int] = None) -> str:
+    """RRULE body (no DTSTART), e.g. 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH'."""
+    freq = freq.upper()
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency: {freq}")
+    if interval < 1:
+        raise ValueError("Interval must be at least 1")
+    parts = [f"FREQ={freq}", f"INTERVAL={int(interval)}"]
+    if weekdays:
+        days = [d.upper()[:2] for d in weekdays]
+        if any(d not in WEEKDAYS for d in days):
+            raise ValueError(f"Unknown weekday in {weekdays}")
+        parts.append("BYDAY=" + ",".join(sorted(set(days), key=WEEKDAYS.index)))
+    if until is not None and count is not None:
+        raise ValueError("Use either an end date or a count, not both")
+    if until is not None:
+        parts.append(f"UNTIL={until:%Y%m%d}")
+    if count is not None:
+        parts.append(f"COUNT={int(count)}")
+    return ";".join(parts)
+
+
+def _rule(rule: str, dtstart: date):
+    return rrulestr(rule.removeprefix("RRULE:"), dtstart=datetime.combine(dtstart, time()))
+
+
+def validate_rule(rule: str, dtstart: date) -> str:
+    """Return the rule if dateutil can parse it, else raise ValueError."""
+    try:
+        _rule(rule, dtstart)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule {rule!r}: {e}") from e
+    return rule
+
+
+def occurrences(rule: str, dtstart: date, after: Optional[date], through: date) -> Iterator[date]:
+    """
+    Occurrence dates strictly after `after` (None: from dtstart) up to and including
+    `through`. Lazy: an unbounded rule only costs the dates inside the window.
+    """
+    r = _rule(rule, dtstart)
+    start = datetime.combine(after, time()) if after is not None else None
+    it = r.xafter(start, inc=False) if start is not None else iter(r)
+    for dt in it:
+        d = dt.date()
+        if d > through:
+            return
+        yield d
+
+
+def next_occurrences(rule: str, dtstart: date, after: date, n: int = 3) -> List[date]:
+    r = _rule(rule, dtstart)
+    return [dt.date() for dt in islice(r.xafter(datetime.combine(after, time()), inc=True), n)]
+
+
+def describe(rule: str) -> str:
+    """Short human summary, e.g. 'Every 2 weeks on Mon, Thu until 2025-12-31'."""
+    fields = dict(p.split("=", 1) for p in rule.removeprefix("RRULE:").split(";") if "=" in p)
+    freq = fields.get("FREQ", "")
+    interval = int(fields.get("INTERVAL", "1"))
+    unit = _UNITS.get(freq, freq.lower())
+    text = f"Every {unit}" if interval == 1 else f"Every {interval} {unit}s"
+    if fields.get("BYDAY"):
+        text += " on " + ", ".join(_WEEKDAY_NAMES.get(d[-2:], d) for d in fields["BYDAY"].split(","))
+    if fields.get("UNTIL"):
+        u = fields["UNTIL"][:8]
+        text += f" until {u[:4]}-{u[4:6]}-{u[6:]}"
+    elif fields.get("COUNT"):
+        text += f", {fields['COUNT']} times"
+    return text
@@ -0,0 +1,126 @@
+# reports.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : PDF project reports (reportlab) with a Gantt #
+#               image rendered by kaleido. Runs in the job   #
+#               worker processes, never in a Streamlit rerun.#
+#============================================================#
+
+
+from __future__ import annotations
+
+import io
+import logging
+from datetime import date
+from xml.sax.saxutils import escape
+from typing import Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+STATUS_COLORS = {"To-Do": "#9CA3AF", "In Progress": "#2563EB", "Done": "#16A34A"}
+
+
+def gantt_png(tasks: List[Dict], width: int = 1000) -> Optional[bytes]:
+    """Render the task timeline to PNG; None when there is nothing to draw or kaleido fails."""
+    import pandas as pd
+    import plotly.express as px
+
+    rows = []
+    for t in tasks:
+        if t["start_date"] and t["end_date"]:
+            end = t["end_date"] if t["end_date"] > t["start_date"] else pd.Timestamp(t["start_date"]) + pd.Timedelta(days=1)
+            rows.append({"Task": t["name"], "Start": t["start_date"], "Finish": end, "Status": t["status"]})
+    if not rows:
+        return None
+    df = pd.DataFrame(rows).sort_values("Start")
+    fig = px.timeline(df, x_start="Start", x_end="Finish", y="Task", color="Status",
+                      color_discrete_map=STATUS_COLORS)
+    fig.update_yaxes(autorange="reversed", title=None, categoryorder="array",
+                     categoryarray=df["Task"].tolist())
+    fig.update_xaxes(title=None)
+    fig.update_layout(margin=dict(l=10, r=10, t=10, b=10), height=max(300, min(1400, 120 + 22 * len(df))))
+    try:
+        return fig.to_image(format="png", width=width, scale=1)
+    except Exception:
+        log.warning("kaleido could not render the Gantt image", exc_info=True)
+        return None
+
+
+def build_project_pdf(project: Dict, tasks: List[Dict], subtasks: List[Dict],
+                      progress: Callable[[float, str], None] = lambda f, m: None) -> bytes:
+    """Project summary, KPIs, Gantt and task table as a PDF document."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    today = date.today()
+    items = tasks + subtasks
+    done = sum(1 for i in items if i["status"] == "Done")
+    overdue = sum(1 for i in items if i["end_date"] and i["end_date"] < today and i["status"] != "Done")
+    mean_progress = round(sum(i["progress"] for i in items) / len(items), 1) if items else 0.0
+
+    styles = getSampleStyleSheet()
+    buf = io.BytesIO()
+    doc = SimpleDocTemplate(buf, pagesize=landscape(A4), title=f"{project['name']} - Strivio report",
+                            leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm)
+    story = [
+        Paragraph(escape(project["name"]), styles["Title"]),
+        Paragraph(f"{project['start_date']} &rarr; {project['end_date']} &middot; generated {today}", styles["Normal"]),
+        Spacer(1, 0.4 * cm),
+    ]
+    if project.get("description"):
+        story += [Paragraph(escape(project["description"]), styles["BodyText"]), Spacer(1, 0.4 * cm)]
+
+    kpis = Table(
+        [["Items (open/total)", "Done", "Overdue", "Overall % complete"],
+         [f"{len(items) - done}/{len(items)}", str(done), str(overdue), f"{mean_progress}%"]],
+        hAlign="LEFT",
+    )
+    kpis.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#F3F4F6")),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#E5E7EB")),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("PADDING", (0, 0), (-1, -1), 6),
+    ]))
+    story += [kpis, Spacer(1, 0.6 * cm)]
+    progress(0.2, "Rendering Gantt")
+
+    png = gantt_png(tasks)
+    story.append(Paragraph("Timeline", styles["Heading2"]))
+    if png:
+        from reportlab.lib.utils import ImageReader
+        img = ImageReader(io.BytesIO(png))
+        w, h = img.getSize()
+        max_w = doc.width
+        story.append(Image(io.BytesIO(png), width=max_w, height=max_w * h / w))
+    else:
+        story.append(Paragraph("No dated tasks to draw, or the image renderer is unavailable.", styles["Italic"]))
+    progress(0.6, "Building task table")
+
+    subs_by_task: Dict[int, List[Dict]] = {}
+    for s_ in subtasks:
+        subs_by_task.setdefault(s_["task_id"], []).append(s_)
+    data = [["Task", "Status", "Start", "End", "Assignee", "Progress"]]
+    for t in sorted(tasks, key=lambda t: (t["start_date"] is None, t["start_date"] or date.max)):
+        data.append([t["name"], t["status"], t["start_date"] or "", t["end_date"] or "",
+                     t["assignee_email"] or "", f"{round(t['progress'])}%"])
+        for s_ in subs_by_task.get(t["id"], []):
+            data.append([f"   - {s_['name']}", s_["status"], s_["start_date"] or "", s_["end_date"] or "",
+                         s_["assignee_email"] or "", f"{round(s_['progress'])}%"])
+    table = Table(data, repeatRows=1, hAlign="LEFT")
+    table.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#2563EB")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#F9FAFB")]),
+        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#E5E7EB")),
+    ]))
+    story += [Spacer(1, 0.6 * cm), Paragraph("Tasks", styles["Heading2"]), table]
+    progress(0.8, "Writing PDF")
+    doc.build(story)
+    return buf.getvalue()
@@ -0,0 +1,147 @@
+# routing.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Read/write session routing: read-only       #
+#               helpers use a replica when it is healthy and #
+#               caught up, with read-your-writes stickiness. #
+#============================================================#
+
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+log = logging.getLogger(__name__)
+
+_REVISION_SQL = text("SELECT value FROM revision_counter WHERE id = 1")
+
+# Who is reading: set once per Streamlit rerun (or CLI run) so stickiness follows a user session.
+route_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("route_key", default=None)
+_force_primary: contextvars.ContextVar[bool] = contextvars.ContextVar("force_primary", default=False)
+
+
+class ReadRouter:
+    """
+    Picks the session factory for read-only helpers.
+
+    - No replica configured: always the primary.
+    - Replica lagging longer than `max_lag_seconds`, or erroring: primary until the
+      next health check.
+    - A route key that just wrote revision R reads from the primary until the
+      replica has applied R (read-your-writes).
+    """
+
+    def __init__(self, primary: sessionmaker, replica: Optional[sessionmaker],
+                 max_lag_seconds: float = 5.0, check_interval: float = 2.0, sticky_ttl: float = 300.0):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.sticky_ttl = sticky_ttl
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._healthy = replica is not None
+        self._replica_rev = 0
+        self._behind_since: Optional[float] = None
+        self._sticky: Dict[str, tuple] = {}   # route key -> (revision, written_at)
+
+    # ---- bookkeeping ----
+    def note_write(self, revision: Optional[int]) -> None:
+        key = route_key.get()
+        if self.replica is None or key is None or not revision:
+            return
+        with self._lock:
+            self._sticky[key] = (int(revision), time.monotonic())
+
+    def _revision(self, factory: sessionmaker) -> int:
+        with factory() as s:
+            return int(s.execute(_REVISION_SQL).scalar() or 0)
+
+    def _check_health(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            replica_rev = self._revision(self.replica)
+            primary_rev = self._revision(self.primary)
+        except Exception:
+            log.warning("read replica health check failed; using primary", exc_info=True)
+            self._healthy = False
+            return
+        self._replica_rev = replica_rev
+        if replica_rev >= primary_rev:
+            self._behind_since = None
+            self._healthy = True
+        else:
+            self._behind_since = self._behind_since or now
+            self._healthy = now - self._behind_since <= self.max_lag_seconds
+
+    def _caught_up_for(self, key: Optional[str]) -> bool:
+        sticky = self._sticky.get(key) if key else None
+        if sticky is None:
+            return True
+        rev, written_at = sticky
+        if self._replica_rev < rev:
+            try:
+                self._replica_rev = max(self._replica_rev, self._revision(self.replica))
+            except Exception:
+                return False
+        if self._replica_rev >= rev or time.monotonic() - written_at > self.sticky_ttl:
+            self._sticky.pop(key, None)
+            return True
+        return False
+
+    # ---- routing ----
+    def factory(self) -> sessionmaker:
+        if self.replica is None or _force_primary.get():
+            return self.primary
+        with self._lock:
+            self._check_health()
+            if self._healthy and self._caught_up_for(route_key.get()):
+                return self.replica
+        return self.primary
+
+    def session(self) -> Session:
+        return self.factory()()
+
+    @contextlib.contextmanager
+    def use_primary(self) -> Iterator[None]:
+        """Route every read inside the block to the primary (for values shared across sessions)."""
+        token = _force_primary.set(True)
+        try:
+            yield
+        finally:
+            _force_primary.reset(token)
+
+    def read_only(self, fn: Callable) -> Callable:
+        """Decorator for read helpers: one retry on the primary if the replica fails."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self.replica is None or _force_primary.get():
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            except DBAPIError:
+                log.warning("read on replica failed; retrying %s on primary", fn.__name__, exc_info=True)
+                with self._lock:
+                    self._healthy = False
+                    self._checked_at = time.monotonic()
+                token = _force_primary.set(True)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    _force_primary.reset(token)
+        return wrapper
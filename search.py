@@ -0,0 +1,255 @@
+# search.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Full-text search over tasks and subtasks.    #
+#               SQLite: FTS5 table; Postgres: tsvector + GIN #
+#               index. Both kept in sync by DB triggers.     #
+#============================================================#
+
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# Each document gets a stable integer key: tasks are even, subtasks odd,
+# so deletes and updates hit the index by primary key instead of scanning.
+_DOC_ID_TASK = "(2 * {row}.id)"
+_DOC_ID_SUB = "(2 * {row}.id + 1)"
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        title, body, project_id UNINDEXED, kind UNINDEXED, item_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_ins AFTER INSERT ON tasks BEGIN
+        INSERT INTO search_fts(rowid, title, body, project_id, kind, item_id)
+        VALUES ({_DOC_ID_TASK.format(row="new")}, new.name, coalesce(new.description, ''),
+                new.project_id, 'task', new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_upd AFTER UPDATE OF name, description ON tasks BEGIN
+        DELETE FROM search_fts WHERE rowid = {_DOC_ID_TASK.format(row="old")};
+        INSERT INTO search_fts(rowid, title, body, project_id, kind, item_id)
+        VALUES ({_DOC_ID_TASK.format(row="new")}, new.name, coalesce(new.description, ''),
+                new.project_id, 'task', new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_del AFTER DELETE ON tasks BEGIN
+        DELETE FROM search_fts WHERE rowid = {_DOC_ID_TASK.format(row="old")};
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_subtasks_fts_ins AFTER INSERT ON subtasks BEGIN
+        INSERT INTO search_fts(rowid, title, body, project_id, kind, item_id)
+        VALUES ({_DOC_ID_SUB.format(row="new")}, new.name, '',
+                (SELECT project_id FROM tasks WHERE id = new.task_id), 'subtask', new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_subtasks_fts_upd AFTER UPDATE OF name ON subtasks BEGIN
+        DELETE FROM search_fts WHERE rowid = {_DOC_ID_SUB.format(row="old")};
+        INSERT INTO search_fts(rowid, title, body, project_id, kind, item_id)
+        VALUES ({_DOC_ID_SUB.format(row="new")}, new.name, '',
+                (SELECT project_id FROM tasks WHERE id = new.task_id), 'subtask', new.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_subtasks_fts_del AFTER DELETE ON subtasks BEGIN
+        DELETE FROM search_fts WHERE rowid = {_DOC_ID_SUB.format(row="old")};
+    END
+    """,
+]
+
+_POSTGRES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        doc_id     BIGINT PRIMARY KEY,
+        project_id INTEGER NOT NULL,
+        kind       VARCHAR(8) NOT NULL,
+        item_id    INTEGER NOT NULL,
+        title      TEXT NOT NULL,
+        body       TEXT NOT NULL DEFAULT '',
+        tsv        TSVECTOR GENERATED ALWAYS AS (
+                       setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+                       setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+                   ) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING GIN (tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_search_documents_project ON search_documents (project_id)",
+    f"""
+    CREATE OR REPLACE FUNCTION strivio_tasks_search_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM search_documents WHERE doc_id = {_DOC_ID_TASK.format(row="OLD")};
+            RETURN OLD;
+        END IF;
+        INSERT INTO search_documents(doc_id, project_id, kind, item_id, title, body)
+        VALUES ({_DOC_ID_TASK.format(row="NEW")}, NEW.project_id, 'task', NEW.id,
+                NEW.name, coalesce(NEW.description, ''))
+        ON CONFLICT (doc_id) DO UPDATE SET title = EXCLUDED.title, body = EXCLUDED.body;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION strivio_subtasks_search_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM search_documents WHERE doc_id = {_DOC_ID_SUB.format(row="OLD")};
+            RETURN OLD;
+        END IF;
+        INSERT INTO search_documents(doc_id, project_id, kind, item_id, title, body)
+        SELECT {_DOC_ID_SUB.format(row="NEW")}, t.project_id, 'subtask', NEW.id, NEW.name, ''
+        FROM tasks t WHERE t.id = NEW.task_id
+        ON CONFLICT (doc_id) DO UPDATE SET title = EXCLUDED.title;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_tasks_search ON tasks",
+    """
+    CREATE TRIGGER trg_tasks_search AFTER INSERT OR DELETE OR UPDATE OF name, description
+    ON tasks FOR EACH ROW EXECUTE FUNCTION strivio_tasks_search_sync()
+    """,
+    "DROP TRIGGER IF EXISTS trg_subtasks_search ON subtasks",
+    """
+    CREATE TRIGGER trg_subtasks_search AFTER INSERT OR DELETE OR UPDATE OF name
+    ON subtasks FOR EACH ROW EXECUTE FUNCTION strivio_subtasks_search_sync()
+    """,
+]
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+def init_search_index(engine: Engine) -> None:
+    """Create the index and its triggers (idempotent); populate it once if empty."""
+    dialect = _dialect(engine)
+    if dialect not in ("sqlite", "postgresql"):
+        return
+    with engine.begin() as conn:
+        for ddl in (_SQLITE_DDL if dialect == "sqlite" else _POSTGRES_DDL):
+            conn.execute(text(ddl))
+        table = "search_fts" if dialect == "sqlite" else "search_documents"
+        empty = conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first() is None
+        has_tasks = conn.execute(text("SELECT 1 FROM tasks LIMIT 1")).first() is not None
+        if empty and has_tasks:
+            rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn: Connection) -> None:
+    """Repopulate the whole index with two INSERT ... SELECT statements."""
+    if _dialect(conn) == "sqlite":
+        conn.execute(text("DELETE FROM search_fts"))
+        conn.execute(text(f"""
+            INSERT INTO search_fts(rowid, title, body, project_id, kind, item_id)
+            SELECT {_DOC_ID_TASK.format(row="t")}, t.name, coalesce(t.description, ''),
+                   t.project_id, 'task', t.id
+            FROM tasks t
+        """))
+        conn.execute(text(f"""
+            INSERT INTO search_fts(rowid, title, body, project_id, kind, item_id)
+            SELECT {_DOC_ID_SUB.format(row="s")}, s.name, '', t.project_id, 'subtask', s.id
+            FROM subtasks s JOIN tasks t ON t.id = s.task_id
+        """))
+    else:
+        conn.execute(text("TRUNCATE search_documents"))
+        conn.execute(text(f"""
+            INSERT INTO search_documents(doc_id, project_id, kind, item_id, title, body)
+            SELECT {_DOC_ID_TASK.format(row="t")}, t.project_id, 'task', t.id,
+                   t.name, coalesce(t.description, '')
+            FROM tasks t
+        """))
+        conn.execute(text(f"""
+            INSERT INTO search_documents(doc_id, project_id, kind, item_id, title, body)
+            SELECT {_DOC_ID_SUB.format(row="s")}, t.project_id, 'subtask', s.id, s.name, ''
+            FROM subtasks s JOIN tasks t ON t.id = s.task_id
+        """))
+
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts5_query(q: str) -> Optional[str]:
+    """Quote each word (so user input can't hit FTS5 syntax); last word is a prefix."""
+    words = _TOKEN.findall(q or "")
+    if not words:
+        return None
+    quoted = ['"%s"' % w for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _tsquery(q: str) -> Optional[str]:
+    words = _TOKEN.findall(q or "")
+    if not words:
+        return None
+    return " & ".join(words[:-1] + [words[-1] + ":*"])
+
+
+def search(conn: Connection, q: str, project_ids: Sequence[int],
+           limit: int = 20, offset: int = 0) -> List[Dict]:
+    """
+    Ranked matches within `project_ids`, best first. Fetch `limit + 1` to learn
+    whether another page exists without counting every match.
+    """
+    if not project_ids:
+        return []
+    params = {"limit": int(limit), "offset": int(offset)}
+    pid_params = {f"p{i}": int(p) for i, p in enumerate(project_ids)}
+    params.update(pid_params)
+    in_list = ", ".join(f":{k}" for k in pid_params)
+
+    if _dialect(conn) == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return []
+        params["q"] = match
+        sql = f"""
+            SELECT f.kind, f.item_id, f.project_id, p.name AS project_name, f.title,
+                   snippet(search_fts, 1, '**', '**', '…', 12) AS snippet,
+                   bm25(search_fts, 10.0, 1.0) AS rank
+            FROM search_fts f JOIN projects p ON p.id = f.project_id
+            WHERE search_fts MATCH :q AND f.project_id IN ({in_list})
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        tsq = _tsquery(q)
+        if not tsq:
+            return []
+        params["q"] = tsq
+        sql = f"""
+            SELECT d.kind, d.item_id, d.project_id, p.name AS project_name, d.title,
+                   ts_headline('simple', d.body, to_tsquery('simple', :q),
+                               'StartSel=**, StopSel=**, MaxWords=12, MinWords=4') AS snippet,
+                   -ts_rank(d.tsv, to_tsquery('simple', :q)) AS rank
+            FROM search_documents d JOIN projects p ON p.id = d.project_id
+            WHERE d.tsv @@ to_tsquery('simple', :q) AND d.project_id IN ({in_list})
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        """
+    rows = conn.execute(text(sql), params).mappings().all()
+    return [
+        {
+            "kind": r["kind"],
+            "item_id": int(r["item_id"]),
+            "project_id": int(r["project_id"]),
+            "project_name": r["project_name"],
+            "title": r["title"],
+            "snippet": r["snippet"] or "",
+            "rank": float(r["rank"] or 0),
+        }
+        for r in rows
+    ]
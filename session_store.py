@@ -0,0 +1,132 @@
+# session_store.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Bounded per-session state: scoped entries    #
+#               (per task / per project) kept in LRU order   #
+#               under a memory budget, and a process-wide    #
+#               record of each session's footprint.          #
+#============================================================#
+
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, MutableMapping, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+BUDGET_BYTES = int(os.getenv("STRIVIO_SESSION_BUDGET_KB", "512")) * 1024
+SESSION_TTL_SECONDS = 3600   # sessions not seen for this long drop out of the size report
+STORE_KEY = "_scoped_state"
+
+
+def approx_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """Deep sys.getsizeof over dicts, lists, tuples and sets; shared objects count once."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(v, seen) for v in obj)
+    return size
+
+
+class ScopedState:
+    """
+    Entries grouped by scope ("sub_rows", "pin_ok", ...) and keyed within it (a task
+    or project id), stored under one session_state key. Each scope keeps at most
+    `limits[scope]` keys and the whole store stays under `budget_bytes`; the least
+    recently used entries go first. Values are sized when set: replace them with
+    `set`, don't mutate them in place.
+    """
+
+    def __init__(self, state: MutableMapping, limits: Optional[Dict[str, int]] = None,
+                 budget_bytes: int = BUDGET_BYTES):
+        if STORE_KEY not in state:
+            state[STORE_KEY] = {"entries": OrderedDict(), "bytes": 0, "evicted": 0}
+        self._store = state[STORE_KEY]
+        self._entries: "OrderedDict[Tuple[str, Hashable], list]" = self._store["entries"]
+        self.limits = limits or {}
+        self.budget_bytes = budget_bytes
+
+    def get(self, scope: str, key: Hashable, default: Any = None) -> Any:
+        item = self._entries.get((scope, key))
+        if item is None:
+            return default
+        self._entries.move_to_end((scope, key))
+        return item[0]
+
+    def set(self, scope: str, key: Hashable, value: Any) -> None:
+        self.pop(scope, key)
+        size = approx_size(value)
+        self._entries[(scope, key)] = [value, size]
+        self._store["bytes"] += size
+        self._evict(scope)
+
+    def pop(self, scope: str, key: Hashable, default: Any = None) -> Any:
+        item = self._entries.pop((scope, key), None)
+        if item is None:
+            return default
+        self._store["bytes"] -= item[1]
+        return item[0]
+
+    def clear(self, scope: Optional[str] = None) -> None:
+        for k in [k for k in self._entries if scope is None or k[0] == scope]:
+            self.pop(*k)
+
+    def _evict(self, scope: str) -> None:
+        limit = self.limits.get(scope)
+        if limit is not None:
+            keys = [k for k in self._entries if k[0] == scope]
+            for k in keys[:max(0, len(keys) - limit)]:
+                self.pop(*k)
+                self._store["evicted"] += 1
+        # the entry just written always stays, even if it alone is over budget
+        while self._store["bytes"] > self.budget_bytes and len(self._entries) > 1:
+            self.pop(*next(iter(self._entries)))
+            self._store["evicted"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._store["bytes"]
+
+    @property
+    def evicted(self) -> int:
+        return self._store["evicted"]
+
+
+# ---- per-session footprint (process-wide) ----
+_sizes: Dict[str, Tuple[int, float]] = {}   # session key -> (bytes, last seen, epoch seconds)
+_sizes_lock = threading.Lock()
+
+
+def record_session_size(session_key: str, state: MutableMapping) -> int:
+    """Measure a session's whole state once per rerun and keep it for `session_sizes`."""
+    nbytes = sum(approx_size(k) + approx_size(state[k]) for k in list(state.keys()))
+    now = time.time()
+    with _sizes_lock:
+        _sizes[session_key] = (nbytes, now)
+        for k in [k for k, (_, seen) in _sizes.items() if now - seen > SESSION_TTL_SECONDS]:
+            del _sizes[k]
+    if nbytes > 2 * BUDGET_BYTES:
+        log.warning("session %s holds %d KB of state", session_key[:8], nbytes // 1024)
+    return nbytes
+
+
+def session_sizes() -> Dict[str, int]:
+    """Bytes of state per recently active session in this process, largest first."""
+    with _sizes_lock:
+        return dict(sorted(((k, b) for k, (b, _) in _sizes.items()), key=lambda kv: kv[1], reverse=True))
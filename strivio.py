@@ -0,0 +1,364 @@
+# strivio.py
+
+#============================================================#
+#                         Strivio-PM                         #
+#============================================================#
+# Purpose     : Headless admin CLI on top of db.py:          #
+#               `python -m strivio <command>`. Bulk commands #
+#               run as one transaction per project.          #
+#============================================================#
+
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import db
+import auth
+import backup
+import export
+import feeds
+import notify
+
+
+def _out(msg: str) -> None:
+    print(msg, file=sys.stderr)
+
+
+def _workers(requested: int) -> int:
+    """SQLite serialises writers, so concurrent write transactions only add lock waits."""
+    return 1 if db.engine.dialect.name == "sqlite" else max(1, requested)
+
+
+def _parallel(fn: Callable, items: List, workers: int) -> List:
+    if workers <= 1 or len(items) <= 1:
+        return [fn(i) for i in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, items))
+
+
+def _read_rows(path: str) -> Iterator[Dict]:
+    """Stream dict rows from a CSV or NDJSON file ('-' = CSV on stdin)."""
+    if path == "-":
+        yield from csv.DictReader(sys.stdin)
+        return
+    with open(path, newline="", encoding="utf-8") as fh:
+        if Path(path).suffix.lower() in (".ndjson", ".jsonl"):
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(fh)
+
+
+# ---- commands ----
+def cmd_init(args) -> int:
+    db.init_db()
+    _out(f"initialised {db.engine.url.render_as_string(hide_password=True)}")
+    return 0
+
+
+def cmd_projects(args) -> int:
+    if args.user:
+        rows = [{"id": p.id, "name": p.name, "start_date": p.start_date, "end_date": p.end_date}
+                for p in db.get_projects_for_user(args.user)]
+    else:
+        rows = db.list_projects()
+    w = csv.writer(sys.stdout)
+    w.writerow(["id", "name", "start_date", "end_date"])
+    for r in rows:
+        w.writerow([r["id"], r["name"], r["start_date"], r["end_date"]])
+    return 0
+
+
+def cmd_create_project(args) -> int:
+    if args.template:
+        pid = db.create_project_from_template(args.template, args.owner, args.name, date.fromisoformat(args.start),
+                                              member_emails=args.member, is_public=args.public, pin=args.pin)
+    elif not args.end:
+        raise ValueError("--end is required unless --template is given")
+    else:
+        pid = db.create_project(args.owner, args.name, date.fromisoformat(args.start), date.fromisoformat(args.end),
+                                member_emails=args.member, is_public=args.public, pin=args.pin)
+    print(pid)
+    return 0
+
+
+def cmd_import(args) -> int:
+    counts = db.import_items(args.project, _read_rows(args.file), batch_size=args.batch_size)
+    _out(f"imported {counts['task']:,} tasks and {counts['subtask']:,} subtasks into project {args.project}")
+    return 0
+
+
+def cmd_export(args) -> int:
+    if not args.split_dir:
+        return export.run(args)
+    pids = export.project_ids_for(args.projects, args.user)
+    out_dir = Path(args.split_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def one(pid: int) -> int:
+        return export.export_projects([pid], args.format, out_dir / f"project{pid}{export.FORMATS[args.format]}",
+                                      batch_size=args.batch_size)
+
+    # reads only: safe to run side by side on any backend
+    total = sum(_parallel(one, pids, max(1, args.jobs)))
+    _out(f"exported {total:,} rows into {len(pids)} file(s) under {out_dir}")
+    return 0
+
+
+def _member_roles(rows: Iterable[Dict], default_role: str) -> Dict[Optional[int], Dict[str, str]]:
+    by_project: Dict[Optional[int], Dict[str, str]] = {}
+    for r in rows:
+        email = (r.get("email") or "").strip().lower()
+        if not email:
+            continue
+        pid = int(r["project_id"]) if r.get("project_id") not in (None, "") else None
+        by_project.setdefault(pid, {})[email] = (r.get("role") or default_role).strip().lower()
+    return by_project
+
+
+def cmd_members_sync(args) -> int:
+    by_project = _member_roles(_read_rows(args.file), args.role)
+    if None in by_project:
+        if args.project is None:
+            raise ValueError("Rows without project_id need --project")
+        by_project.setdefault(args.project, {}).update(by_project.pop(None))
+    elif args.project is not None:
+        by_project = {args.project: by_project.get(args.project, {})}
+
+    def one(pid: int):
+        return pid, db.sync_project_members(pid, by_project[pid], remove_missing=args.remove_missing)
+
+    for pid, out in _parallel(one, sorted(by_project), _workers(args.jobs)):
+        _out(f"project {pid}: +{out['added']} added, {out['updated']} updated, -{out['removed']} removed")
+    return 0
+
+
+def cmd_clone(args) -> int:
+    pid = db.clone_project(args.source, args.name, owner_email=args.owner, shift_days=args.shift_days,
+                           include_members=not args.no_members)
+    print(pid)
+    return 0
+
+
+def cmd_purge(args) -> int:
+    if not args.yes:
+        raise ValueError("Purging deletes projects with all their tasks: pass --yes")
+
+    def one(pid: int) -> int:
+        db.delete_project(pid)
+        return pid
+
+    done = _parallel(one, args.projects, _workers(args.jobs))
+    _out(f"purged {len(done)} project(s)")
+    return 0
+
+
+def cmd_backup(args) -> int:
+    path = backup.online_backup(args.dest, pages=args.pages, keep=args.keep)
+    _out(f"backed up {db.engine.url.database} to {path} ({path.stat().st_size / 1e6:,.1f} MB)")
+    return 0
+
+
+def cmd_snapshot(args) -> int:
+    out = Path(args.out)
+    if len(args.projects) > 1 or out.is_dir():
+        out.mkdir(parents=True, exist_ok=True)
+        targets = {pid: out / f"project{pid}{backup.SNAPSHOT_SUFFIX}" for pid in args.projects}
+    else:
+        targets = {args.projects[0]: out}
+
+    def one(pid: int) -> int:
+        return backup.write_snapshot(pid, targets[pid])
+
+    # reads only: safe to run side by side on any backend
+    total = sum(_parallel(one, list(targets), max(1, args.jobs)))
+    _out(f"wrote {total:,} records into {len(targets)} snapshot(s)")
+    return 0
+
+
+def cmd_restore(args) -> int:
+    pid = backup.restore_snapshot(args.file, owner_email=args.owner, name=args.name, batch_size=args.batch_size)
+    print(pid)
+    return 0
+
+
+def cmd_notify(args) -> int:
+    if args.smtp:
+        os.environ["STRIVIO_SMTP_URL"] = args.smtp   # read by each pass's transport_from_env()
+    if args.loop:
+        _out(f"sending digests every {args.loop}s (Ctrl+C to stop)")
+        try:
+            notify.run_forever(args.loop)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    out = notify.run_once(min_age_minutes=0 if args.now else None)
+    _out(f"queued {out['queued']:,} due-date notice(s); sent {out['digests']:,} digest(s) "
+         f"with {out['items']:,} item(s); {out['failed']:,} failed")
+    return 0
+
+
+def cmd_feeds(args) -> int:
+    if args.link:
+        user = db.login(args.link)
+        token = feeds.issue_token(user, project_id=args.project,
+                                  pin_version=getattr(db.get_project(args.project), "pin_version", 0) if args.project else 0)
+        print(feeds.feed_url(token, project_id=args.project, fmt=args.format))
+        return 0
+    _out(f"serving feeds on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        feeds.serve(args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_maintenance(args) -> int:
+    if args.task == "backfill-stats":
+        _out(f"wrote {db.backfill_daily_stats():,} daily snapshot(s)")
+    elif args.task == "prune-tombstones":
+        _out(f"pruned {db.prune_tombstones(keep_days=30 if args.keep_days is None else args.keep_days):,} tombstone(s)")
+    elif args.task == "prune-auth":
+        _out(f"pruned {db.prune_auth_revocations(auth.COOKIE_EXPIRES_DAYS):,} session revocation(s)")
+    elif args.task == "scan-due":
+        _out(f"{db.scan_due_items():,} open item(s) overdue or due within {db.DUE_HORIZON_DAYS} days")
+    elif args.task == "materialize-recurrences":
+        _out(f"created {db.materialize_recurrences():,} recurring task occurrence(s)")
+    elif args.task == "prune-notifications":
+        _out(f"pruned {db.prune_notifications(keep_days=30 if args.keep_days is None else args.keep_days):,} notification(s)")
+    elif args.task == "prune-activity":
+        _out(f"pruned {db.prune_activity(keep_days=args.keep_days):,} activity entries")
+    elif args.task == "archive":
+        moved = db.archive_items(older_than_days=args.keep_days)
+        _out(f"archived {moved['task']:,} task(s) and {moved['subtask']:,} subtask(s)")
+    elif args.task == "rebuild-search":
+        with db.engine.begin() as conn:
+            db.search.rebuild_search_index(conn)
+        _out("search index rebuilt")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m strivio", description="Strivio-PM batch administration.")
+    parser.add_argument("-j", "--jobs", type=int, default=min(4, os.cpu_count() or 1),
+                        help="parallel projects for multi-project commands (writes: Postgres only)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("init", help="create or migrate the schema").set_defaults(fn=cmd_init)
+
+    p = sub.add_parser("projects", help="list projects as CSV")
+    p.add_argument("-u", "--user", help="only projects this email belongs to")
+    p.set_defaults(fn=cmd_projects)
+
+    p = sub.add_parser("create-project", help="create a project, print its id")
+    p.add_argument("--owner", required=True)
+    p.add_argument("--name", required=True)
+    p.add_argument("--start", required=True, help="YYYY-MM-DD")
+    p.add_argument("--end", help="YYYY-MM-DD (taken from the template's length with --template)")
+    p.add_argument("--template", type=int, help="copy this template project's tasks, shifted to --start")
+    p.add_argument("--member", action="append", default=[], help="viewer email (repeatable)")
+    p.add_argument("--public", action="store_true")
+    p.add_argument("--pin")
+    p.set_defaults(fn=cmd_create_project)
+
+    p = sub.add_parser("import", help="add tasks/subtasks from an export-format CSV or NDJSON file")
+    p.add_argument("project", type=int)
+    p.add_argument("file", help="path, or '-' for CSV on stdin")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(fn=cmd_import)
+
+    p = sub.add_parser("export", help="stream tasks/subtasks to CSV, Parquet or NDJSON")
+    export.add_arguments(p)
+    p.add_argument("--split-dir", help="write one file per project into this directory (in parallel)")
+    p.set_defaults(fn=cmd_export)
+
+    p = sub.add_parser("members-sync", help="set members from a CSV with email[,role][,project_id]")
+    p.add_argument("file")
+    p.add_argument("-p", "--project", type=int, help="project for rows without project_id")
+    p.add_argument("--role", default="viewer", choices=["viewer", "editor"], help="role for rows without one")
+    p.add_argument("--remove-missing", action="store_true", help="drop editors/viewers not in the file")
+    p.set_defaults(fn=cmd_members_sync)
+
+    p = sub.add_parser("clone", help="copy a project with its tasks, subtasks and members; print the new id")
+    p.add_argument("source", type=int)
+    p.add_argument("--name", required=True)
+    p.add_argument("--owner", help="owner of the copy (default: source owner)")
+    p.add_argument("--shift-days", type=int, default=0, help="move every date by this many days")
+    p.add_argument("--no-members", action="store_true")
+    p.set_defaults(fn=cmd_clone)
+
+    p = sub.add_parser("purge", help="delete projects and everything in them")
+    p.add_argument("projects", type=int, nargs="+")
+    p.add_argument("--yes", action="store_true")
+    p.set_defaults(fn=cmd_purge)
+
+    p = sub.add_parser("backup", help="online copy of the SQLite database while the app runs")
+    p.add_argument("dest", help="file, or directory for timestamped copies")
+    p.add_argument("--pages", type=int, default=1024, help="pages copied per step (writers get in between)")
+    p.add_argument("--keep", type=int, help="with a directory: keep only the newest N copies")
+    p.set_defaults(fn=cmd_backup)
+
+    p = sub.add_parser("snapshot", help="write projects as versioned gzip NDJSON snapshots")
+    p.add_argument("projects", type=int, nargs="+")
+    p.add_argument("-o", "--out", required=True,
+                   help=f"file for one project, else a directory of project<id>{backup.SNAPSHOT_SUFFIX} files")
+    p.set_defaults(fn=cmd_snapshot)
+
+    p = sub.add_parser("restore", help="create a project from a snapshot file, print its id")
+    p.add_argument("file")
+    p.add_argument("--owner", help="owner of the new project (default: the snapshot's owner)")
+    p.add_argument("--name", help="name of the new project (default: the snapshot's)")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.set_defaults(fn=cmd_restore)
+
+    p = sub.add_parser("notify", help="queue due-date notices and send pending digests")
+    p.add_argument("--smtp", help="transport URL, e.g. smtp://localhost:1025 (default: STRIVIO_SMTP_URL, "
+                                  "SendGrid relay with SENDGRID_API_KEY, else log only)")
+    p.add_argument("--now", action="store_true", help="ignore the digest coalescing delay")
+    p.add_argument("--loop", type=int, metavar="SECONDS", help="keep running, one pass every SECONDS")
+    p.set_defaults(fn=cmd_notify)
+
+    p = sub.add_parser("feeds", help="serve read-only ICS/JSON feeds, or print a feed link")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=int(os.getenv("STRIVIO_FEED_PORT", "8502")))
+    p.add_argument("--link", metavar="EMAIL", help="print a feed link for this user instead of serving")
+    p.add_argument("-p", "--project", type=int, help="with --link: one project's feed (default: the user's)")
+    p.add_argument("-f", "--format", choices=["ics", "json"], default="ics")
+    p.set_defaults(fn=cmd_feeds)
+
+    p = sub.add_parser("maintenance", help="housekeeping tasks")
+    p.add_argument("task", choices=["backfill-stats", "prune-tombstones", "prune-activity",
+                                    "prune-notifications", "prune-auth", "scan-due", "materialize-recurrences",
+                                    "rebuild-search", "archive"])
+    p.add_argument("--keep-days", type=int,
+                   help="retention window (default: 30 for tombstones, STRIVIO_ACTIVITY_RETENTION_DAYS for activity, "
+                        "STRIVIO_ARCHIVE_AFTER_DAYS for finished tasks in open projects)")
+    p.set_defaults(fn=cmd_maintenance)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    db.set_route_key("cli")   # read our own writes even with a replica configured
+    db.set_actor(os.getenv("STRIVIO_ACTOR") or f"cli:{os.getenv('USER', 'admin')}")
+    if args.command != "init":
+        db.init_db()
+    try:
+        return args.fn(args)
+    except ValueError as e:
+        parser.exit(2, f"{parser.prog}: error: {e}\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
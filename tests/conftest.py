@@ -0,0 +1,36 @@
+# Test setup: a throwaway SQLite database, chosen before any repo module imports db.
+
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+_TMP = tempfile.mkdtemp(prefix="strivio-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/strivio.db"
+os.environ["AUTH_ENABLED"] = "false"
+os.environ["STRIVIO_FEED_KEY"] = "feed-key-for-tests-only-" + "0" * 16
+os.environ["STRIVIO_ARTIFACT_DIR"] = os.path.join(_TMP, "artifacts")
+
+import db  # noqa: E402
+
+db.init_db()
+
+
+@pytest.fixture
+def owner() -> str:
+    """A fresh user per test, so projects and memberships never leak between tests."""
+    email = f"owner-{uuid4().hex[:8]}@example.com"
+    db.login(email)
+    return email
+
+
+@pytest.fixture
+def project(owner) -> int:
+    """Public project (no PIN) running through 2026."""
+    return db.create_project(owner, "Test project", date(2026, 1, 1), date(2026, 12, 31), is_public=True)
@@ -0,0 +1,92 @@
+import contextvars
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import activity
+import db
+
+
+@pytest.fixture(autouse=True)
+def quick_flush(monkeypatch):
+    """Write batches right away instead of waiting up to a second for more entries."""
+    monkeypatch.setattr(db.activity_writer, "flush_interval", 0.01)
+
+
+def _log(pid):
+    assert db.activity_writer.flush()
+    return db.get_activity(pid, limit=100)
+
+
+def test_writes_are_logged_with_actor_and_field_changes(owner, project):
+    def edit():
+        db.set_actor(owner.upper())
+        tid = db.add_or_update_task(project, "Spec", "To-Do", date(2026, 2, 1), date(2026, 2, 5), None)
+        db.add_or_update_task(project, "Spec", "Done", date(2026, 2, 1), date(2026, 2, 5), owner,
+                              task_id=tid, progress=100)
+        return tid
+
+    tid = contextvars.copy_context().run(edit)
+    update, create = [e for e in _log(project) if (e["item_kind"], e["item_id"]) == ("task", tid)]
+    assert (create["action"], create["summary"], create["actor"]) == ("task.create", "Spec", owner)
+    assert update["action"] == "task.update"
+    assert update["summary"] == f"Spec: status: To-Do -> Done; assignee: - -> {owner}; progress: 0 -> 100"
+
+
+def test_rolled_back_writes_leave_no_entries(owner, project):
+    before = _log(project)
+    with pytest.raises(ValueError):
+        db.save_task_edits(project, [
+            {"name": "Fine", "status": "To-Do", "start": None, "end": None, "assignee_email": None},
+            {"name": "Bad", "status": "To-Do", "start": None, "end": None, "assignee_email": "x@example.com"},
+        ])
+    assert _log(project) == before
+
+
+def test_pages_by_id_newest_first(owner, project):
+    for n in range(5):
+        db.add_or_update_task(project, f"T{n}", "To-Do", None, None, None)
+    everything = _log(project)
+    first = db.get_activity(project, limit=3)
+    rest = db.get_activity(project, limit=100, before_id=first[-1]["id"])
+    assert first + rest == everything
+    assert [e["id"] for e in everything] == sorted((e["id"] for e in everything), reverse=True)
+
+
+def test_writer_batches_inserts(project):
+    writer = activity.ActivityWriter(db.engine, db.ActivityEntry.__table__, batch_size=3, flush_interval=0.05)
+    inserts = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO activity_log"):
+            inserts.append(statement)
+
+    assert db.activity_writer.flush()   # the project's own entries are written already
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        writer.submit([activity.entry(project, "test.batch", "task", n) for n in range(7)])
+        assert writer.flush()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+        writer.close()
+    assert len(inserts) == 3   # 3 + 3 + 1
+    assert sum(e["action"] == "test.batch" for e in _log(project)) == 7
+
+
+def test_full_queue_drops_instead_of_blocking(project, monkeypatch):
+    writer = activity.ActivityWriter(db.engine, db.ActivityEntry.__table__, max_queue=2)
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)   # nobody drains the queue
+    writer.submit([activity.entry(project, "test.drop", "task", n) for n in range(5)])
+    assert writer.dropped == 3
+
+
+def test_prune_removes_only_old_entries(owner, project):
+    db.add_or_update_task(project, "Recent", "To-Do", None, None, None)
+    old = _log(project)[-1]["id"]
+    with db.SessionLocal() as s:
+        s.get(db.ActivityEntry, old).created_at = datetime.utcnow() - timedelta(days=400)
+        s.commit()
+    assert db.prune_activity(keep_days=365, chunk=1) >= 1
+    assert old not in {e["id"] for e in _log(project)}
+    assert _log(project)
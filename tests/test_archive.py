@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+
+import db
+
+TODAY = date(2026, 6, 1)
+
+
+def _portfolio(owner, pid):
+    (row,) = [r for r in db.get_portfolio_for_user(owner, today=TODAY) if r["id"] == pid]
+    return {k: row[k] for k in ("items", "done", "overdue", "progress", "first_start", "last_end")}
+
+
+@pytest.fixture
+def ended(owner):
+    """Finished project: every Done task is old enough to archive."""
+    pid = db.create_project(owner, "Last year", date(2025, 1, 1), date(2025, 12, 31), is_public=True)
+    a = db.add_or_update_task(pid, "Shipped zebra", "Done", date(2025, 1, 5), date(2025, 2, 1), owner, progress=100)
+    db.add_or_update_subtask(a, "Zebra docs", "Done", None, None, None, progress=100)
+    b = db.add_or_update_task(pid, "Done but linked", "Done", date(2025, 3, 1), date(2025, 3, 9), None, progress=100)
+    c = db.add_or_update_task(pid, "Still open", "In Progress", date(2025, 3, 10), date(2025, 4, 1), None,
+                              progress=40)
+    db.add_task_dependency(b, c)
+    return pid, a, b, c
+
+
+def test_archive_keeps_stats_and_restore_brings_it_back(owner, ended):
+    pid, a, b, c = ended
+    before = _portfolio(owner, pid)
+    tree = db.apply_changes(None, db.changes_since(pid, 0))
+    assert db.search_items("zebra", project_id=pid)["results"]
+
+    moved = db.archive_items(pid, today=TODAY)
+    assert moved == {"task": 1, "subtask": 1}   # b stays: it is linked to an open task
+    assert {t["id"] for t in db.get_tasks_for_project(pid)} == {b, c}
+    assert _portfolio(owner, pid) == before
+
+    rollup = db.get_archive_rollup(pid)
+    assert (rollup["tasks"], rollup["subtasks"], rollup["task_progress"]) == (1, 1, 100.0)
+    assert rollup["first_start"] == date(2025, 1, 5)
+    (archived,) = db.get_archived_tasks(pid)
+    assert (archived["name"], archived["subtasks"], archived["assignee_email"]) == ("Shipped zebra", 1, owner)
+
+    delta = db.changes_since(pid, tree["revision"])
+    assert a in delta["deleted"]["task"]
+    assert a not in db.apply_changes(tree, delta)["tasks"]
+    assert not db.search_items("zebra", project_id=pid)["results"]
+    assert db.archive_items(pid, today=TODAY) == {"task": 0, "subtask": 0}
+
+    restored = db.restore_archived_task(archived["id"])
+    (sub,) = db.get_subtasks_for_task(restored)
+    assert sub["name"] == "Zebra docs"
+    assert db.get_archived_tasks(pid) == []
+    assert db.get_archive_rollup(pid)["tasks"] == 0
+    assert _portfolio(owner, pid) == before
+
+
+def test_recent_and_unfinished_work_stays(owner, project):
+    old = db.add_or_update_task(project, "Old", "Done", date(2026, 1, 2), date(2026, 1, 10), None)
+    db.add_or_update_task(project, "Recent", "Done", date(2026, 5, 1), date(2026, 5, 20), None)
+    open_sub = db.add_or_update_task(project, "Open subtask", "Done", date(2026, 1, 2), date(2026, 1, 10), None)
+    db.add_or_update_subtask(open_sub, "Left over", "To-Do", None, None, None)
+    assert db.archive_items(project, older_than_days=90, today=TODAY) == {"task": 1, "subtask": 0}
+    assert [t["name"] for t in db.get_archived_tasks(project)] == ["Old"]
+    assert old not in {t["id"] for t in db.get_tasks_for_project(project)}
+
+
+def test_linked_groups_archive_together(owner):
+    pid = db.create_project(owner, "Chains", date(2025, 1, 1), date(2025, 6, 30), is_public=True)
+    done = [db.add_or_update_task(pid, f"D{i}", "Done", date(2025, 1, 1), date(2025, 1, 2), None)
+            for i in range(6)]
+    still = db.add_or_update_task(pid, "Open", "To-Do", date(2025, 1, 1), date(2025, 1, 2), None)
+    for p, s in ((done[0], done[1]), (done[1], done[2]), (done[3], done[2]), (done[3], still), (done[4], done[5])):
+        db.add_task_dependency(p, s)
+    # D0..D3 reach the open task through the links: only the D4 -> D5 group goes
+    assert db.archive_items(pid, today=TODAY) == {"task": 2, "subtask": 0}
+    assert {t["name"] for t in db.get_archived_tasks(pid)} == {"D4", "D5"}
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import auth
+import db
+
+
+def _flip(token):
+    body, sig = token.split(".")
+    return f"{body}.{'A' if sig[0] != 'A' else 'B'}{sig[1:]}"
+
+
+def test_decode_round_trip(owner):
+    claims = auth.issue(db.login(owner))
+    assert auth.decode(auth.encode(claims)) == claims
+
+
+def test_decode_rejects_forged_tokens(owner):
+    claims = auth.issue(db.login(owner))
+    token = auth.encode(claims)
+    other_key = auth.encode(claims, key="some-other-key-" + "x" * 32)
+    body = auth.encode({**claims, "uid": claims["uid"] + 1}).split(".")[0]
+    for forged in (_flip(token), other_key, f"{body}.{token.split('.')[1]}", "", None, "a.b.c", "nodot"):
+        assert auth.decode(forged) is None
+
+
+def test_decode_rejects_expired_and_other_purposes(owner):
+    claims = {**auth.issue(db.login(owner)), "exp": time.time() - 1}
+    assert auth.decode(auth.encode(claims)) is None
+    fresh = auth.issue(db.login(owner))
+    assert auth.decode(auth.encode(fresh, purpose="feed")) is None
+    assert auth.decode(auth.encode(fresh), purpose="feed") is None
+
+
+def test_revoked_token_is_invalid(owner):
+    claims = auth.issue(db.login(owner))
+    assert auth.is_valid(claims)
+    auth.revoke(claims)
+    assert not auth.is_valid(claims)
+
+
+def test_user_of_reloads_from_the_database(owner):
+    user = db.login(owner)
+    claims = {**auth.issue(user), "name": "Mallory", "roles": {"1": ["owner", time.time() + 1e6]}}
+    assert auth.user_of(claims) == user
+    assert claims["roles"] == {} and claims["name"] == user["name"]
+    assert auth.user_of({**claims, "email": "someone-else@example.com"}) is None
+    assert auth.user_of({**claims, "uid": 10 ** 9}) is None
+
+
+@pytest.mark.parametrize("key, ok", [(None, False), ("changeme", False), ("short", False), ("k" * 32, True)])
+def test_enabled_auth_refuses_weak_cookie_keys(key, ok):
+    env = {**os.environ, "AUTH_ENABLED": "true"}
+    env.pop("AUTH_COOKIE_KEY", None)
+    if key is not None:
+        env["AUTH_COOKIE_KEY"] = key
+    done = subprocess.run([sys.executable, "-c", "import auth"], cwd=Path(auth.__file__).parent,
+                          env=env, capture_output=True, text=True)
+    assert (done.returncode == 0) is ok, done.stderr[-500:]
+    if not ok:
+        assert "AUTH_COOKIE_KEY" in done.stderr
@@ -0,0 +1,99 @@
+import gzip
+import io
+import json
+from datetime import date
+
+import pytest
+
+import backup
+import db
+import recurrence
+
+TODAY = date(2026, 6, 1)
+
+
+def _content(pid):
+    """Project contents with ids replaced by names, comparable across projects."""
+    tasks = {t["id"]: t for t in db.get_tasks_for_project(pid)}
+    names = {i: t["name"] for i, t in tasks.items()}
+    return {
+        "tasks": sorted((t["name"], t["status"], t["start_date"], t["end_date"], t["progress"],
+                         t["description"], t["assignee_email"],
+                         sorted((s["name"], s["status"], s["progress"]) for s in db.get_subtasks_for_task(i)))
+                        for i, t in tasks.items()),
+        "links": sorted((names[d["predecessor_id"]], names[d["successor_id"]], d["lag_days"])
+                        for d in db.get_dependencies_for_project(pid)),
+        "series": sorted((r["name"], r["rule"]) for r in db.get_recurrences_for_project(pid)),
+        "archived": sorted((a["name"], a["subtasks"]) for a in db.get_archived_tasks(pid)),
+        "rollup": db.get_archive_rollup(pid),
+    }
+
+
+@pytest.fixture
+def filled(owner):
+    pid = db.create_project(owner, "Snapshot me", date(2026, 1, 1), date(2026, 12, 31), is_public=True)
+    db.set_member_role(pid, "member@example.com", "editor")
+    a = db.add_or_update_task(pid, "Design", "Done", date(2026, 1, 5), date(2026, 1, 20), owner,
+                              description="Ünïcode, \"quotes\"\nand lines", progress=100)
+    b = db.add_or_update_task(pid, "Build", "In Progress", date(2026, 1, 21), date(2026, 3, 1),
+                              "member@example.com", progress=35)
+    db.add_or_update_subtask(b, "API", "Done", date(2026, 1, 21), date(2026, 2, 1), None, progress=100)
+    db.add_or_update_subtask(b, "UI", "To-Do", None, None, "member@example.com")
+    db.add_task_dependency(a, b, lag_days=1)
+    db.add_recurring_task(pid, "Weekly sync", recurrence.build_rule("WEEKLY", weekdays=["MO"]),
+                          date(2026, 5, 4), today=TODAY)
+    old = db.add_or_update_task(pid, "Kickoff", "Done", date(2026, 1, 1), date(2026, 1, 2), None, progress=100)
+    db.add_or_update_subtask(old, "Invite", "Done", None, None, None, progress=100)
+    db.archive_items(pid, older_than_days=30, today=TODAY)
+    return pid
+
+
+def test_snapshot_round_trip(tmp_path, owner, filled):
+    path = tmp_path / f"p{filled}{backup.SNAPSHOT_SUFFIX}"
+    n = backup.write_snapshot(filled, path, batch_size=2)
+    records = list(backup.read_snapshot(path))
+    assert len(records) == n
+    kinds = [r["type"] for r in records]
+    assert kinds[0] == "project"
+    assert [k for k in db.SNAPSHOT_KINDS if k in kinds] == sorted(set(kinds), key=kinds.index)
+
+    restored = backup.restore_snapshot(path, owner_email=owner, name="Restored", batch_size=2)
+    assert restored != filled
+    assert db.get_project(restored).name == "Restored"
+    assert _content(restored) == _content(filled)
+    assert db.get_user_role(restored, "member@example.com") == "editor"
+    assert db.get_user_role(restored, owner) == "owner"
+
+
+def test_snapshot_streams_to_file_objects(owner, filled):
+    buf = io.BytesIO()
+    backup.write_snapshot(filled, buf)
+    buf.seek(0)
+    restored = backup.restore_snapshot(buf, owner_email=owner)
+    assert _content(restored) == _content(filled)
+
+
+def test_foreign_and_newer_files_are_refused(tmp_path):
+    foreign = tmp_path / "foreign.ndjson.gz"
+    with gzip.open(foreign, "wt") as fh:
+        fh.write(json.dumps({"format": "something-else"}) + "\n")
+    newer = tmp_path / "newer.ndjson.gz"
+    with gzip.open(newer, "wt") as fh:
+        fh.write(json.dumps({"format": backup.SNAPSHOT_FORMAT, "version": backup.SNAPSHOT_VERSION + 1}) + "\n")
+    plain = tmp_path / "plain.ndjson.gz"
+    plain.write_text("not gzip")
+    for path in (foreign, newer, plain):
+        with pytest.raises(ValueError):
+            list(backup.read_snapshot(path))
+
+
+def test_online_backup_rotation(tmp_path, project):
+    dest = tmp_path / "backups"
+    dest.mkdir()
+    first = backup.online_backup(dest, pages=1)
+    assert first.is_file() and first.stat().st_size > 0
+    for name in ("strivio-20000101-000000.db", "strivio-20000102-000000.db"):
+        (dest / name).write_bytes(b"")
+    backup.online_backup(dest / "single.db")
+    backup.online_backup(dest, keep=2)
+    assert len(list(dest.glob("strivio-*.db"))) == 2 and (dest / "single.db").is_file()
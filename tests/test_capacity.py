@@ -0,0 +1,64 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import capacity
+
+
+def _naive(assignees, starts, ends, weights):
+    load = {}
+    for who, s, e, w in zip(assignees, starts, ends, weights):
+        if who is None or s is None or e is None:
+            continue
+        for i in range(max((e - s).days, 0) + 1):
+            day = s + timedelta(days=i)
+            load[(who, day)] = load.get((who, day), 0.0) + w
+    return load
+
+
+def test_difference_arrays_match_a_day_by_day_count():
+    rng = random.Random(7)
+    who = [rng.choice(["a@x", "b@x", "c@x", None]) for _ in range(300)]
+    starts = [date(2026, 1, 1) + timedelta(days=rng.randrange(120)) for _ in who]
+    ends = [s + timedelta(days=rng.randrange(-3, 30)) for s in starts]   # some end before they start
+    ends[5] = None
+    weights = [rng.choice([0.5, 1.0, 2.0]) for _ in who]
+
+    labels, days, matrix = capacity.allocation_matrix(who, starts, ends, weights)
+    expected = _naive(who, starts, ends, weights)
+    assert list(labels) == ["a@x", "b@x", "c@x"]
+    got = {(labels[i], days[d].astype(date)): matrix[i, d]
+           for i, d in zip(*np.nonzero(matrix))}
+    assert got.keys() == expected.keys()
+    assert all(abs(got[k] - expected[k]) < 1e-9 for k in expected)
+
+
+def test_weekly_peak_takes_the_busiest_day_of_each_monday_week():
+    days = np.datetime64("2026-03-04") + np.arange(12)   # Wednesday .. Sunday of the next week
+    matrix = np.array([[1, 3, 0, 0, 2, 1, 5, 0, 0, 4, 0, 0]], dtype=float)
+    starts, peaks = capacity.weekly_peak(days, matrix)
+    assert [str(d) for d in starts] == ["2026-03-02", "2026-03-09"]
+    assert all(pd.Timestamp(d).dayofweek == 0 for d in starts)
+    assert peaks.tolist() == [[3, 5]]
+
+
+def test_over_allocation_lists_only_overloaded_assignees():
+    labels, days, matrix = capacity.allocation_matrix(
+        ["a@x", "a@x", "b@x"],
+        [date(2026, 5, 1), date(2026, 5, 3), date(2026, 5, 1)],
+        [date(2026, 5, 4), date(2026, 5, 6), date(2026, 5, 10)])
+    over = capacity.over_allocation(labels, days, matrix)
+    assert over.to_dict("records") == [{"Assignee": "a@x", "Days over": 2, "Peak load": 2.0,
+                                        "First day": np.datetime64("2026-05-03"),
+                                        "Last day": np.datetime64("2026-05-04")}]
+    assert capacity.over_allocation(labels, days, matrix, capacity=2.0).empty
+
+
+def test_capacity_frame_skips_done_items_unless_asked():
+    items = pd.DataFrame({"assignee_email": ["a@x", "a@x"], "status": ["Done", "To-Do"],
+                          "start_date": [date(2026, 5, 1)] * 2, "end_date": [date(2026, 5, 2)] * 2})
+    assert capacity.capacity_frame(items)[2].max() == 1
+    assert capacity.capacity_frame(items, include_done=True)[2].max() == 2
+    assert capacity.capacity_frame(items.iloc[:0])[2].size == 0
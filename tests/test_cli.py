@@ -0,0 +1,67 @@
+import contextvars
+from datetime import date
+
+import pytest
+
+import db
+import export
+import strivio
+
+
+def _cli(capsys, *argv) -> str:
+    """Run `python -m strivio ...` in its own context (it sets the route key and actor); return stdout."""
+    capsys.readouterr()
+    assert contextvars.copy_context().run(strivio.main, [str(a) for a in argv]) == 0
+    return capsys.readouterr().out
+
+
+def test_create_project_and_round_trip_through_export_and_import(capsys, tmp_path, owner, project):
+    t = db.add_or_update_task(project, "Design", "In Progress", None, None, owner, progress=30)
+    db.add_or_update_subtask(t, "Sketch", "Done", None, None, None, progress=100)
+    db.add_or_update_task(project, "Build", "To-Do", None, None, None)
+    dump = tmp_path / "items.ndjson"
+    export.export_projects([project], "ndjson", dump)
+
+    pid = int(_cli(capsys, "create-project", "--owner", owner, "--name", "Copy", "--start", "2026-01-01",
+                   "--end", "2026-06-30", "--public"))
+    _cli(capsys, "import", pid, dump, "--batch-size", 1)
+    tree = db.apply_changes(None, db.changes_since(pid, 0))
+    assert sorted(t["name"] for t in tree["tasks"].values()) == ["Build", "Design"]
+    (sub,) = tree["subtasks"].values()
+    design = next(t for t in tree["tasks"].values() if t["name"] == "Design")
+    assert (sub["name"], sub["task_id"], sub["progress"]) == ("Sketch", design["id"], 100.0)
+
+    listed = _cli(capsys, "projects", "-u", owner).splitlines()
+    assert listed[0] == "id,name,start_date,end_date"
+    assert {int(line.split(",")[0]) for line in listed[1:]} == {project, pid}
+
+
+def test_members_sync_from_csv(capsys, tmp_path, owner, project):
+    other = db.create_project(owner, "Other", date(2026, 1, 1), date(2026, 12, 31), is_public=True)
+    rows = tmp_path / "members.csv"
+    rows.write_text("email,role,project_id\n"
+                    f"Ann@Example.com,editor,{project}\n"
+                    "bob@example.com,,\n"
+                    f"cat@example.com,viewer,{other}\n")
+    _cli(capsys, "members-sync", rows, "-p", project)
+    roles = {m["email"]: m["role"] for m in db.changes_since(project, 0)["members"]}
+    assert roles == {owner: "owner", "ann@example.com": "editor", "bob@example.com": "viewer"}
+    assert {m["email"] for m in db.changes_since(other, 0)["members"]} == {owner, "cat@example.com"}
+
+    rows.write_text("email\nbob@example.com\n")
+    _cli(capsys, "members-sync", rows, "-p", project, "--role", "editor", "--remove-missing")
+    roles = {m["email"]: m["role"] for m in db.changes_since(project, 0)["members"]}
+    assert roles == {owner: "owner", "bob@example.com": "editor"}
+
+
+def test_errors_exit_without_changes(capsys, tmp_path, project):
+    with pytest.raises(SystemExit) as exit_:
+        contextvars.copy_context().run(strivio.main, ["purge", str(project)])   # needs --yes
+    assert exit_.value.code == 2 and "--yes" in capsys.readouterr().err
+    assert db.get_project(project) is not None
+
+    bad = tmp_path / "bad.csv"
+    bad.write_text("type,id,parent_id,name,status\ntask,1,,Fine,To-Do\ntask,2,,Broken,Someday\n")
+    with pytest.raises(SystemExit):
+        contextvars.copy_context().run(strivio.main, ["import", str(project), str(bad)])
+    assert db.changes_since(project, 0)["tasks"] == []   # one transaction: the good row went too
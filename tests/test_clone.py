@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+import db
+
+
+def _shape(pid):
+    """Tasks by name with their subtasks and dependencies, ids replaced by names."""
+    tasks = {t["id"]: t for t in db.get_tasks_for_project(pid)}
+    names = {i: t["name"] for i, t in tasks.items()}
+    return (
+        {t["name"]: (t["status"], t["start_date"], t["end_date"],
+                     sorted(s["name"] for s in db.get_subtasks_for_task(i)))
+         for i, t in tasks.items()},
+        sorted((names[d["predecessor_id"]], names[d["successor_id"]], d["lag_days"])
+               for d in db.get_dependencies_for_project(pid)),
+    )
+
+
+def test_clone_keeps_subtasks_and_links_on_the_right_tasks(project, owner):
+    ids = [db.add_or_update_task(project, f"T{i}", "To-Do", date(2026, 3, 1) + timedelta(days=i),
+                                 date(2026, 3, 4) + timedelta(days=i), None) for i in range(12)]
+    # delete a few so source ids have gaps, then add more after them
+    for tid in ids[2:5]:
+        db.delete_task(tid)
+    ids = ids[:2] + ids[5:] + [db.add_or_update_task(project, "Late", "Done", None, None, None)]
+    for n, tid in enumerate(ids):
+        for k in range(n % 3):
+            db.add_or_update_subtask(tid, f"T{n}.{k}", "To-Do", None, None, None)
+    for n, (p, s) in enumerate(zip(ids, ids[1:])):
+        db.add_task_dependency(p, s, lag_days=n % 4)
+
+    clone = db.clone_project(project, "Copy", shift_days=0)
+    assert _shape(clone) == _shape(project)
+    assert not set(t["id"] for t in db.get_tasks_for_project(clone)) & set(ids)
+
+
+def test_clone_shifts_dates(project):
+    db.add_or_update_task(project, "Kickoff", "To-Do", date(2026, 1, 30), date(2026, 2, 2), None)
+    clone = db.clone_project(project, "Next year", shift_days=365)
+    (task,) = db.get_tasks_for_project(clone)
+    assert (task["start_date"], task["end_date"]) == (date(2027, 1, 30), date(2027, 2, 2))
+    assert db.get_project(clone).start_date == date(2027, 1, 1)
+
+
+def test_clone_of_empty_project(project):
+    clone = db.clone_project(project, "Empty copy")
+    assert db.get_tasks_for_project(clone) == []
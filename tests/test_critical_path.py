@@ -0,0 +1,101 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from critical_path import CycleError, ScheduleGraph
+
+ORIGIN = date(2026, 1, 1)
+
+
+def _tasks(n, rng):
+    out = []
+    for i in range(1, n + 1):
+        start = ORIGIN + timedelta(days=rng.randrange(60))
+        out.append({"id": i, "start_date": start, "end_date": start + timedelta(days=rng.randrange(1, 15))})
+    return out
+
+
+def _deps(n, rng, k):
+    # edges only from lower to higher ids: always a DAG
+    pairs = {tuple(sorted(rng.sample(range(1, n + 1), 2))) for _ in range(k)}
+    return [{"predecessor_id": p, "successor_id": s, "lag_days": rng.randrange(3)} for p, s in sorted(pairs)]
+
+
+def _reaches(g, a, b):
+    stack, seen = [a], {a}
+    while stack:
+        n = stack.pop()
+        if n == b:
+            return True
+        for m in g.succ[n]:
+            if m not in seen:
+                seen.add(m)
+                stack.append(m)
+    return False
+
+
+def _state(g):
+    return g.es, g.ef, g.ls, g.lf, g.finish
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_updates_match_full_recompute(seed):
+    rng = random.Random(seed)
+    tasks, deps = _tasks(40, rng), _deps(40, rng, 80)
+    g = ScheduleGraph.build(ORIGIN, tasks, deps)
+    for _ in range(50):
+        t = rng.choice(tasks)
+        start = ORIGIN + timedelta(days=rng.randrange(90))
+        t["start_date"], t["end_date"] = start, start + timedelta(days=rng.randrange(1, 20))
+        g.update_task(t["id"], t["start_date"], t["end_date"])
+        assert _state(g) == _state(ScheduleGraph.build(ORIGIN, tasks, deps))
+
+
+def test_sync_tasks_only_rewalks_moved_tasks():
+    rng = random.Random(7)
+    tasks, deps = _tasks(20, rng), _deps(20, rng, 30)
+    g = ScheduleGraph.build(ORIGIN, tasks, deps)
+    assert g.sync_tasks(tasks) == set()
+    tasks[0]["end_date"] += timedelta(days=30)
+    assert g.sync_tasks(tasks)
+    assert _state(g) == _state(ScheduleGraph.build(ORIGIN, tasks, deps))
+
+
+def test_dependency_edits_match_full_recompute():
+    rng = random.Random(11)
+    tasks = _tasks(15, rng)
+    deps = _deps(15, rng, 10)
+    g = ScheduleGraph.build(ORIGIN, tasks, deps)
+
+    # an edge against the current order (forces a reorder) that closes no cycle
+    p, s_ = next((p, s_) for p in range(15, 1, -1) for s_ in range(1, p)
+                 if p in g.order[g.pos[s_]:] and not _reaches(g, s_, p))
+    g.add_dependency(p, s_, 2)
+    deps.append({"predecessor_id": p, "successor_id": s_, "lag_days": 2})
+    assert _state(g) == _state(ScheduleGraph.build(ORIGIN, tasks, deps))
+
+    gone = deps.pop(0)
+    g.remove_dependency(gone["predecessor_id"], gone["successor_id"])
+    assert _state(g) == _state(ScheduleGraph.build(ORIGIN, tasks, deps))
+
+
+def test_cycles_are_rejected():
+    tasks = [{"id": i, "start_date": ORIGIN, "end_date": ORIGIN + timedelta(days=1)} for i in (1, 2, 3)]
+    g = ScheduleGraph.build(ORIGIN, tasks, [{"predecessor_id": 1, "successor_id": 2},
+                                            {"predecessor_id": 2, "successor_id": 3}])
+    with pytest.raises(CycleError):
+        g.add_dependency(3, 1)
+    with pytest.raises(CycleError):
+        g.add_dependency(2, 2)
+    assert g.edges() == {(1, 2, 0), (2, 3, 0)}
+
+
+def test_chain_is_critical():
+    tasks = [{"id": 1, "start_date": ORIGIN, "end_date": ORIGIN + timedelta(days=3)},
+             {"id": 2, "start_date": ORIGIN, "end_date": ORIGIN + timedelta(days=2)},
+             {"id": 3, "start_date": ORIGIN, "end_date": ORIGIN + timedelta(days=1)}]
+    g = ScheduleGraph.build(ORIGIN, tasks, [{"predecessor_id": 1, "successor_id": 2, "lag_days": 1}])
+    assert g.critical_path() == [1, 2]
+    assert g.projected_finish() == ORIGIN + timedelta(days=6)
+    assert g.schedule()[3]["slack_days"] == 5
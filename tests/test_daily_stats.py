@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+
+import db
+
+TODAY = date.today()
+
+
+def test_writes_record_todays_snapshot(project, owner):
+    db.add_or_update_task(project, "A", "Done", TODAY - timedelta(days=9), TODAY - timedelta(days=5), owner,
+                          progress=100)
+    db.add_or_update_task(project, "B", "In Progress", TODAY - timedelta(days=9), TODAY - timedelta(days=1), None,
+                          progress=50)
+    (row,) = db.get_daily_stats(project)
+    assert row == {"day": TODAY, "todo": 0, "in_progress": 1, "done": 1, "overdue": 1, "mean_progress": 75.0}
+
+
+def test_backfill_carries_counts_and_recomputes_overdue(project, owner):
+    for i, (status, end) in enumerate([("To-Do", 1), ("In Progress", 3), ("Done", 2), ("To-Do", None)]):
+        db.add_or_update_task(project, f"T{i}", status, TODAY, TODAY + timedelta(days=end) if end else None, owner)
+    assert db.backfill_daily_stats(project, today=TODAY + timedelta(days=5)) == 5
+    assert db.backfill_daily_stats(project, today=TODAY + timedelta(days=5)) == 0   # nothing left to fill
+
+    rows = db.get_daily_stats(project)
+    assert [r["day"] for r in rows] == [TODAY + timedelta(days=i) for i in range(6)]
+    with db.SessionLocal() as s:
+        for r in rows:   # same numbers as a fresh count taken on that day
+            expected = db._snapshot_counts(s, project, r["day"])
+            assert (r["todo"], r["in_progress"], r["done"], r["overdue"], r["mean_progress"]) == (
+                expected["todo_count"], expected["in_progress_count"], expected["done_count"],
+                expected["overdue_count"], expected["mean_progress"])
+    assert [r["overdue"] for r in rows] == [0, 0, 1, 1, 2, 2]
+
+
+def test_backfill_starts_after_the_last_snapshot(project):
+    with db.SessionLocal() as s:   # pretend nothing was written for three days
+        s.query(db.ProjectDailyStat).filter_by(project_id=project).update({"day": TODAY - timedelta(days=3)})
+        s.commit()
+    assert db.backfill_daily_stats(project, today=TODAY) == 3
+    assert [r["day"] for r in db.get_daily_stats(project)] == [TODAY - timedelta(days=i) for i in (3, 2, 1, 0)]
@@ -0,0 +1,61 @@
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+import db
+
+TODAY = date.today()   # write-time tracking uses the real date
+
+
+def _names(due):
+    return {k: [r["name"] for r in rows] for k, rows in due.items()}
+
+
+def _expected(pid, horizon):
+    tree = db.apply_changes(None, db.changes_since(pid, 0))
+    hi = TODAY + timedelta(days=horizon)
+    items = [i for i in list(tree["tasks"].values()) + list(tree["subtasks"].values())
+             if i["status"] != "Done" and i["end_date"] is not None and i["end_date"] <= hi]
+    items.sort(key=lambda i: (i["end_date"], "subtask" if "task_id" in i else "task", i["id"]))
+    return {"overdue": [i["name"] for i in items if i["end_date"] < TODAY],
+            "upcoming": [i["name"] for i in items if i["end_date"] >= TODAY]}
+
+
+def test_scan_matches_a_full_pass_over_the_project(owner, project):
+    rng = random.Random(42)
+    for n in range(12):
+        end = rng.choice([None, TODAY + timedelta(days=rng.randrange(-20, 30))])
+        tid = db.add_or_update_task(project, f"T{n}", rng.choice(db.TASK_STATUSES), None, end, owner)
+        if n % 3 == 0:
+            db.add_or_update_subtask(tid, f"T{n}.1", "To-Do", None, TODAY + timedelta(days=n - 6), None)
+    assert db.scan_due_items(TODAY, horizon_days=14, batch_size=2) >= len(_expected(project, 14)["overdue"])
+    assert _names(db.get_due_items(project, today=TODAY, horizon_days=14)) == _expected(project, 14)
+
+
+def test_writes_keep_due_items_exact_between_scans(owner, project):
+    db.scan_due_items(TODAY)
+    late = db.add_or_update_task(project, "Late", "To-Do", None, TODAY - timedelta(days=1), owner)
+    soon = db.add_or_update_task(project, "Soon", "In Progress", None, TODAY + timedelta(days=2), owner)
+    sub = db.add_or_update_subtask(soon, "Soon.1", "To-Do", None, TODAY, None)
+    assert _names(db.get_due_items(project, today=TODAY)) == {"overdue": ["Late"], "upcoming": ["Soon.1", "Soon"]}
+
+    db.add_or_update_task(project, "Late", "Done", None, TODAY - timedelta(days=1), owner, task_id=late)
+    db.add_or_update_task(project, "Soon", "In Progress", None, TODAY + timedelta(days=365), owner, task_id=soon)
+    db.delete_subtask(sub)
+    assert _names(db.get_due_items(project, today=TODAY)) == {"overdue": [], "upcoming": []}
+
+
+def test_scan_drops_rows_changed_behind_the_orm(owner, project):
+    tid = db.add_or_update_task(project, "Raw", "To-Do", None, TODAY - timedelta(days=3), owner)
+    with db.engine.begin() as conn:
+        conn.execute(text("UPDATE tasks SET status = 'Done' WHERE id = :id"), {"id": tid})
+    assert _names(db.get_due_items(project, today=TODAY))["overdue"] == ["Raw"]
+    db.scan_due_items(TODAY)
+    assert _names(db.get_due_items(project, today=TODAY))["overdue"] == []
+
+
+def test_ensure_due_scan_runs_once_a_day():
+    day = date(2031, 1, 1)
+    assert db.ensure_due_scan(day)
+    assert not db.ensure_due_scan(day)
@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+from datetime import date
+
+import pyarrow.parquet as pq
+import pytest
+
+import db
+import export
+
+
+@pytest.fixture
+def rows(owner, project):
+    """Five items (3 tasks, 2 subtasks) with text that needs quoting, as export tuples."""
+    a = db.add_or_update_task(project, 'Plan, "phase" 1', "Done", date(2026, 2, 1), date(2026, 2, 5), owner,
+                              description="line one\nline two", progress=100)
+    db.add_or_update_task(project, "Café ☕", "To-Do", None, None, None)
+    db.add_or_update_task(project, "Ship", "In Progress", date(2026, 3, 1), date(2026, 3, 9), owner, progress=40)
+    db.add_or_update_subtask(a, "Draft", "Done", None, date(2026, 2, 3), owner, progress=100)
+    db.add_or_update_subtask(a, "Review", "To-Do", None, None, None)
+    return [r for batch in db.iter_export_rows([project]) for r in batch]
+
+
+def _plain(row):
+    return [None if v is None else str(v) for v in row]
+
+
+def test_csv_and_ndjson_round_trip(project, rows):
+    out = io.BytesIO()
+    assert export.export_projects([project], "csv", out, batch_size=2) == 5
+    header, *body = csv.reader(io.StringIO(out.getvalue().decode("utf-8"), newline=""))
+    assert tuple(header) == db.EXPORT_COLUMNS
+    assert body == [[v or "" for v in _plain(r)] for r in rows]
+
+    out = io.BytesIO()
+    assert export.export_projects([project], "ndjson", out, batch_size=2) == 5
+    lines = [json.loads(line) for line in out.getvalue().decode("utf-8").splitlines()]
+    assert [[line[c] for c in db.EXPORT_COLUMNS] for line in lines] == [
+        [v if isinstance(v, (int, float)) and not isinstance(v, bool) else (None if v is None else str(v))
+         for v in r] for r in rows]
+    assert [r[2] for r in rows] == ["task"] * 3 + ["subtask"] * 2
+
+
+def test_parquet_writes_one_row_group_per_batch(tmp_path, project, rows):
+    path = tmp_path / "out.parquet"
+    assert export.export_projects([project], "parquet", path, batch_size=2) == 5
+    f = pq.ParquetFile(path)
+    assert f.metadata.num_row_groups == 3
+    assert f.schema_arrow.names == list(db.EXPORT_COLUMNS)
+    assert [tuple(r.values()) for r in f.read().to_pylist()] == [tuple(r) for r in rows]
+
+
+def test_progress_is_reported_per_batch(project, rows):
+    seen = []
+    export.export_projects([project], "ndjson", io.BytesIO(), batch_size=2,
+                           progress=lambda frac, msg: seen.append((frac, msg)))
+    assert [f for f, _ in seen] == [0.4, 0.6, 1.0]   # tasks (2 + 1), then subtasks (2)
+    assert seen[-1][1] == "5 of 5 rows"
+
+
+def test_cli_streams_to_stdout_and_rejects_bad_input(capfdbinary, owner, project, rows):
+    assert export.main(["-u", owner, "-f", "ndjson"]) == 0
+    assert len(capfdbinary.readouterr().out.splitlines()) == 5
+    with pytest.raises(SystemExit):
+        export.main(["-p", str(project), "-f", "parquet"])   # parquet needs a file
+    with pytest.raises(ValueError):
+        export.export_projects([project], "xlsx", io.BytesIO())
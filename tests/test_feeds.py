@@ -0,0 +1,75 @@
+import time
+from datetime import date
+
+import pytest
+
+import auth
+import db
+import feeds
+
+
+def _flip(token):
+    body, sig = token.split(".")
+    return f"{body}.{'A' if sig[0] != 'A' else 'B'}{sig[1:]}"
+
+
+def _params(token):
+    return {"token": token}
+
+
+def test_feed_token_resolves(project, owner):
+    user = db.login(owner)
+    claims, pids, _ = feeds._resolve("project", project, _params(feeds.issue_token(user, project)))
+    assert pids == [project] and claims["email"] == owner
+    _, pids, _ = feeds._resolve("me", None, _params(feeds.issue_token(user)))
+    assert project in pids
+
+
+def test_feed_rejects_forged_tokens(project, owner):
+    user = db.login(owner)
+    good = feeds.issue_token(user, project)
+    claims = auth.decode(good, purpose=feeds.TOKEN_PURPOSE, key=feeds.FEED_KEY)
+    forged = [
+        _flip(good),
+        auth.encode(claims, purpose=feeds.TOKEN_PURPOSE),           # signed with the cookie key
+        auth.encode(claims),                                        # a session token
+        auth.encode({**claims, "feed": project + 1}, purpose=feeds.TOKEN_PURPOSE, key="x" * 40),
+        auth.encode({**claims, "exp": time.time() - 1}, purpose=feeds.TOKEN_PURPOSE, key=feeds.FEED_KEY),
+    ]
+    for token in forged:
+        with pytest.raises(feeds.FeedError) as e:
+            feeds._resolve("project", project, _params(token))
+        assert e.value.status == 403
+
+
+def test_feed_link_goes_stale(project, owner):
+    user = db.login(owner)
+    single, personal = feeds.issue_token(user, project), feeds.issue_token(user)
+    with pytest.raises(feeds.FeedError):
+        feeds._resolve("me", None, _params(single))            # wrong feed kind
+    with pytest.raises(feeds.FeedError):
+        feeds._resolve("project", project + 1, _params(single))   # another project
+
+    db.set_project_pin(project, "2468")
+    with pytest.raises(feeds.FeedError):
+        feeds._resolve("project", project, _params(single))
+    _, pids, _ = feeds._resolve("me", None, _params(personal))
+    assert project not in pids
+    _, pids, _ = feeds._resolve("me", None, _params(feeds.issue_token(user)))
+    assert project in pids
+
+
+def test_feed_link_needs_membership(owner):
+    stranger = db.login(f"x-{owner}")
+    pid = db.create_project(owner, "Private", date(2026, 1, 1), date(2026, 2, 1), is_public=True)
+    with pytest.raises(feeds.FeedError):
+        feeds._resolve("project", pid, _params(feeds.issue_token(stranger, pid)))
+
+
+@pytest.mark.parametrize("key", ["", "changeme", "too-short"])
+def test_feed_key_must_be_set(monkeypatch, owner, key):
+    monkeypatch.setattr(feeds, "FEED_KEY", key)
+    with pytest.raises(ValueError):
+        feeds.issue_token(db.login(owner))
+    with pytest.raises(ValueError):
+        feeds.serve("127.0.0.1", 0)
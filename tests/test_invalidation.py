@@ -0,0 +1,62 @@
+import queue
+import time
+from datetime import date, timedelta
+
+import db
+import invalidation
+
+
+def test_commit_evicts_only_the_written_project(owner, project):
+    other = db.create_project(owner, "Other", date(2026, 1, 1), date(2026, 12, 31), is_public=True)
+    for pid in (project, other):
+        db.project_cache.get_or_load(pid, "probe", lambda: "cached")
+    db.add_or_update_task(project, "A", "To-Do", None, None, owner)
+    assert db.project_cache.get_or_load(project, "probe", lambda: "reloaded") == "reloaded"
+    assert db.project_cache.get_or_load(other, "probe", lambda: "reloaded") == "cached"
+
+
+def test_backfill_evicts_like_any_other_write(project):
+    db.project_cache.get_or_load(project, "stats", lambda: "stale")
+    assert db.backfill_daily_stats(project, today=date.today() + timedelta(days=3)) == 3
+    assert db.project_cache.get_or_load(project, "stats", lambda: "fresh") == "fresh"
+
+
+def test_value_loaded_across_an_eviction_is_not_kept():
+    cache = invalidation.ProjectCache()
+
+    def loader():
+        cache.evict([1])   # a write lands while the old value is being read
+        return "old"
+
+    assert cache.get_or_load(1, "k", loader) == "old"
+    assert cache.get_or_load(1, "k", lambda: "new") == "new"
+
+    def clearing_loader():
+        cache.clear()
+        return "old"
+
+    assert cache.get_or_load(2, "k", clearing_loader) == "old"
+    assert cache.get_or_load(2, "k", lambda: "new") == "new"
+
+
+def test_cache_keeps_the_most_recent_projects():
+    cache = invalidation.ProjectCache(max_projects=2)
+    for pid in (1, 2):
+        cache.get_or_load(pid, "k", lambda: pid)
+    cache.get_or_load(1, "k", lambda: "miss")   # touch 1 so 2 is the oldest
+    cache.get_or_load(3, "k", lambda: 3)
+    assert cache.get_or_load(1, "k", lambda: "miss") == 1
+    assert cache.get_or_load(2, "k", lambda: "miss") == "miss"
+
+
+def test_polling_listener_sees_commits_from_other_connections(owner, project):
+    seen = queue.Queue()
+    listener = invalidation.PollingListener(db.engine, seen.put, interval=0.02)
+    listener.start()
+    try:
+        time.sleep(0.1)   # let it read its starting revision first
+        db.add_or_update_task(project, "A", "To-Do", None, None, owner)
+        assert project in seen.get(timeout=5)
+    finally:
+        listener.stop()
+        listener.join(timeout=5)
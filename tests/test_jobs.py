@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import db
+import jobs
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    """Job ids handed to the pool; nothing runs unless the test calls jobs._run itself."""
+    ids = []
+    monkeypatch.setattr(jobs, "_dispatch", ids.append)
+
+    def echo(job, progress):
+        if job["params"].get("fail"):
+            raise RuntimeError("boom")
+        progress(0.5, "halfway")
+        path = jobs.artifact_path(job, "echo.txt")
+        path.write_text(str(job["params"]))
+        return path
+
+    monkeypatch.setitem(jobs._HANDLERS, "echo", echo)
+    return ids
+
+
+def _set(job_id, **fields):
+    jobs._update(job_id, **fields)
+
+
+def test_identical_requests_share_one_job_until_the_project_changes(dispatched, project, owner):
+    a = jobs.submit("echo", project, {"n": 1})
+    assert jobs.submit("echo", project, {"n": 1}) == a
+    assert jobs.submit("echo", project, {"n": 2}) != a
+    db.add_or_update_task(project, "A", "To-Do", None, None, owner)   # new revision, new artifact
+    b = jobs.submit("echo", project, {"n": 1})
+    assert b != a
+    assert dispatched == [a, dispatched[1], b]
+    with pytest.raises(ValueError):
+        jobs.submit("nope", project)
+
+
+def test_a_job_runs_once_and_its_artifact_is_reused(dispatched, project):
+    job_id = jobs.submit("echo", project, {"n": 1})
+    assert jobs._claim(job_id)
+    assert not jobs._claim(job_id)   # a second worker (any replica) backs off
+    _set(job_id, status="queued")
+
+    jobs._run(job_id)
+    jobs._run(job_id)   # already done: not claimed again
+    job = jobs.get_job(job_id)
+    assert (job["status"], job["progress"]) == ("done", 1.0)
+    assert open(job["artifact_path"]).read() == "{'n': 1}"
+    assert jobs.submit("echo", project, {"n": 1}) == job_id
+    assert dispatched == [job_id]
+
+
+def test_failed_job_is_reported_and_retried_as_new_work(dispatched, project):
+    job_id = jobs.submit("echo", project, {"fail": True})
+    jobs._run(job_id)
+    job = jobs.get_job(job_id)
+    assert (job["status"], job["message"]) == ("failed", "boom")
+    assert jobs.submit("echo", project, {"fail": True}) != job_id
+
+
+def test_only_one_active_job_per_request(dispatched, project):
+    job_id = jobs.submit("echo", project, {"n": 1})
+    with db.SessionLocal() as s:
+        key = s.get(db.Job, job_id).dedupe_key
+        s.add(db.Job(kind="echo", project_id=project, dedupe_key=key))
+        with pytest.raises(IntegrityError):
+            s.commit()
+
+
+def test_heartbeat_keeps_a_running_job_fresh(dispatched, project, monkeypatch):
+    monkeypatch.setattr(jobs, "HEARTBEAT_SECONDS", 0.01)
+    job_id = jobs.submit("echo", project)
+    old = datetime.utcnow() - timedelta(hours=1)
+    _set(job_id, status="running", heartbeat_at=old)
+    stop = threading.Event()
+    beat = threading.Thread(target=jobs._heartbeat, args=(job_id, stop))
+    beat.start()
+    try:
+        threading.Event().wait(0.1)
+    finally:
+        stop.set()
+        beat.join()
+    with db.SessionLocal() as s:
+        assert s.get(db.Job, job_id).heartbeat_at > old
+
+
+def test_stale_running_jobs_are_requeued_or_replaced(dispatched, project):
+    stale_at = datetime.utcnow() - jobs.STALE_AFTER - timedelta(minutes=1)
+    fresh = jobs.submit("echo", project, {"n": "fresh"})
+    stale = jobs.submit("echo", project, {"n": "stale"})
+    _set(fresh, status="running", heartbeat_at=datetime.utcnow())
+    _set(stale, status="running", heartbeat_at=stale_at)
+
+    dispatched.clear()
+    jobs.resume_pending()
+    assert stale in dispatched and fresh not in dispatched
+    assert jobs.get_job(stale)["status"] == "queued" and jobs.get_job(fresh)["status"] == "running"
+
+    # a request for the same work replaces a job that stopped beating instead of waiting on it
+    _set(stale, status="running", heartbeat_at=stale_at)
+    again = jobs.submit("echo", project, {"n": "stale"})
+    assert again != stale
+    assert (jobs.get_job(stale)["status"], jobs.get_job(stale)["message"]) == ("failed", "Abandoned")
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+
+import db
+
+
+def _roles(pid):
+    return {m["email"]: m["role"] for m in db.changes_since(pid, 0)["members"]}
+
+
+def _statements(fn):
+    """Statements `fn` runs on this thread (the activity writer shares the engine)."""
+    seen, me = [], threading.get_ident()
+    listener = lambda *args: threading.get_ident() == me and seen.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    return len(seen)
+
+
+def test_bulk_roles_normalise_and_never_touch_the_owner(owner, project):
+    emails = ["A@Example.com", "a@example.com ", "", "b@example.com", owner.upper()]
+    assert db.bulk_set_member_roles(project, emails, "editor") == 3
+    assert _roles(project) == {owner: "owner", "a@example.com": "editor", "b@example.com": "editor"}
+    with pytest.raises(ValueError):
+        db.bulk_set_member_roles(project, ["c@example.com"], "owner")
+    assert db.bulk_set_member_roles(project, [" ", None]) == 0
+
+
+def test_only_changed_memberships_show_up_in_the_next_delta(owner, project):
+    db.bulk_set_member_roles(project, ["a@example.com", "b@example.com"], "viewer")
+    rev = db.changes_since(project, 0)["revision"]
+    db.bulk_set_member_roles(project, ["a@example.com", "b@example.com", "c@example.com"], "viewer")
+    assert [m["email"] for m in db.changes_since(project, rev)["members"]] == ["c@example.com"]
+
+
+def test_statement_count_does_not_grow_with_the_list(owner, project):
+    small = _statements(lambda: db.bulk_set_member_roles(project, [f"s{i}@example.com" for i in range(20)]))
+    large = _statements(lambda: db.bulk_set_member_roles(project, [f"l{i}@example.com" for i in range(800)]))
+    assert large == small
+    assert len(_roles(project)) == 821
@@ -0,0 +1,137 @@
+import email
+import smtplib
+import socketserver
+import threading
+from datetime import date, timedelta
+from uuid import uuid4
+
+import pytest
+
+import db
+import notify
+
+
+class _SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP for smtplib: records messages and how many connections were opened."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPSession)
+        self.messages, self.connections = [], 0
+
+
+class _SMTPSession(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        self.reply("220 stand-in ready")
+        while line := self.rfile.readline():
+            cmd = line.decode("ascii").strip().split(" ")[0].upper()
+            if cmd == "DATA":
+                self.reply("354 go ahead")
+                body = b"".join(iter(self.rfile.readline, b".\r\n"))
+                self.server.messages.append(email.message_from_bytes(body))
+                self.reply("250 queued")
+            elif cmd == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+@pytest.fixture
+def smtp():
+    server = _SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ann() -> str:
+    return f"ann-{uuid4().hex[:8]}@example.com"
+
+
+@pytest.fixture(autouse=True)
+def drained():
+    """Send whatever earlier tests queued, so each test only sees its own digests."""
+    while notify.send_pending(notify.MemoryTransport(), max_recipients=10_000, min_age_minutes=0, rate=0)["digests"]:
+        pass
+
+
+def _assign(project, owner, *names, to):
+    db.bulk_set_member_roles(project, [to], "editor")
+    for n in names:
+        db.add_or_update_task(project, n, "To-Do", date(2026, 3, 1), date(2026, 3, 2), to)
+
+
+def test_one_digest_per_recipient_over_one_smtp_connection(smtp, owner, project, ann):
+    bob = ann.replace("ann-", "bob-")
+    _assign(project, owner, "Alpha", "Beta", to=ann)
+    _assign(project, owner, "Gamma", to=bob)
+    transport = notify.transport_from_url(f"smtp://127.0.0.1:{smtp.server_address[1]}")
+    out = notify.send_pending(transport, min_age_minutes=0, rate=0)
+    transport.close()
+
+    assert out == {"digests": 2, "items": 3, "failed": 0}
+    assert smtp.connections == 1
+    by_to = {m["To"]: m for m in smtp.messages}
+    assert by_to.keys() == {ann, bob}
+    assert by_to[ann]["Subject"] == "Strivio: 2 updates (2 assigned to you)"
+    body = by_to[ann].get_payload()
+    assert "Test project" in body and "Alpha, due 2026-03-02" in body and "Beta" in body
+    assert notify.send_pending(notify.MemoryTransport(), min_age_minutes=0, rate=0)["digests"] == 0
+
+
+def test_recent_items_wait_for_the_digest_delay(owner, project, ann):
+    _assign(project, owner, "Alpha", to=ann)
+    assert notify.send_pending(notify.MemoryTransport(), min_age_minutes=10, rate=0)["digests"] == 0
+    assert notify.send_pending(notify.MemoryTransport(), min_age_minutes=0, rate=0)["digests"] == 1
+
+
+def test_assigning_yourself_sends_nothing(owner, project):
+    db.set_actor(owner)
+    try:
+        db.add_or_update_task(project, "Mine", "To-Do", None, None, owner)
+    finally:
+        db.set_actor(None)
+    assert notify.send_pending(notify.MemoryTransport(), min_age_minutes=0, rate=0)["digests"] == 0
+
+
+class _Failing(notify.Transport):
+    def send(self, msg):
+        raise smtplib.SMTPRecipientsRefused({msg["To"]: (550, b"no such user")})
+
+
+def test_failed_sends_are_retried_then_given_up(owner, project, ann):
+    _assign(project, owner, "Alpha", to=ann)
+    for attempt in range(1, db.NOTIFY_MAX_ATTEMPTS + 1):
+        assert notify.send_pending(_Failing(), min_age_minutes=0, rate=0) == {"digests": 0, "items": 0, "failed": 1}
+    assert notify.send_pending(notify.MemoryTransport(), min_age_minutes=0, rate=0)["digests"] == 0
+    with db.SessionLocal() as s:
+        (n,) = s.query(db.Notification).filter_by(recipient=ann).all()
+        assert (n.status, n.attempts) == ("failed", db.NOTIFY_MAX_ATTEMPTS)
+
+
+def test_due_notices_fire_once_per_due_date(owner, project, ann):
+    today = date(2026, 3, 10)
+    db.bulk_set_member_roles(project, [ann], "editor")
+    db.set_actor(ann)   # self-assigned: only the due notices are queued
+    try:
+        db.add_or_update_task(project, "Late", "To-Do", None, today - timedelta(days=2), ann)
+        db.add_or_update_task(project, "Soon", "To-Do", None, today + timedelta(days=1), ann)
+        db.add_or_update_task(project, "Later", "To-Do", None, today + timedelta(days=9), ann)
+    finally:
+        db.set_actor(None)
+    memory = notify.MemoryTransport()
+    notify.run_once(today=today, transport=memory, min_age_minutes=0, rate=0)
+    (mail,) = [m for m in memory.sent if m["To"] == ann]
+    assert mail["Subject"] == "Strivio: 2 updates (1 overdue, 1 due soon)"
+    assert "Late (due 2026-03-08)" in mail.get_content() and "Later" not in mail.get_content()
+
+    notify.run_once(today=today, transport=memory, min_age_minutes=0, rate=0)
+    assert [m["To"] for m in memory.sent].count(ann) == 1   # same due dates: nothing new
@@ -0,0 +1,59 @@
+import random
+from uuid import uuid4
+
+import db
+import people
+
+
+def _index(users, built):
+    """An index over `users` [(email, name)]; the first `built` are in the sorted keys, the rest in the delta."""
+    index = people.PeopleIndex()
+    index._next_refresh = float("inf")   # no database reads
+    index.ids = list(range(1, built + 1))
+    index.emails = [e for e, _ in users[:built]]
+    index.names = [n for _, n in users[:built]]
+    index._rebuild()
+    index.ids += list(range(built + 1, len(users) + 1))
+    index.emails += [e for e, _ in users[built:]]
+    index.names += [n for _, n in users[built:]]
+    return index
+
+
+def _naive(users, q):
+    prefix = [i for i, (e, n) in enumerate(users, start=1) if any(w.startswith(q) for w in people._words(e, n))]
+    sub = [i for i, (e, n) in enumerate(users, start=1)
+           if len(q) >= 3 and i not in prefix and q in f"{e}\n{n.lower()}"]
+    return set(prefix), set(sub)
+
+
+def test_matches_a_linear_scan():
+    rng = random.Random(47)
+    word = lambda: "".join(rng.choice("abcde") for _ in range(rng.randrange(2, 6)))
+    users = [(f"{word()}.{word()}@{rng.choice(['acme.com', 'example.org'])}",
+              rng.choice(["", f"{word().title()} {word().title()}"])) for _ in range(400)]
+    index = _index(users, built=360)
+    for q in ["a", "ab", "abc", "cde", "bad", "e.a", "acme", "@ex", "zzz", ".", "dd ee"] + [word() for _ in range(40)]:
+        hits = [h["id"] for h in index.search(q, limit=1000)]
+        prefix, sub = _naive(users, q)
+        assert len(hits) == len(set(hits)), q
+        assert set(hits[:len(prefix)]) == prefix and set(hits[len(prefix):]) == sub, q
+
+
+def test_limit_and_blank_queries():
+    users = [(f"user{i}@example.com", "") for i in range(30)]
+    index = _index(users, built=30)
+    assert len(index.search("user", limit=5)) == 5
+    assert index.search("   ") == [] and index.search(None) == []
+    assert index.search("USER1@", limit=1) == [{"id": 2, "email": "user1@example.com", "name": None}]
+
+
+def test_refresh_reads_new_users_by_id():
+    index = people.PeopleIndex()
+    index.refresh(force=True)
+    before = len(index)
+    email = f"zelda-{uuid4().hex[:6]}@example.com"
+    db.login(email, name="Zelda Quux")
+    assert email not in [h["email"] for h in index.search("zelda")]   # not refreshed yet
+    index.refresh(force=True)
+    assert len(index) == before + 1
+    assert [h["email"] for h in index.search("quux")] == [email]
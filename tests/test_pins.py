@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+import db
+import pins
+
+
+@pytest.fixture
+def private(owner) -> int:
+    return db.create_project(owner, "Private", date(2026, 1, 1), date(2026, 12, 31), is_public=False, pin="2468")
+
+
+def _project(pid):
+    with db.SessionLocal() as s:
+        p = s.get(db.Project, pid)
+        return p.pin_hash, p.pin_version
+
+
+def test_legacy_hash_is_upgraded_on_unlock(private):
+    legacy = hashlib.sha256(b"2468").hexdigest()
+    with db.SessionLocal() as s:
+        s.get(db.Project, private).pin_hash = legacy
+        s.commit()
+    db.project_cache.evict([private])
+    _, version = _project(private)
+
+    assert not db.check_project_pin(private, "1357")
+    assert _project(private) == (legacy, version)   # a wrong PIN never rewrites the hash
+
+    assert db.check_project_pin(private, "2468")
+    upgraded, after = _project(private)
+    assert upgraded != legacy and not pins.needs_rehash(upgraded)
+    assert after == version   # sessions that unlocked the legacy hash stay unlocked
+    assert db.check_project_pin(private, "2468") and not db.check_project_pin(private, "1357")
+
+
+def test_kdf_pool_caps_concurrent_runs(monkeypatch):
+    monkeypatch.setattr(pins, "_pool", ThreadPoolExecutor(max_workers=2))
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def kdf():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        threading.Event().wait(0.02)
+        with lock:
+            running[0] -= 1
+        return True
+
+    assert all(f.result(timeout=5) for f in [pins._submit(kdf) for _ in range(8)])
+    assert peak[0] == 2
+
+
+def test_full_queue_and_slow_kdf_fail_fast(monkeypatch):
+    monkeypatch.setattr(pins, "_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(pins, "TIMEOUT", 0.05)
+    gate = threading.Event()
+    held = [pins._submit(gate.wait) for _ in range(2)]
+    try:
+        with pytest.raises(ValueError, match="Too many PIN checks"):
+            pins._submit(gate.wait)
+        with pytest.raises(ValueError, match="timed out"):
+            db._kdf_result(held[0])
+    finally:
+        gate.set()
+    assert all(f.result(timeout=5) for f in held)
+    pins._submit(lambda: None).result(timeout=5)   # slots come back once the jobs finish
@@ -0,0 +1,60 @@
+import random
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+import db
+
+TODAY = date(2026, 6, 1)
+
+
+def _expected(pid):
+    """The same figures, counted item by item from the delta-sync tree."""
+    tree = db.apply_changes(None, db.changes_since(pid, 0))
+    items = list(tree["tasks"].values()) + list(tree["subtasks"].values())
+    starts = [i["start_date"] for i in items if i["start_date"]]
+    ends = [i["end_date"] for i in items if i["end_date"]]
+    return {
+        "items": len(items),
+        "done": sum(i["status"] == "Done" for i in items),
+        "overdue": sum(i["status"] != "Done" and i["end_date"] is not None and i["end_date"] < TODAY
+                       for i in items),
+        "progress": round(sum(i["progress"] for i in items) / len(items), 1) if items else 0.0,
+        "first_start": min(starts, default=None),
+        "last_end": max(ends, default=None),
+    }
+
+
+def _fill(pid, assignee, rng):
+    for n in range(rng.randrange(3, 8)):
+        start = date(2026, 1, 1) + timedelta(days=rng.randrange(200))
+        tid = db.add_or_update_task(pid, f"T{n}", rng.choice(db.TASK_STATUSES), start,
+                                    start + timedelta(days=rng.randrange(30)), assignee, progress=rng.randrange(101))
+        for m in range(rng.randrange(3)):
+            db.add_or_update_subtask(tid, f"T{n}.{m}", rng.choice(db.TASK_STATUSES), None,
+                                     rng.choice([None, start + timedelta(days=m)]), None, progress=rng.randrange(101))
+
+
+def test_portfolio_matches_per_project_counts_in_one_query(owner, project):
+    rng = random.Random(29)
+    other = db.create_project(owner, "Other", date(2026, 1, 1), date(2026, 12, 31), is_public=True)
+    empty = db.create_project(owner, "Empty", date(2026, 1, 1), date(2026, 12, 31), is_public=True)
+    stranger = db.create_project("stranger@example.com", "Not mine", date(2026, 1, 1), date(2026, 12, 31),
+                                 is_public=True)
+    for pid, who in ((project, owner), (other, owner), (stranger, None)):
+        _fill(pid, who, rng)
+
+    statements, me = [], threading.get_ident()   # not the activity writer's inserts
+    listener = lambda *args: threading.get_ident() == me and statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        rows = db.get_portfolio_for_user(owner.upper(), today=TODAY)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert [r["id"] for r in rows] == [empty, other, project]   # newest first, members only
+    for r in rows:
+        assert r["role"] == "owner"
+        assert {k: r[k] for k in _expected(r["id"])} == _expected(r["id"]), r["name"]
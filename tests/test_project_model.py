@@ -0,0 +1,49 @@
+from datetime import date
+
+import pandas as pd
+
+from project_model import ProjectFrame
+
+
+def _task(id, start=None, status="To-Do", who=None, progress=0.0):
+    return {"id": id, "name": f"T{id}", "status": status, "start_date": start, "end_date": None,
+            "assignee_email": who, "progress": progress, "description": None}
+
+
+def _sub(id, task_id, start=None, who=None):
+    return {"id": id, "task_id": task_id, "name": f"S{id}", "status": "Done", "start_date": start,
+            "end_date": None, "assignee_email": who, "progress": None}
+
+
+def test_orders_tasks_and_slices_subtasks_per_task():
+    frame = ProjectFrame.build(
+        [_task(1, date(2026, 3, 1)), _task(2), _task(3, date(2026, 1, 1)), _task(4), _task(5, date(2026, 3, 1))],
+        [_sub(10, 3, date(2026, 2, 1)), _sub(11, 1), _sub(12, 3, date(2026, 1, 5)), _sub(13, 5)])
+    assert frame.tasks["id"].tolist() == [3, 5, 1, 4, 2]   # by start, newest first on ties, undated last
+    assert frame.subtasks_of(3)["id"].tolist() == [12, 10]
+    assert frame.subtasks_of(1)["id"].tolist() == [11]
+    assert frame.subtasks_of(2).empty and frame.subtasks_of(99).empty
+    assert frame.task_names()[4] == "T4"
+
+
+def test_columns_are_typed_and_shared_by_every_view():
+    frame = ProjectFrame.build([_task(1, status="Blocked", who="b@x"), _task(2, status="Done", who="a@x")],
+                               [_sub(10, 1, who="c@x")])
+    tasks = frame.tasks.set_index("id")
+    assert tasks.loc[1, "status"] == "To-Do"   # unknown statuses read as To-Do
+    assert list(frame.tasks["status"].cat.categories) == ["To-Do", "In Progress", "Done"]
+    assert list(frame.tasks["assignee_email"].cat.categories) == ["a@x", "b@x", "c@x"]
+    assert frame.subtasks["progress"].tolist() == [0.0]
+    assert pd.api.types.is_datetime64_any_dtype(frame.tasks["start_date"])
+
+    items = frame.items()
+    assert items is frame.items()   # built once per frame
+    assert items["_type"].tolist() == ["Task", "Task", "Subtask"]
+    assert frame.items(include_subtasks=False)["_type"].tolist() == ["Task", "Task"]
+    assert items["assignee_email"].dtype == frame.tasks["assignee_email"].dtype
+
+
+def test_empty_project():
+    frame = ProjectFrame.build([], [])
+    assert frame.tasks.empty and frame.items().empty
+    assert frame.subtasks_of(1).empty
@@ -0,0 +1,77 @@
+import os
+import time
+from datetime import date
+
+import pytest
+
+import db
+import recurrence
+
+
+@pytest.fixture
+def dst_zone():
+    """Run in a zone with DST so a wall-clock based expansion would drift."""
+    old = os.environ.get("TZ")
+    os.environ["TZ"] = "America/New_York"
+    time.tzset()
+    yield
+    if old is None:
+        os.environ.pop("TZ")
+    else:
+        os.environ["TZ"] = old
+    time.tzset()
+
+
+def test_weekly_across_dst_changes(dst_zone):
+    rule = recurrence.build_rule("WEEKLY", weekdays=["SU"])
+    days = list(recurrence.occurrences(rule, date(2026, 3, 1), None, date(2026, 11, 15)))
+    assert date(2026, 3, 8) in days and date(2026, 11, 1) in days   # both US switch days
+    assert all(d.weekday() == 6 for d in days)
+    assert all((b - a).days == 7 for a, b in zip(days, days[1:]))
+
+
+def test_daily_across_dst_has_one_date_per_day(dst_zone):
+    days = list(recurrence.occurrences("FREQ=DAILY;INTERVAL=1", date(2026, 3, 7), None, date(2026, 3, 10)))
+    assert days == [date(2026, 3, 7), date(2026, 3, 8), date(2026, 3, 9), date(2026, 3, 10)]
+
+
+def test_monthly_from_the_31st_skips_short_months():
+    rule = recurrence.build_rule("MONTHLY")
+    days = list(recurrence.occurrences(rule, date(2026, 1, 31), None, date(2026, 8, 31)))
+    assert days == [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31), date(2026, 7, 31), date(2026, 8, 31)]
+
+
+def test_last_day_of_month_and_leap_years():
+    days = list(recurrence.occurrences("FREQ=MONTHLY;BYMONTHDAY=-1", date(2028, 1, 1), None, date(2028, 4, 30)))
+    assert days == [date(2028, 1, 31), date(2028, 2, 29), date(2028, 3, 31), date(2028, 4, 30)]
+    yearly = list(recurrence.occurrences("FREQ=YEARLY", date(2024, 2, 29), None, date(2032, 12, 31)))
+    assert yearly == [date(2024, 2, 29), date(2028, 2, 29), date(2032, 2, 29)]
+
+
+def test_window_is_exclusive_after_inclusive_through():
+    rule = recurrence.build_rule("DAILY", count=10)
+    assert list(recurrence.occurrences(rule, date(2026, 1, 1), date(2026, 1, 3), date(2026, 1, 5))) == \
+        [date(2026, 1, 4), date(2026, 1, 5)]
+    assert recurrence.next_occurrences(rule, date(2026, 1, 1), date(2026, 1, 9), n=5) == \
+        [date(2026, 1, 9), date(2026, 1, 10)]
+
+
+def test_invalid_rules_raise_value_error():
+    with pytest.raises(ValueError):
+        recurrence.validate_rule("FREQ=SOMETIMES", date(2026, 1, 1))
+    with pytest.raises(ValueError):
+        recurrence.build_rule("WEEKLY", until=date(2026, 2, 1), count=3)
+
+
+def test_materialised_series_extends_without_duplicates(project):
+    rule = recurrence.build_rule("MONTHLY")
+    rid = db.add_recurring_task(project, "Month end close", rule, date(2026, 1, 31), duration_days=1,
+                                today=date(2026, 1, 1))
+    first = {t["start_date"] for t in db.get_tasks_for_project(project)}
+    db.materialize_recurrences(project, today=date(2026, 6, 1))
+    db.materialize_recurrences(project, today=date(2026, 6, 1))
+    later = sorted(t["start_date"] for t in db.get_tasks_for_project(project))
+    assert first <= set(later) and len(later) == len(set(later))
+    assert all(d.day == 31 for d in later)
+    assert date(2026, 3, 31) in later and not any(d.month in (2, 4, 6) for d in later)
+    assert any(r["id"] == rid for r in db.get_recurrences_for_project(project))
@@ -0,0 +1,68 @@
+import sqlite3
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db
+import invalidation
+import routing
+
+
+def _snapshot(path) -> None:
+    """Copy the primary into `path`: a replica frozen at the primary's current revision."""
+    src = sqlite3.connect(db.engine.url.database)
+    dst = sqlite3.connect(path)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+@pytest.fixture
+def lagging(tmp_path, monkeypatch):
+    """A router whose replica is a copy of the primary that never applies later writes."""
+    path = tmp_path / "replica.db"
+    _snapshot(path)
+    replica = sessionmaker(bind=create_engine(f"sqlite:///{path}", future=True), future=True)
+    router = routing.ReadRouter(db.SessionLocal, replica, max_lag_seconds=3600, check_interval=0)
+    monkeypatch.setattr(db, "router", router)
+    router.catch_up = lambda: _snapshot(path)
+    return router
+
+
+def test_lagging_replica_serves_old_revision(lagging, project, owner):
+    before = db.get_project_revision(project)
+    db.add_or_update_task(project, "A", "To-Do", date(2026, 2, 1), date(2026, 2, 5), owner)
+    assert db.get_project_revision(project) == before   # replica is behind but within max lag
+    with lagging.use_primary():
+        assert db.get_project_revision(project) > before
+
+
+def test_cache_is_filled_from_the_primary(lagging, project, owner):
+    cache = invalidation.ProjectCache(load_context=lagging.use_primary)
+    db.add_or_update_task(project, "A", "To-Do", date(2026, 2, 1), date(2026, 2, 5), owner)
+    fresh = cache.get_or_load(project, "revision", lambda: db.get_project_revision(project))
+    assert fresh > db.get_project_revision(project)   # what the replica would have cached
+    with lagging.use_primary():
+        assert fresh == db.get_project_revision(project)
+
+
+def test_writer_reads_primary_until_replica_catches_up(lagging, project, owner):
+    token = routing.route_key.set("writer")
+    try:
+        db.add_or_update_task(project, "A", "To-Do", date(2026, 2, 1), date(2026, 2, 5), owner)
+        rev = db.get_project_revision(project)
+        assert lagging.factory() is lagging.primary
+        assert rev == lagging._revision(lagging.primary)
+
+        routing.route_key.set("someone-else")
+        assert lagging.factory() is lagging.replica   # stickiness follows the writer only
+
+        routing.route_key.set("writer")
+        lagging.catch_up()
+        assert lagging.factory() is lagging.replica
+    finally:
+        routing.route_key.reset(token)
@@ -0,0 +1,21 @@
+from datetime import date
+
+import db
+
+
+def _projects(found):
+    return {r["project_id"] for r in found["results"]}
+
+
+def test_all_projects_scope_skips_locked_projects(owner, project):
+    locked = db.create_project(owner, "Secret", date(2026, 1, 1), date(2026, 12, 31), is_public=False, pin="4812")
+    db.add_or_update_task(project, "Walrus launch", "To-Do", date(2026, 2, 1), date(2026, 2, 5), owner)
+    db.add_or_update_task(locked, "Walrus acquisition", "To-Do", date(2026, 2, 1), date(2026, 2, 5), owner,
+                          description="walrus terms nobody outside should see")
+
+    assert _projects(db.search_items("walrus", user_email=owner)) == {project}
+    assert _projects(db.search_items("walrus", user_email=owner, unlocked_ids=[locked])) == {project, locked}
+    # a project the user is not a member of stays out whatever the caller passes
+    assert _projects(db.search_items("walrus", user_email="someone@example.com", unlocked_ids=[locked])) == set()
+    # one-project scope is behind the PIN gate already
+    assert _projects(db.search_items("walrus", project_id=locked)) == {locked}
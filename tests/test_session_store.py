@@ -0,0 +1,52 @@
+import session_store
+from session_store import ScopedState, approx_size
+
+
+def test_scope_limits_evict_least_recently_used():
+    state = {}
+    scoped = ScopedState(state, limits={"pin_ok": 2})
+    scoped.set("pin_ok", 1, "a")
+    scoped.set("pin_ok", 2, "b")
+    scoped.set("sub_rows", 1, "other scope")
+    assert scoped.get("pin_ok", 1) == "a"   # touch 1: 2 is now the oldest
+    scoped.set("pin_ok", 3, "c")
+    assert [scoped.get("pin_ok", k) for k in (1, 2, 3)] == ["a", None, "c"]
+    assert scoped.get("sub_rows", 1) == "other scope"
+    assert scoped.evicted == 1
+    assert ScopedState(state).get("pin_ok", 3) == "c"   # lives in session_state across reruns
+
+
+def test_byte_budget_is_tracked_and_enforced():
+    value = ["x" * 100 for _ in range(10)]
+    size = approx_size(value)
+    scoped = ScopedState({}, budget_bytes=int(size * 2.5))
+    for key in range(4):
+        scoped.set("rows", key, list(value))
+    assert len(scoped) == 2 and scoped.nbytes <= scoped.budget_bytes
+    assert scoped.get("rows", 0) is None and scoped.get("rows", 3) is not None
+
+    scoped.set("rows", 3, ["small"])   # replacing an entry re-sizes it
+    assert scoped.nbytes == approx_size(list(value)) + approx_size(["small"])
+    scoped.clear("rows")
+    assert (len(scoped), scoped.nbytes) == (0, 0)
+
+    huge = ScopedState({}, budget_bytes=10)
+    huge.set("rows", 1, value)   # the entry just written stays even when it alone is over budget
+    assert huge.get("rows", 1) is value
+
+
+def test_approx_size_counts_shared_objects_once():
+    shared = ["y" * 1000]
+    assert approx_size([shared, shared]) < approx_size([shared, ["y" * 1000]])
+
+
+def test_session_sizes_are_reported_largest_first(monkeypatch):
+    monkeypatch.setattr(session_store, "_sizes", {})
+    session_store.record_session_size("small", {"a": 1})
+    session_store.record_session_size("large", {"a": "z" * 10_000})
+    assert list(session_store.session_sizes()) == ["large", "small"]
+
+    nbytes, seen = session_store._sizes["large"]
+    session_store._sizes["large"] = (nbytes, seen - session_store.SESSION_TTL_SECONDS - 1)   # went away
+    session_store.record_session_size("fresh", {})
+    assert list(session_store.session_sizes()) == ["small", "fresh"]
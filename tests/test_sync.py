@@ -0,0 +1,63 @@
+from datetime import date
+
+import db
+
+
+def _full(pid):
+    return db.apply_changes(None, db.changes_since(pid, 0))
+
+
+def _same(tree, pid):
+    full = _full(pid)
+    for key in ("tasks", "subtasks", "members"):
+        assert tree[key] == full[key], key
+    assert tree["revision"] == full["revision"]
+
+
+def test_first_sync_is_a_reset(project):
+    delta = db.changes_since(project, 0)
+    assert delta["reset"] and delta["revision"] > 0
+    assert [m["role"] for m in delta["members"]] == ["owner"]
+
+
+def test_deltas_round_trip_to_the_full_tree(project, owner):
+    tree = _full(project)
+    rev = tree["revision"]
+    assert db.changes_since(project, rev) == {"revision": rev, "reset": False, "tasks": [], "subtasks": [],
+                                              "members": [], "deleted": {"task": [], "subtask": [], "member": []}}
+
+    a = db.add_or_update_task(project, "A", "To-Do", date(2026, 2, 1), date(2026, 2, 5), owner)
+    b = db.add_or_update_task(project, "B", "To-Do", date(2026, 2, 6), date(2026, 2, 9), None)
+    sa = db.add_or_update_subtask(a, "A.1", "To-Do", None, None, None)
+    sb = db.add_or_update_subtask(b, "B.1", "In Progress", None, None, None, progress=50)
+    db.set_member_role(project, "viewer@example.com", "viewer")
+    steps = [
+        lambda: None,
+        lambda: db.add_or_update_task(project, "A renamed", "Done", date(2026, 2, 1), date(2026, 2, 4), owner,
+                                      task_id=a, progress=100),
+        lambda: db.delete_subtask(sa),
+        lambda: db.delete_task(b),   # its subtask goes with it
+        lambda: db.set_member_role(project, "viewer@example.com", "editor"),
+        lambda: db.sync_project_members(project, {}, remove_missing=True),
+    ]
+    for step in steps:
+        step()
+        delta = db.changes_since(project, tree["revision"])
+        assert not delta["reset"]
+        tree = db.apply_changes(tree, delta)
+        _same(tree, project)
+    assert sb not in tree["subtasks"] and b not in tree["tasks"]
+    assert tree["tasks"][a]["name"] == "A renamed"
+    assert [m["email"] for m in tree["members"].values()] == [owner]
+
+
+def test_stale_revision_after_pruning_resets(project):
+    tid = db.add_or_update_task(project, "Gone soon", "To-Do", None, None, None)
+    old = _full(project)
+    db.delete_task(tid)
+    db.prune_tombstones(keep_days=-1)
+    delta = db.changes_since(project, old["revision"])
+    assert delta["reset"]
+    tree = db.apply_changes(old, delta)
+    assert tid not in tree["tasks"]
+    _same(tree, project)
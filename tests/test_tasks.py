@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+
+import db
+
+
+def _names(pid):
+    return sorted(t["name"] for t in db.get_tasks_for_project(pid))
+
+
+def test_grid_rows_without_assignee_save(project):
+    saved = db.save_task_edits(project, [
+        dict(name="Blank", status="To-Do", start=None, end=None, assignee_email=None),
+        dict(name="From a new grid row", status="To-Do", start=date(2026, 2, 1), end=None,
+             assignee_email=float("nan")),
+    ])
+    assert saved == 2
+    assert [t["assignee_email"] for t in db.get_tasks_for_project(project)] == [None, None]
+    (tid,) = [t["id"] for t in db.get_tasks_for_project(project) if t["name"] == "Blank"]
+    db.save_subtask_edits(tid, [dict(name="Sub", status="To-Do", start=None, end=None, assignee_email=None)])
+    assert [s["assignee_email"] for s in db.get_subtasks_for_task(tid)] == [None]
+
+
+def test_grid_save_is_all_or_nothing(project, owner):
+    keep = db.add_or_update_task(project, "Keep me", "To-Do", None, None, owner)
+    with pytest.raises(ValueError, match="not a member"):
+        db.save_task_edits(project, [
+            dict(name="Fine", status="To-Do", start=None, end=None, assignee_email=owner),
+            dict(name="Bad", status="To-Do", start=None, end=None, assignee_email="stranger@example.com"),
+        ], deleted_ids=[keep])
+    assert _names(project) == ["Keep me"]
+
+    db.save_task_edits(project, [
+        dict(name="Renamed", status="Done", start=None, end=None, assignee_email=owner, task_id=keep),
+        dict(name="New", status="To-Do", start=None, end=None, assignee_email=None),
+    ])
+    assert _names(project) == ["New", "Renamed"]
+
+
+def test_grid_save_only_touches_its_own_project(project, owner):
+    other = db.create_project(owner, "Other", date(2026, 1, 1), date(2026, 2, 1), is_public=True)
+    foreign = db.add_or_update_task(other, "Foreign", "To-Do", None, None, None)
+    db.save_task_edits(project, [], deleted_ids=[foreign])
+    assert _names(other) == ["Foreign"]
+    with pytest.raises(ValueError):
+        db.save_task_edits(project, [dict(name="Hijack", status="Done", start=None, end=None,
+                                          assignee_email=None, task_id=foreign)])